@@ -0,0 +1,91 @@
+"""
+pytest 起動方式ごとの 1 提出あたりレイテンシ比較（subprocess vs zygote）。
+
+    python benchmarks/bench_runner.py -n 20 --out .out/bench_runner.json
+
+模範解答（py-fnd-assessment-3.solution.py）を n 人分の作業ディレクトリに置き、
+run_pytests を逐次実行して 1 件ごとの所要時間を測る。zygote の起動（import）時間は別に計上する。
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from grader.sandbox import prepare_workdir, copy_fixtures, run_pytests  # noqa: E402
+
+
+def _pct(xs: list, p: float) -> float:
+    xs = sorted(xs)
+    k = max(0, min(len(xs) - 1, round(p / 100 * (len(xs) - 1))))
+    return xs[k]
+
+
+def bench(mode: str, n: int, base: Path) -> dict:
+    runner = None
+    startup = 0.0
+    if mode == "zygote":
+        from grader.zygote import ZygoteRunner
+        t0 = time.perf_counter()
+        runner = ZygoteRunner()
+        # preload の完了までを起動時間に含めるため、1件流してから計測を始める
+        warm = prepare_workdir(str(base), f"{mode}-warmup")
+        shutil.copy2(REPO_ROOT / "py-fnd-assessment-3.solution.py", warm / "submission.py")
+        copy_fixtures(warm, str(REPO_ROOT / "fixtures"))
+        run_pytests(warm, runner=runner)
+        startup = time.perf_counter() - t0
+
+    lat = []
+    try:
+        for i in range(n):
+            work = prepare_workdir(str(base), f"{mode}-{i:04d}")
+            shutil.copy2(REPO_ROOT / "py-fnd-assessment-3.solution.py", work / "submission.py")
+            copy_fixtures(work, str(REPO_ROOT / "fixtures"))
+            t0 = time.perf_counter()
+            rc = run_pytests(work, runner=runner)
+            lat.append(time.perf_counter() - t0)
+            if rc != 0:
+                print(f"warning: {mode} #{i} returncode={rc}", file=sys.stderr)
+    finally:
+        if runner is not None:
+            runner.close()
+    return {
+        "mode": mode, "n": n, "startup_sec": round(startup, 3),
+        "mean_sec": round(statistics.mean(lat), 3),
+        "p50_sec": round(_pct(lat, 50), 3), "p95_sec": round(_pct(lat, 95), 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=10, help="提出数")
+    ap.add_argument("--out", help="結果 JSON の出力先")
+    args = ap.parse_args()
+
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    base = Path(tempfile.mkdtemp(prefix="bench-runner-"))
+    try:
+        rows = [bench(mode, args.n, base) for mode in ("subprocess", "zygote")]
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    for r in rows:
+        print(f"{r['mode']:>10}: mean={r['mean_sec']:.3f}s p50={r['p50_sec']:.3f}s "
+              f"p95={r['p95_sec']:.3f}s startup={r['startup_sec']:.3f}s")
+    speedup = rows[0]["mean_sec"] / rows[1]["mean_sec"] if rows[1]["mean_sec"] else 0
+    print(f"speedup (mean): x{speedup:.1f}")
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"results": rows, "speedup": round(speedup, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+起動時間（import）の予算チェック。python -X importtime で run.py を起動し、予算を超えたら exit 1。
+
+    python benchmarks/bench_startup.py                      # run.py --help と1人分の採点
+    python benchmarks/bench_startup.py --help-budget-ms 150 --grade-budget-ms 1000 --out .out/bench_startup.json
+
+- help  … python run.py --help。Sheets・HTTP・NumPy/pandas・採点の本体（grader.grade）を読んではいけない
+- grade … 偽 Gist サーバ（fake_gist.py）の1人分を gists.txt から採点（--push-to-sheets なし）。
+          gspread / Google の認証ライブラリを読んではいけない
+import 時間は run.py が読んだモジュール（インタプリタの site より後）の累計。ゆらぎを抑えるため -n 回の中央値で比べる。
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from fake_gist import FakeGistServer  # noqa: E402
+from bench_throughput import _git_rev  # noqa: E402
+
+# シナリオごとに読んではいけないモジュール（前方一致）
+FORBIDDEN = {
+    "help": ("gspread", "google", "requests", "numpy", "pandas", "grader.grade"),
+    "grade": ("gspread", "google"),
+}
+
+
+def parse_importtime(stderr: str) -> dict:
+    """-X importtime の出力 → {"import_ms": site より後の累計, "modules": [読んだモジュール名], "top": 重い順}"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        entries.append((name[1:].rstrip(), int(cumulative)))  # 字下げ（2文字ずつ）が入れ子の深さ
+    # インタプリタ自身の起動（site とその配下）は除き、その後にトップレベルで読んだものを足す
+    last_site = max((k for k, (n, _) in enumerate(entries) if n == "site"), default=-1)
+    ours = entries[last_site + 1:]
+    top = [(n, us) for n, us in ours if not n.startswith(" ")]
+    return {
+        "import_ms": round(sum(us for _, us in top) / 1000, 1),
+        "modules": [n.strip() for n, _ in ours],
+        "top": [{"module": n, "ms": round(us / 1000, 1)} for n, us in sorted(top, key=lambda t: -t[1])[:8]],
+    }
+
+
+def _run(argv: list, env: dict) -> dict:
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-X", "importtime", "run.py", *argv], cwd=REPO_ROOT, env=env,
+                       capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        raise RuntimeError(f"run.py {' '.join(argv)} が失敗しました（exit {p.returncode}）:\n{p.stdout[-2000:]}")
+    return {**parse_importtime(p.stderr), "wall_ms": round(wall * 1000, 1)}
+
+
+def measure(name: str, argv: list, env: dict, n: int) -> dict:
+    _run(argv, env)  # 1回目は .pyc の生成を含むので捨てる
+    runs = [_run(argv, env) for _ in range(n)]
+    forbidden = sorted({m for r in runs for m in r["modules"]
+                        if any(m == f or m.startswith(f + ".") for f in FORBIDDEN[name])})
+    return {
+        "scenario": name, "runs": n,
+        "import_ms": statistics.median(r["import_ms"] for r in runs),
+        "wall_ms": statistics.median(r["wall_ms"] for r in runs),
+        "top": runs[-1]["top"], "forbidden_imports": forbidden,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--runs", type=int, default=5, help="各シナリオの計測回数（中央値で比べる）")
+    ap.add_argument("--help-budget-ms", type=float, default=150, help="run.py --help の import 時間の予算")
+    ap.add_argument("--grade-budget-ms", type=float, default=1000, help="1人分の採点の import 時間の予算")
+    ap.add_argument("--out", default=".out/bench_startup.json", help="結果 JSON の出力先")
+    args = ap.parse_args()
+
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("GITHUB_TOKEN", "GOOGLE_SERVICE_ACCOUNT_JSON", "GOOGLE_SHEET_ID", "GITHUB_STEP_SUMMARY")}
+    env.setdefault("MPLBACKEND", "Agg")
+    base = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    try:
+        with FakeGistServer() as srv:
+            url = srv.add("5ea7c0de", (REPO_ROOT / "py-fnd-assessment-3.solution.py").read_bytes())
+            (base / "gists.txt").write_text(url + "\n", encoding="utf-8")
+            env["GITHUB_API_URL"] = srv.api_base
+            rows = [
+                measure("help", ["--help"], env, args.runs),
+                measure("grade", ["--gists", str(base / "gists.txt"), "--out", str(base / "out"), "--no-cache",
+                                  "--jobs", "1"], env, args.runs),
+            ]
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    budgets = {"help": args.help_budget_ms, "grade": args.grade_budget_ms}
+    failures = []
+    for r in rows:
+        r["budget_ms"] = budgets[r["scenario"]]
+        heavy = ", ".join(f"{t['module']}={t['ms']}ms" for t in r["top"][:3])
+        print(f"{r['scenario']:>5}: import={r['import_ms']:.1f}ms (budget {r['budget_ms']:.0f}ms) "
+              f"wall={r['wall_ms']:.0f}ms  heaviest: {heavy}", flush=True)
+        if r["import_ms"] > r["budget_ms"]:
+            failures.append(f"{r['scenario']}: import {r['import_ms']:.1f}ms > budget {r['budget_ms']:.0f}ms")
+        if r["forbidden_imports"]:
+            failures.append(f"{r['scenario']}: 読んではいけないモジュールを読んでいます: "
+                            f"{', '.join(r['forbidden_imports'][:10])}")
+
+    report = {
+        "git_rev": _git_rev(), "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "scenarios": rows, "failures": failures,
+    }
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"wrote {args.out}")
+    for f in failures:
+        print(f"REGRESSION {f}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
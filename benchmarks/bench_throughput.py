@@ -0,0 +1,160 @@
+"""
+採点全体（grade_all）のスループット計測。GitHub と Google Sheets には一切つながない。
+
+    python benchmarks/bench_throughput.py --sizes 10,100 -j 4 --out .out/bench_throughput.json
+    python benchmarks/bench_throughput.py --sizes 100 --baseline old.json   # 前回比で劣化を検出
+
+- ローカルの偽 Gist サーバ（fake_gist.py）に合成コホート（cohort.py）を載せ、GITHUB_API_URL を向ける
+- Sheets への書き込みは fake_gspread.py のインメモリ実装に差し替える
+- 1回ごとに 提出数/分（end-to-end）と、受講生ごとの所要時間（perf.timings の合計）の p50/p95 を出す
+- --warm を付けると同じコホートをキャッシュ有効で2回流し、2回目（warm）も計測する
+- --baseline を付けると同じ size / runner の subs_per_min が tolerance 以上落ちたとき exit 1
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from grader.grade import grade_all  # noqa: E402
+from grader.engine import default_jobs  # noqa: E402
+from grader.trace import total_wall  # noqa: E402
+from cohort import generate, parse_mix  # noqa: E402
+from fake_gist import FakeGistServer  # noqa: E402
+from fake_gspread import FakeClient, patched_sheets  # noqa: E402
+from bench_runner import _pct  # noqa: E402
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _run_once(roster: Path, out_dir: Path, args, cache_dir: Path | None, kinds: dict) -> dict:
+    sheets = FakeClient()
+    log = io.StringIO()
+    t0 = time.perf_counter()
+    with patched_sheets(sheets), contextlib.redirect_stdout(log):
+        grade_all(str(roster), str(out_dir), push_to_sheets=True, jobs=args.jobs, fetch_jobs=args.fetch_jobs,
+                  use_cache=cache_dir is not None, cache_dir=str(cache_dir) if cache_dir else None,
+                  runner=args.runner, workspace=args.workspace, graphql=not args.no_graphql)
+    wall = time.perf_counter() - t0
+
+    results = json.loads((out_dir / "results.json").read_text(encoding="utf-8"))
+    lat = [total_wall(r) for r in results]
+    by_kind: dict = {}
+    for r in results:
+        by_kind.setdefault(kinds.get(r.get("gist_url"), "?"), []).append(total_wall(r))
+    return {
+        "wall_sec": round(wall, 3),
+        "subs_per_min": round(len(results) / wall * 60, 1) if wall else 0.0,
+        "p50_sec": round(_pct(lat, 50), 3), "p95_sec": round(_pct(lat, 95), 3),
+        "max_sec": round(max(lat), 3),
+        "by_kind_p50_sec": {k: round(_pct(v, 50), 3) for k, v in sorted(by_kind.items())},
+        "sheets_calls": sheets.calls,
+    }
+
+
+def bench(n: int, args, base: Path) -> list:
+    cohort = generate(n, parse_mix(args.mix), seed=args.seed)
+    rows = []
+    with FakeGistServer(latency=args.latency, fail_rate=args.fail_rate) as srv:
+        os.environ["GITHUB_API_URL"] = srv.api_base
+        kinds = {}
+        lines = []
+        for _sid, gist_id, kind, content in cohort:
+            url = srv.add(gist_id, content)
+            kinds[url] = kind
+            lines.append(url)
+        roster = base / f"roster-{n}.txt"
+        roster.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        cache_dir = base / f"cache-{n}" if args.warm else None
+        passes = ["cold", "warm"] if args.warm else ["cold"]
+        for phase in passes:
+            out_dir = base / f"out-{n}-{phase}"
+            before = dict(srv.requests)
+            r = _run_once(roster, out_dir, args, cache_dir, kinds)
+            r.update({"size": n, "phase": phase, "runner": args.runner, "workspace": args.workspace, "graphql": not args.no_graphql,
+                      "jobs": args.jobs,
+                      "mix": {k: sum(1 for c in cohort if c[2] == k) for k in parse_mix(args.mix)},
+                      "gist_requests": {k: v - before[k] for k, v in srv.requests.items()}})
+            rows.append(r)
+            print(f"n={n:>5} {phase:>4} {args.runner}: {r['subs_per_min']:>8.1f} subs/min  "
+                  f"p50={r['p50_sec']:.2f}s p95={r['p95_sec']:.2f}s wall={r['wall_sec']:.1f}s", flush=True)
+    return rows
+
+
+def compare(rows: list, baseline_path: str, tolerance: float) -> list:
+    """baseline より subs_per_min が tolerance（割合）以上下がった行を返す。"""
+    base = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    index = {(b["size"], b["phase"], b["runner"]): b for b in base.get("runs", [])}
+    regressions = []
+    for r in rows:
+        b = index.get((r["size"], r["phase"], r["runner"]))
+        if b and b["subs_per_min"] and r["subs_per_min"] < b["subs_per_min"] * (1 - tolerance):
+            regressions.append({"size": r["size"], "phase": r["phase"], "runner": r["runner"],
+                                "baseline": b["subs_per_min"], "current": r["subs_per_min"]})
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,50", help="コホートの人数（カンマ区切り、10〜2000 程度）")
+    ap.add_argument("--mix", help="variant の比率（例: ok=0.8,syntax=0.1,loop=0.1）。既定は cohort.DEFAULT_MIX")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-j", "--jobs", type=int, default=default_jobs())
+    ap.add_argument("--fetch-jobs", type=int, default=16)
+    ap.add_argument("--runner", choices=["subprocess", "zygote"], default="subprocess")
+    ap.add_argument("--workspace", choices=["disk", "ram"], default="disk")
+    ap.add_argument("--no-graphql", action="store_true", help="GraphQL 一括解決を使わず REST だけで取得する")
+    ap.add_argument("--latency", type=float, default=0.0, help="偽 Gist サーバの応答遅延（秒）")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="偽 Gist サーバが 503 を返す割合")
+    ap.add_argument("--warm", action="store_true", help="キャッシュ有効で2回流し、2回目も計測する")
+    ap.add_argument("--out", default=".out/bench_throughput.json", help="結果 JSON の出力先")
+    ap.add_argument("--baseline", help="比較対象の結果 JSON（以前の --out）")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="劣化とみなす subs/min の低下割合")
+    args = ap.parse_args()
+
+    os.chdir(REPO_ROOT)  # fixtures/ は cwd 相対で解決される
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    os.environ.pop("GITHUB_STEP_SUMMARY", None)
+    base = Path(tempfile.mkdtemp(prefix="bench-throughput-"))
+    try:
+        rows = [r for n in (int(s) for s in args.sizes.split(",")) for r in bench(n, args, base)]
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    report = {
+        "git_rev": _git_rev(), "python": platform.python_version(), "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "runs": rows,
+    }
+    regressions = compare(rows, args.baseline, args.tolerance) if args.baseline else []
+    if args.baseline:
+        report["regressions"] = regressions
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"wrote {args.out}")
+    for g in regressions:
+        print(f"REGRESSION n={g['size']} {g['phase']} {g['runner']}: "
+              f"{g['baseline']} → {g['current']} subs/min", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+合成コホート（ベンチマーク用の提出群）の生成。
+
+模範解答 py-fnd-assessment-3.solution.py をもとに、壊れた / 遅い提出を混ぜる。
+
+    ok        … 模範解答そのまま
+    syntax    … 構文エラー（import 時に失敗、全テスト error）
+    slow      … 集計関数が呼ばれるたびに 0.3 秒待つ
+    heavy     … import 時に重い依存を読み込む（1.5 秒相当）
+    loop      … get_average_score_by_game が無限ループ（pytest-timeout で打ち切られる）
+
+内容がすべて異なるよう末尾に受講生番号のコメントを付ける（結果キャッシュに当たらないように）。
+"""
+from __future__ import annotations
+import hashlib
+import random
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SOLUTION = REPO_ROOT / "py-fnd-assessment-3.solution.py"
+
+DEFAULT_MIX = {"ok": 0.85, "syntax": 0.05, "slow": 0.04, "heavy": 0.04, "loop": 0.02}
+
+_PATCHES = {
+    "ok": "",
+    "syntax": "\ndef broken(:\n    pass\n",
+    "slow": (
+        "\nimport time as _time\n"
+        "_orig_average = get_average_score_by_game\n"
+        "def get_average_score_by_game(df):\n"
+        "    _time.sleep(0.3)\n"
+        "    return _orig_average(df)\n"
+    ),
+    "heavy": (
+        "\nimport time as _time\n"
+        "import xml.dom.minidom, email.mime.multipart, sqlite3, decimal, pandas.plotting\n"
+        "_time.sleep(1.5)  # 巨大な依存の import を模す\n"
+    ),
+    "loop": (
+        "\ndef get_average_score_by_game(df):\n"
+        "    while True:\n"
+        "        pass\n"
+    ),
+}
+
+
+def parse_mix(text: str | None) -> dict:
+    """'ok=0.8,syntax=0.2' → {"ok": 0.8, "syntax": 0.2}"""
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in _PATCHES:
+            raise ValueError(f"未知の variant: {name}（{', '.join(_PATCHES)} から選択）")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def variant_source(kind: str, index: int) -> bytes:
+    base = SOLUTION.read_text(encoding="utf-8")
+    return (base + _PATCHES[kind] + f"\n# cohort student {index}\n").encode("utf-8")
+
+
+def generate(n: int, mix: dict | None = None, seed: int = 0) -> list:
+    """
+    n 人分の提出を作る。戻り値は [(student_id, gist_id, kind, content)]。
+    同じ n / mix / seed なら同じコホートになる。
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=n)
+    cohort = []
+    for i, kind in enumerate(kinds):
+        gist_id = hashlib.sha1(f"{seed}-{i}".encode()).hexdigest()[:20]
+        cohort.append((f"s{i:05d}", gist_id, kind, variant_source(kind, i)))
+    return cohort
@@ -0,0 +1,154 @@
+"""
+api.github.com/gists/<id> と gist.githubusercontent.com の代わりになるローカル HTTP サーバ。
+
+    with FakeGistServer() as srv:
+        url = srv.add("0123abcd", b"print('hi')")       # → https://gist.github.com/bench/0123abcd
+        srv.add("4567ef01", b"...", extra={"py-fnd-assessment-4.py": b"..."})   # 複数ファイルの Gist
+        os.environ["GITHUB_API_URL"] = srv.api_base
+
+- GET /gists/<id>               … Gist API 互換 JSON（files[...].raw_url, history[0].version, ETag）
+- GET /raw/<id>/<rev>/<file>    … 本文
+- POST /graphql                 … grader.resolver のクエリ（変数 l<i> / n<i>）に g<i>.gist で答える
+If-None-Match が一致すれば 304 を返す。latency / fail_rate で遅延・5xx を混ぜられる。
+GraphQL の本文は truncate_over バイトを超えると isTruncated=true になる（REST で取り直す経路の確認用）。
+"""
+from __future__ import annotations
+import hashlib
+import http.server
+import json
+import random
+import threading
+import time
+
+FILENAME = "py-fnd-assessment-3.py"
+
+
+class FakeGistServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0,
+                 truncate_over: int | None = None):
+        self.gists: dict = {}  # id -> {"content": bytes, "files": {name: bytes}, "version": str, "user": str}
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.truncate_over = truncate_over
+        self.requests = {"api": 0, "raw": 0, "not_modified": 0, "failed": 0, "graphql": 0}
+        self._lock = threading.Lock()
+        self._httpd = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-gist", daemon=True)
+
+    @property
+    def api_base(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add(self, gist_id: str, content: bytes, user: str = "bench", extra: dict | None = None) -> str:
+        """Gist を登録し、ロスターに書く Gist ページ URL を返す。extra は他のファイル（名前 → 本文）。"""
+        files = {FILENAME: content, **(extra or {})}
+        version = hashlib.sha1(b"\0".join(k.encode() + b"\0" + v for k, v in sorted(files.items()))).hexdigest()
+        self.gists[gist_id] = {"content": content, "files": files, "version": version, "user": user}
+        return f"https://gist.github.com/{user}/{gist_id}"
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.requests[key] += 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code: int, body: bytes = b"", headers: dict | None = None) -> None:
+                self.send_response(code)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.fail_rate and random.random() < server.fail_rate:
+                    server._count("failed")
+                    return self._send(503)
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 2 and parts[0] == "gists":
+                    return self._api(parts[1])
+                if len(parts) == 4 and parts[0] == "raw":
+                    return self._raw(parts[1], parts[3])
+                self._send(404)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if server.latency:
+                    time.sleep(server.latency)
+                if self.path.rstrip("/") != "/graphql":
+                    return self._send(404)
+                server._count("graphql")
+                variables = json.loads(body or b"{}").get("variables") or {}
+                data = {"rateLimit": {"cost": 1, "remaining": 4999, "resetAt": "2099-01-01T00:00:00Z"}}
+                i = 0
+                while f"n{i}" in variables:
+                    g = server.gists.get(variables[f"n{i}"])
+                    if g is None or g["user"] != variables.get(f"l{i}"):
+                        data[f"g{i}"] = {"gist": None}
+                    else:
+                        files = []
+                        for name, content in g["files"].items():
+                            truncated = server.truncate_over is not None and len(content) > server.truncate_over
+                            files.append({"name": name, "isTruncated": truncated,
+                                          "text": None if truncated else content.decode("utf-8")})
+                        data[f"g{i}"] = {"gist": {
+                            "name": variables[f"n{i}"], "pushedAt": g["version"], "files": files,
+                        }}
+                    i += 1
+                self._send(200, json.dumps({"data": data}).encode(),
+                           {"Content-Type": "application/json", "X-RateLimit-Remaining": "4999"})
+
+            def _api(self, gist_id: str):
+                server._count("api")
+                g = server.gists.get(gist_id)
+                if g is None:
+                    return self._send(404, b'{"message": "Not Found"}')
+                etag = f'"{g["version"]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    server._count("not_modified")
+                    return self._send(304, headers={"ETag": etag})
+                host, port = server._httpd.server_address[:2]
+                body = json.dumps({
+                    "id": gist_id,
+                    "files": {name: {"filename": name, "size": len(content),
+                                     "raw_url": f"http://{host}:{port}/raw/{gist_id}/{g['version']}/{name}"}
+                              for name, content in g["files"].items()},
+                    "history": [{"version": g["version"]}],
+                }).encode()
+                self._send(200, body, {"Content-Type": "application/json", "ETag": etag,
+                                       "X-RateLimit-Remaining": "4999"})
+
+            def _raw(self, gist_id: str, name: str):
+                server._count("raw")
+                g = server.gists.get(gist_id)
+                if g is None or name not in g["files"]:
+                    return self._send(404)
+                self._send(200, g["files"][name], {"Content-Type": "text/plain; charset=utf-8"})
+
+        return Handler
+
+    def start(self) -> "FakeGistServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeGistServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,171 @@
+"""
+gspread のインメモリ代替（採点器が使う API だけ）。
+
+    client = FakeClient()
+    with patched_sheets(client):
+        push_results_wide_to_google_sheets(results)
+    client.open_by_key("fake").worksheet("results").values
+
+API 呼び出し回数は FakeClient.calls に数える。
+"""
+from __future__ import annotations
+import re
+from contextlib import contextmanager
+
+
+class WorksheetNotFound(Exception):
+    pass
+
+
+def _a1(cell: str) -> tuple:
+    m = re.fullmatch(r"([A-Z]+)(\d+)", cell)
+    col = 0
+    for ch in m.group(1):
+        col = col * 26 + ord(ch) - 64
+    return int(m.group(2)), col
+
+
+class FakeWorksheet:
+    def __init__(self, client: "FakeClient", title: str, rows: int = 1000, cols: int = 26):
+        self._client = client
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.values: list = []
+
+    def _call(self, name: str) -> None:
+        self._client.calls[name] = self._client.calls.get(name, 0) + 1
+
+    def get_all_values(self) -> list:
+        self._call("get_all_values")
+        return [list(r) for r in self.values]
+
+    def row_values(self, row: int) -> list:
+        self._call("row_values")
+        return list(self.values[row - 1]) if row <= len(self.values) else []
+
+    def get_all_records(self) -> list:
+        self._call("get_all_records")
+        header, *rows = self.values or [[]]
+        return [dict(zip(header, r + [""] * (len(header) - len(r)))) for r in rows]
+
+    def batch_get(self, ranges: list, major_dimension: str | None = None,
+                  value_render_option: str | None = None) -> list:
+        """A1 範囲ごとの値（末尾の空行・空セルは Sheets API と同じく詰める）。"""
+        self._call("batch_get")
+        out = []
+        for rng in ranges:
+            first, _, last = rng.partition(":")
+            r1, c1 = _a1(first)
+            r2, c2 = _a1(last or first)
+            grid = [[(self.values[r - 1][c - 1] if r <= len(self.values) and c <= len(self.values[r - 1]) else "")
+                     for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+            if major_dimension == "COLUMNS":
+                grid = [list(col) for col in zip(*grid)] if grid else []
+            for line in grid:
+                while line and line[-1] == "":
+                    line.pop()
+            while grid and not grid[-1]:
+                grid.pop()
+            out.append(grid)
+        return out
+
+    def resize(self, rows: int | None = None, cols: int | None = None) -> None:
+        self._call("resize")
+        self.row_count = rows or self.row_count
+        self.col_count = cols or self.col_count
+
+    def batch_update(self, data: list, value_input_option: str | None = None) -> None:
+        self._call("batch_update")
+        for d in data:
+            first, _, last = d["range"].partition(":")
+            r1, c1 = _a1(first)
+            r2, c2 = _a1(last or first)
+            if r2 > self.row_count or c2 > self.col_count:
+                raise ValueError(f"range {d['range']} exceeds grid limits")
+            for i, row in enumerate(d["values"]):
+                while len(self.values) < r1 + i:
+                    self.values.append([])
+                target = self.values[r1 + i - 1]
+                for j, v in enumerate(row):
+                    while len(target) < c1 + j:
+                        target.append("")
+                    target[c1 + j - 1] = _entered("" if v is None else str(v), value_input_option)
+
+    def update(self, range_name: str, values: list, **kwargs) -> None:
+        first = range_name.split(":")[0]
+        r, c = _a1(first)
+        last = f"{_col(c + max(len(v) for v in values) - 1)}{r + len(values) - 1}"
+        self.batch_update([{"range": f"{first}:{last}", "values": values}])
+
+    def append_rows(self, rows: list, value_input_option: str | None = None) -> None:
+        self._call("append_rows")
+        self.values.extend([["" if v is None else str(v) for v in row] for row in rows])
+        self.row_count = max(self.row_count, len(self.values))
+
+
+def _entered(v: str, value_input_option: str | None) -> str:
+    """
+    USER_ENTERED の解釈の近似：先頭の ' は「文字列として入力」の印で値には残らず、
+    日付に見える文字列は日付になって表示形式（2024/05/01）で返ってくる。
+    """
+    if value_input_option != "USER_ENTERED":
+        return v
+    if v.startswith("'"):
+        return v[1:]
+    m = re.fullmatch(r"(\d{4})-(\d{2})-(\d{2})", v)
+    return "/".join(m.groups()) if m else v
+
+
+def _col(n: int) -> str:
+    s = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(ord("A") + r) + s
+    return s
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+        self.worksheets: dict = {}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26) -> FakeWorksheet:
+        ws = self.worksheets[title] = FakeWorksheet(self._client, title, rows, cols)
+        return ws
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        if not self.worksheets:
+            self.add_worksheet("Sheet1")
+        return next(iter(self.worksheets.values()))
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls: dict = {}
+        self.sheets: dict = {}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        if key not in self.sheets:
+            self.sheets[key] = FakeSpreadsheet(self)
+        return self.sheets[key]
+
+
+@contextmanager
+def patched_sheets(client: FakeClient, sheet_id: str = "fake-sheet"):
+    """grader.report（書き込み）と grader.sources（ロスターの読み込み）の Sheets クライアントを FakeClient に差し替える。"""
+    import grader.report as report
+    import grader.sources as sources
+    orig = report._get_gspread_client, sources._get_sheets_reader
+    report._get_gspread_client = lambda: (client, sheet_id)
+    sources._get_sheets_reader = lambda: client
+    try:
+        yield client.open_by_key(sheet_id)
+    finally:
+        report._get_gspread_client, sources._get_sheets_reader = orig
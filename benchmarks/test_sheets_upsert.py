@@ -0,0 +1,54 @@
+"""
+grader.report.upsert_wide_rows を fake_gspread で確かめる（python -m pytest benchmarks）。
+
+Sheets は USER_ENTERED で書いた値を数値・日付に変えて返すことがある。キーが変わって返ってきても
+既存の行を更新し、行が増えないこと。
+"""
+from __future__ import annotations
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from grader.report import upsert_wide_rows  # noqa: E402
+from fake_gspread import FakeClient  # noqa: E402
+
+
+def _result(sid: str, outcome: str = "passed") -> dict:
+    return {"student_id": sid, "gist_url": f"https://gist.github.com/u/{sid}", "total_tests": 2,
+            "passed": 2 if outcome == "passed" else 1, "failed": 0 if outcome == "passed" else 1, "cpu_sec": 1.0,
+            "tests": [{"name": "t1", "outcome": "passed"}, {"name": "t2", "outcome": outcome}]}
+
+
+def _sheet():
+    return FakeClient().open_by_key("fake").add_worksheet("results")
+
+
+def test_retyped_student_id_updates_existing_row():
+    ws = _sheet()
+    upsert_wide_rows(ws, [_result("001"), _result("002")])
+    sid_col = ws.values[0].index("student_id")
+    for row in ws.values[1:]:
+        row[sid_col] = str(int(row[sid_col]))  # 数値として解釈され "001" → 1 で返ってくる
+    upsert_wide_rows(ws, [_result("001", "failed")])
+    assert len(ws.values) == 3
+    assert ws.values[1][ws.values[0].index("t2")] == "failed"
+
+
+def test_retyped_numbers_are_not_rewritten():
+    ws = _sheet()
+    upsert_wide_rows(ws, [_result("001")])
+    header = ws.values[0]
+    ws.values[1][header.index("cpu_sec")] = "1"      # 1.0 → 1
+    ws.values[1][header.index("pass_rate")] = "1"    # "100%" → 1
+    assert upsert_wide_rows(ws, [_result("001")]) == {"ranges": 0, "cells": 0}
+
+
+def test_date_like_run_tag_is_kept_as_text():
+    ws = _sheet()
+    upsert_wide_rows(ws, [_result("001")], run_tag="2024-05-01")
+    upsert_wide_rows(ws, [_result("001", "failed")], run_tag="2024-05-01")
+    assert len(ws.values) == 2
+    assert ws.values[1][ws.values[0].index("run_tag")] == "2024-05-01"
@@ -0,0 +1,172 @@
+"""
+コホート全体の集計（どのテストで多くの人が落ちているか・合格率の分布など）。
+
+results（results.json と同じ dict のリスト）を受講生 × テストの列指向の配列に1回だけ詰め、あとは NumPy / pandas の
+列演算で集計する（results_wide.csv をスプレッドシートで手作業でピボットしなくてよい）。
+
+- テストごと：結果の内訳・失敗率（failed + error）・blocked の割合・所要時間（JUnit の time）の p50 / p90 / p95 / 最大
+  所要時間は pytest で実行した結果だけ（precheck の合成結果・blocked・同一提出の写しは除く。キャッシュ・台帳の結果は元の実測）
+- テストの組ごと：両方失敗した人数・Jaccard・「A が失敗した人のうち B も失敗した割合」
+- 受講生の合格率（passed / total_tests）のヒストグラム（10% 刻み）。テスト結果の無い人（取得失敗など）は除く
+
+    frame = CohortFrame(results)
+    analytics = compute(frame)
+    write_analytics(analytics, out_dir)       # analytics.csv / analytics.json
+"""
+from __future__ import annotations
+import json
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+OUTCOMES = ("passed", "failed", "error", "skipped", "blocked")
+_CODE = {name: k for k, name in enumerate(OUTCOMES)}
+_NO_RESULT = -1
+_FAILED = (_CODE["failed"], _CODE["error"])
+_EXECUTED = (_CODE["passed"], _CODE["failed"], _CODE["error"])
+PERCENTILES = (50, 90, 95)
+HIST_BINS = np.linspace(0, 100, 11)
+TEST_COLUMNS = ["test", "students", *OUTCOMES, "failure_rate", "blocked_rate",
+                *(f"time_p{p}" for p in PERCENTILES), "time_max"]
+
+
+class CohortFrame:
+    """
+    results → 列指向の配列。
+    - outcome … (受講生, テスト) の結果コード（OUTCOMES の位置、結果が無ければ -1）。int8
+    - time    … (受講生, テスト) の所要時間（秒）。実際に pytest で実行したものだけ、他は NaN
+    - pass_rate … 受講生ごとの合格率（%）。テスト結果が無ければ NaN
+    """
+
+    def __init__(self, results: Sequence[dict]):
+        names = sorted({tc["name"] for r in results for tc in (r.get("tests") or []) if tc.get("name")})
+        col = {name: j for j, name in enumerate(names)}
+        self.tests: List[str] = names
+        self.outcome = np.full((len(results), len(names)), _NO_RESULT, dtype=np.int8)
+        self.time = np.full((len(results), len(names)), np.nan)
+        passed = np.zeros(len(results))
+        total = np.zeros(len(results))
+        rows, cols, codes, times = [], [], [], []
+        for i, r in enumerate(results):
+            passed[i] = int(r.get("passed", 0) or 0)
+            total[i] = int(r.get("total_tests", 0) or 0)
+            # pytest で実行していない（合成・写し）結果の time は所要時間の分布に入れない
+            timed = r.get("source") not in ("precheck", "fetch_error", "grader_error") and not r.get("duplicate_of")
+            for tc in r.get("tests") or []:
+                j = col.get(tc.get("name"))
+                if j is None:
+                    continue
+                rows.append(i)
+                cols.append(j)
+                codes.append(_CODE.get(tc.get("outcome"), _CODE["error"]))
+                times.append(float(tc.get("time") or 0.0) if timed else np.nan)
+        if rows:
+            self.outcome[rows, cols] = codes
+            self.time[rows, cols] = times
+        self.time[~np.isin(self.outcome, _EXECUTED)] = np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.pass_rate = np.where(total > 0, passed / total * 100, np.nan)
+
+    def __len__(self) -> int:
+        return self.outcome.shape[0]
+
+
+def per_test(frame: CohortFrame) -> pd.DataFrame:
+    """テストごとの内訳・失敗率・所要時間のパーセンタイル（列は TEST_COLUMNS）。"""
+    counts = {name: (frame.outcome == code).sum(axis=0) for name, code in _CODE.items()}
+    students = (frame.outcome != _NO_RESULT).sum(axis=0)
+    df = pd.DataFrame({"test": frame.tests, "students": students, **counts})
+    denom = np.maximum(students, 1)
+    df["failure_rate"] = np.round((counts["failed"] + counts["error"]) / denom, 4)
+    df["blocked_rate"] = np.round(counts["blocked"] / denom, 4)
+    timed = ~np.isnan(frame.time).all(axis=0)
+    for p in PERCENTILES:
+        df[f"time_p{p}"] = np.nan
+    df["time_max"] = np.nan
+    if timed.any():
+        t = frame.time[:, timed]
+        for p, values in zip(PERCENTILES, np.nanpercentile(t, PERCENTILES, axis=0)):
+            df.loc[timed, f"time_p{p}"] = np.round(values, 4)
+        df.loc[timed, "time_max"] = np.round(np.nanmax(t, axis=0), 4)
+    return df.sort_values(["failure_rate", "test"], ascending=[False, True], ignore_index=True)[TEST_COLUMNS]
+
+
+def co_failures(frame: CohortFrame, limit: int = 50) -> List[dict]:
+    """両方失敗した人数の多いテストの組（最大 limit 件）。"""
+    failed = np.isin(frame.outcome, _FAILED).astype(np.float32)
+    both = failed.T @ failed  # (テスト, テスト)：対角は各テストの失敗人数
+    fails = np.diag(both)
+    a, b = np.triu_indices(len(frame.tests), k=1)
+    keep = both[a, b] > 0
+    a, b = a[keep], b[keep]
+    n = both[a, b]
+    order = np.lexsort((b, a, -n))[:limit]
+    return [{
+        "test_a": frame.tests[a[k]], "test_b": frame.tests[b[k]], "both_failed": int(n[k]),
+        "jaccard": round(float(n[k] / (fails[a[k]] + fails[b[k]] - n[k])), 4),
+        "b_given_a": round(float(n[k] / fails[a[k]]), 4),
+        "a_given_b": round(float(n[k] / fails[b[k]]), 4),
+    } for k in order]
+
+
+def pass_rate_histogram(frame: CohortFrame) -> dict:
+    rates = frame.pass_rate[~np.isnan(frame.pass_rate)]
+    counts, edges = np.histogram(rates, bins=HIST_BINS)
+    return {
+        "students": int(rates.size),
+        "mean": round(float(rates.mean()), 2) if rates.size else None,
+        "median": round(float(np.median(rates)), 2) if rates.size else None,
+        "histogram": [{"bin": f"{edges[k]:.0f}-{edges[k + 1]:.0f}%", "students": int(c)}
+                      for k, c in enumerate(counts)],
+    }
+
+
+def compute(frame: CohortFrame) -> dict:
+    tests = per_test(frame)
+    return {
+        "students": len(frame),
+        "tests": json.loads(tests.to_json(orient="records")),  # NaN → null
+        "co_failures": co_failures(frame),
+        "pass_rate": pass_rate_histogram(frame),
+    }
+
+
+def write_analytics(analytics: dict, out_dir: str) -> None:
+    """<out>/analytics.csv（テストごとの表）と <out>/analytics.json（全項目）。"""
+    pd.DataFrame(analytics["tests"], columns=TEST_COLUMNS).to_csv(
+        os.path.join(out_dir, "analytics.csv"), index=False, encoding="utf-8")
+    with open(os.path.join(out_dir, "analytics.json"), "w", encoding="utf-8") as f:
+        json.dump(analytics, f, ensure_ascii=False, indent=2)
+
+
+def analytics_rows(analytics: dict) -> List[List]:
+    """Sheets の1タブに書く表（テストごと → 合格率の分布 → 一緒に失敗するテストの組）。"""
+    rows: List[List] = [TEST_COLUMNS]
+    rows += [["" if t[c] is None else t[c] for c in TEST_COLUMNS] for t in analytics["tests"]]
+    pr = analytics["pass_rate"]
+    rows += [[], ["pass_rate", "students"]]
+    rows += [[h["bin"], h["students"]] for h in pr["histogram"]]
+    rows += [["mean", "" if pr["mean"] is None else pr["mean"]],
+             ["median", "" if pr["median"] is None else pr["median"]]]
+    rows += [[], ["test_a", "test_b", "both_failed", "jaccard", "b_given_a", "a_given_b"]]
+    rows += [[c["test_a"], c["test_b"], c["both_failed"], c["jaccard"], c["b_given_a"], c["a_given_b"]]
+             for c in analytics["co_failures"]]
+    return rows
+
+
+def summarize(analytics: dict, top: int = 3) -> str:
+    """ログ用の1行（失敗率の高いテスト上位と合格率の平均）。"""
+    worst = ", ".join(f"{t['test'].rsplit('.', 1)[-1]}={t['failure_rate']:.0%}"
+                      for t in analytics["tests"][:top] if t["failure_rate"])
+    mean = analytics["pass_rate"]["mean"]
+    return (f"students={analytics['students']} tests={len(analytics['tests'])} "
+            f"mean_pass_rate={'-' if mean is None else f'{mean:.1f}%'}" + (f" most_failed: {worst}" if worst else ""))
+
+
+def analyze(results: Sequence[dict], out_dir: str) -> Dict:
+    """results を集計して analytics.csv / analytics.json を書き、集計結果を返す。"""
+    analytics = compute(CohortFrame(results))
+    write_analytics(analytics, out_dir)
+    return analytics
@@ -0,0 +1,261 @@
+"""
+受講生ごとの成果物（<out>/<name>/ の submission.py・junit.xml・pytest.out・画像など）を1つのアーカイブにまとめる。
+
+何千もの小さなファイルを upload-artifact に渡す代わりに <out>/artifacts.grarc の1ファイルにする。
+- 中身はファイルの内容（sha256）ごとに1回だけ zlib で圧縮して入れる。fixtures の写しや同じ提出・同じログは1つ分
+- 末尾の索引（メンバ名 → 内容の位置・大きさ）から、1人分だけを全体を展開せずに取り出せる
+
+形式：先頭に MAGIC、内容（圧縮済み）の並び、索引（zlib 圧縮した JSON）、最後に索引の位置と長さ・MAGIC。
+
+    stats = pack_dirs(".out", ["001", "002"], remove=True)   # .out/artifacts.grarc
+    with Archive(".out/artifacts.grarc") as ar:
+        ar.read("001/pytest.out")
+        ar.extract(ar.find("001"), "restored")
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Sequence
+
+ARCHIVE_NAME = "artifacts.grarc"
+MAGIC = b"GRARC01\n"
+_TRAILER = struct.Struct(">QQ")  # 索引の位置・長さ（この後に MAGIC）
+COMPRESS_LEVEL = 6
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _check_name(name: str) -> str:
+    """メンバ名は <out> からの相対パス（/ 区切り）。絶対パス・.. は受け付けない。"""
+    p = PurePosixPath(name)
+    if p.is_absolute() or ".." in p.parts or not p.parts:
+        raise ArchiveError(f"不正なメンバ名です: {name!r}")
+    return str(p)
+
+
+class ArchiveWriter:
+    """内容ごとに1回だけ書くアーカイブの書き手。close() で索引を書く。"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        self._f = open(self._tmp, "wb")
+        self._f.write(MAGIC)
+        self._blobs: List[list] = []          # [offset, 圧縮後の長さ, 元の大きさ, codec, sha256]
+        self._by_digest: Dict[str, int] = {}
+        self.members: Dict[str, dict] = {}
+        self.stats = {"files": 0, "blobs": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    def add_bytes(self, name: str, data: bytes, mode: int = 0o644, mtime: float | None = None) -> None:
+        name = _check_name(name)
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self._by_digest.get(digest)
+        if blob is None:
+            packed = zlib.compress(data, COMPRESS_LEVEL)
+            codec = "zlib"
+            if len(packed) >= len(data):  # 画像など、縮まないものはそのまま
+                packed, codec = data, "raw"
+            blob = self._by_digest[digest] = len(self._blobs)
+            self._blobs.append([self._f.tell(), len(packed), len(data), codec, digest])
+            self._f.write(packed)
+            self.stats["blobs"] += 1
+            self.stats["stored_bytes"] += len(packed)
+        self.members[name] = {"blob": blob, "size": len(data), "mode": mode & 0o777,
+                              "mtime": round(mtime if mtime is not None else time.time(), 3)}
+        self.stats["files"] += 1
+        self.stats["raw_bytes"] += len(data)
+
+    def copy_from(self, src: "Archive", name: str) -> None:
+        """別のアーカイブのメンバを、展開・再圧縮せずにそのまま入れる。"""
+        m = src.info(name)
+        packed, size, codec, digest = src.stored(name)
+        blob = self._by_digest.get(digest)
+        if blob is None:
+            blob = self._by_digest[digest] = len(self._blobs)
+            self._blobs.append([self._f.tell(), len(packed), size, codec, digest])
+            self._f.write(packed)
+            self.stats["blobs"] += 1
+            self.stats["stored_bytes"] += len(packed)
+        self.members[_check_name(name)] = dict(m, blob=blob)
+        self.stats["files"] += 1
+        self.stats["raw_bytes"] += size
+
+    def add_file(self, name: str, path: str | Path) -> None:
+        st = os.stat(path)
+        self.add_bytes(name, Path(path).read_bytes(), mode=st.st_mode, mtime=st.st_mtime)
+
+    def close(self) -> dict:
+        index = zlib.compress(json.dumps({"version": 1, "members": self.members, "blobs": self._blobs},
+                                         ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        offset = self._f.tell()
+        self._f.write(index)
+        self._f.write(_TRAILER.pack(offset, len(index)) + MAGIC)
+        self._f.close()
+        os.replace(self._tmp, self.path)
+        return {**self.stats, "archive_bytes": self.path.stat().st_size}
+
+    def abort(self) -> None:
+        self._f.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, *_) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class Archive:
+    """読み手。索引だけを読み、メンバは必要なものだけ seek して展開する。"""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        try:
+            if self._f.read(len(MAGIC)) != MAGIC:
+                raise ArchiveError(f"{self.path} は成果物のアーカイブではありません")
+            tail = _TRAILER.size + len(MAGIC)
+            self._f.seek(-tail, os.SEEK_END)
+            trailer = self._f.read(tail)
+            if trailer[_TRAILER.size:] != MAGIC:
+                raise ArchiveError(f"{self.path} は途中までしか書かれていません")
+            offset, length = _TRAILER.unpack(trailer[:_TRAILER.size])
+            self._f.seek(offset)
+            index = json.loads(zlib.decompress(self._f.read(length)))
+        except BaseException:
+            self._f.close()
+            raise
+        self._members: Dict[str, dict] = index["members"]
+        self._blobs: List[list] = index["blobs"]
+        self._sorted = sorted(self._members)
+
+    def names(self) -> List[str]:
+        return list(self._members)
+
+    def info(self, name: str) -> dict:
+        return self._members[name]
+
+    def members(self, prefix: str) -> List[str]:
+        """prefix（<name> や <課題名>/<name>）の下のメンバ（索引の二分探索なので人数が多くても速い）。"""
+        prefix = prefix.strip("/")
+        if prefix in self._members:
+            return [prefix]
+        lo = bisect.bisect_left(self._sorted, prefix + "/")
+        hi = bisect.bisect_left(self._sorted, prefix + "0")  # "0" は "/" の次の文字
+        return self._sorted[lo:hi]
+
+    def find(self, name: str) -> List[str]:
+        """members(name)。無ければ最後のディレクトリ名が name のもの（課題名を省いた <name> で探す）。"""
+        return self.members(name) or [n for n in self._members if PurePosixPath(n).parent.name == name.strip("/")]
+
+    def directories(self) -> Dict[str, int]:
+        """ディレクトリ（受講生）ごとのメンバ数。"""
+        out: Dict[str, int] = {}
+        for n in self._members:
+            d = str(PurePosixPath(n).parent)
+            out[d] = out.get(d, 0) + 1
+        return out
+
+    def stored(self, name: str) -> tuple:
+        """(格納されたままのバイト列, 元の大きさ, codec, sha256)。"""
+        m = self._members.get(name)
+        if m is None:
+            raise KeyError(name)
+        offset, length, size, codec, digest = self._blobs[m["blob"]]
+        self._f.seek(offset)
+        return self._f.read(length), size, codec, digest
+
+    def read(self, name: str) -> bytes:
+        data, size, codec, digest = self.stored(name)
+        if codec == "zlib":
+            data = zlib.decompress(data)
+        if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise ArchiveError(f"{name} の内容が壊れています")
+        return data
+
+    def extract(self, names: Iterable[str], dest: str | Path) -> List[Path]:
+        dest = Path(dest)
+        out = []
+        for name in names:
+            m = self._members[name]
+            target = dest / _check_name(name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(self.read(name))
+            os.chmod(target, m["mode"])
+            os.utime(target, (m["mtime"], m["mtime"]))
+            out.append(target)
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self._members), "blobs": len(self._blobs),
+            "raw_bytes": sum(m["size"] for m in self._members.values()),
+            "stored_bytes": sum(b[1] for b in self._blobs), "archive_bytes": self.path.stat().st_size,
+        }
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def pack_dirs(root: str | Path, dirs: Sequence[str], archive: str | Path | None = None,
+              remove: bool = False) -> dict:
+    """
+    root 下の dirs（<name> や <課題名>/<name>）のファイルを root/artifacts.grarc にまとめる。
+    既にアーカイブがあれば、その中身（今回のディレクトリ以外）も引き継ぐ。remove なら入れたディレクトリを消す。
+    """
+    root = Path(root)
+    path = Path(archive) if archive else root / ARCHIVE_NAME
+    dirs = list(dict.fromkeys(d.strip("/") for d in dirs))
+    packed = [d for d in dirs if (root / d).is_dir()]
+    prefixes = tuple(d + "/" for d in packed)
+    old = Archive(path) if path.exists() else None
+    try:
+        with ArchiveWriter(path) as w:
+            if old is not None:
+                for name in old.names():
+                    if not name.startswith(prefixes):
+                        w.copy_from(old, name)
+            for d in packed:
+                for f in sorted((root / d).rglob("*")):
+                    if f.is_file() and not f.is_symlink():
+                        w.add_file(f.relative_to(root).as_posix(), f)
+        stats = {**w.stats, "archive_bytes": path.stat().st_size, "dirs": len(packed)}
+    finally:
+        if old is not None:
+            old.close()
+    if remove:
+        for d in packed:
+            shutil.rmtree(root / d, ignore_errors=True)
+    return stats
+
+
+def student_dirs(root: str | Path) -> List[str]:
+    """root 下の受講生ディレクトリ（submission.py があるもの。<name> か <課題名>/<name>）。"""
+    root = Path(root)
+    return sorted(p.parent.relative_to(root).as_posix()
+                  for pattern in ("*/submission.py", "*/*/submission.py") for p in root.glob(pattern))
+
+
+def summary_line(stats: dict) -> str:
+    mb = 1024 * 1024
+    return (f"files={stats['files']} unique={stats['blobs']} raw={stats['raw_bytes'] / mb:.1f}MB "
+            f"archive={stats['archive_bytes'] / mb:.1f}MB")
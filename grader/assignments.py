@@ -0,0 +1,102 @@
+"""
+課題（assignment）の登録簿。同じ受講生の Gist に複数の課題ファイルが入っているとき、1回の grade_all で
+Gist を1回だけ解決・取得し、登録した課題をまとめて採点する。
+
+課題ごとに持つもの：
+- filename     … Gist 内の提出ファイル名（作業場所には submission.py として置く）
+- tests_dir    … テスト（リポジトリ基準）
+- fixtures_dir / fixtures … 作業場所に置くデータファイル（カレント基準のディレクトリとファイル名）
+- timeout_sec  … pytest 全体のタイムアウト / test_timeout … テスト1件のタイムアウト（pytest-timeout）
+- solution     … 模範解答（リポジトリ基準。類似度の検出で共通部分として除く）
+- result_tab   … Sheets の書き込み先タブ。assignments.json では未指定なら課題名
+                 （組み込みの既定の課題は従来どおり RESULT_TAB / "results"）
+
+既定の課題（py-fnd-assessment-3）はコードに登録済み。追加の課題はリポジトリ直下の assignments.json
+（または --assignments-file）に同じ項目の JSON 配列で書く。同名なら上書き。
+
+    [{"name": "py-fnd-assessment-4", "filename": "py-fnd-assessment-4.py",
+      "tests_dir": "tests_assessment_4", "fixtures": ["sales.csv"], "result_tab": "assessment-4"}]
+"""
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from grader.sandbox import REPO_ROOT
+
+ASSIGNMENTS_FILE = "assignments.json"
+DEFAULT_ASSIGNMENT = "py-fnd-assessment-3"
+
+
+class Assignment:
+    """課題1つ分の設定。"""
+
+    def __init__(self, name: str, filename: str, tests_dir: str = "tests", fixtures_dir: str = "fixtures",
+                 fixtures: Sequence[str] = ("game_scores.csv",), timeout_sec: int = 120,
+                 test_timeout: int = 20, solution: Optional[str] = None, result_tab: Optional[str] = None):
+        self.name = name
+        self.filename = filename
+        self.tests_dir = tests_dir
+        self.fixtures_dir = fixtures_dir
+        self.fixtures = tuple(fixtures)
+        self.timeout_sec = timeout_sec
+        self.test_timeout = test_timeout
+        self.solution = solution
+        self.result_tab = result_tab
+
+    @property
+    def solution_path(self) -> Optional[Path]:
+        return REPO_ROOT / self.solution if self.solution else None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Assignment":
+        unknown = set(d) - {"name", "filename", "tests_dir", "fixtures_dir", "fixtures", "timeout_sec",
+                            "test_timeout", "solution", "result_tab"}
+        if unknown:
+            raise ValueError(f"課題 {d.get('name')!r} に不明な項目があります: {', '.join(sorted(unknown))}")
+        if not d.get("name") or not d.get("filename"):
+            raise ValueError(f"課題には name と filename が必要です: {d!r}")
+        return cls(**{"result_tab": d["name"], **d})
+
+    def __repr__(self) -> str:
+        return f"Assignment({self.name!r}, filename={self.filename!r}, tests_dir={self.tests_dir!r})"
+
+
+ASSIGNMENTS: Dict[str, Assignment] = {
+    DEFAULT_ASSIGNMENT: Assignment(DEFAULT_ASSIGNMENT, "py-fnd-assessment-3.py",
+                                   solution="py-fnd-assessment-3.solution.py"),
+}
+
+
+def default_assignment() -> Assignment:
+    return ASSIGNMENTS[DEFAULT_ASSIGNMENT]
+
+
+def load_assignments(path: str | Path | None = None) -> Dict[str, Assignment]:
+    """
+    登録済みの課題（名前 → Assignment、登録順）。path（既定: リポジトリ直下の assignments.json）があれば
+    その内容を足す。path を明示して読めないときは例外、既定のファイルが無いだけなら組み込みのみ。
+    """
+    registry = dict(ASSIGNMENTS)
+    file = Path(path) if path else REPO_ROOT / ASSIGNMENTS_FILE
+    if not file.exists() and path is None:
+        return registry
+    entries = json.loads(file.read_text(encoding="utf-8"))
+    if not isinstance(entries, list):
+        raise ValueError(f"{file} は課題の配列にしてください")
+    for d in entries:
+        a = Assignment.from_dict(d)
+        registry[a.name] = a
+    return registry
+
+
+def select(names: Iterable[str] | None, registry: Dict[str, Assignment] | None = None) -> List[Assignment]:
+    """--assignment の指定 → 採点する課題。未指定・"all" なら登録済みの全課題。"""
+    registry = registry if registry is not None else load_assignments()
+    names = list(names or [])
+    if not names or "all" in names:
+        return list(registry.values())
+    unknown = [n for n in names if n not in registry]
+    if unknown:
+        raise ValueError(f"登録されていない課題です: {', '.join(unknown)}（登録済み: {', '.join(registry)}）")
+    return [registry[n] for n in dict.fromkeys(names)]
@@ -0,0 +1,231 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from importlib import metadata
+from pathlib import Path
+
+# 採点結果に影響するパッケージ（バージョンが変わったらキャッシュは無効）
+TRACKED_PACKAGES = ("pytest", "pytest-timeout", "pandas", "numpy", "matplotlib", "japanize-matplotlib")
+
+# ヒット時に work へ戻す成果物
+CACHED_ARTIFACTS = ("events.jsonl", "junit.xml", "pytest.out", "average_scores.png")
+
+# 採点ロジック（集計・pytest 引数など）を変えたら上げる
+CACHE_SCHEMA = 6
+
+CACHE_DIR_DEFAULT = ".grader-cache"
+
+
+def _package_versions() -> str:
+    out = []
+    for name in TRACKED_PACKAGES:
+        try:
+            out.append(f"{name}=={metadata.version(name)}")
+        except metadata.PackageNotFoundError:
+            out.append(f"{name}==-")
+    return ";".join(out)
+
+
+def suite_digest(tests_dir: str = "tests", fixtures_dir: str = "fixtures", tiers: bool = True,
+                 fixtures=("game_scores.csv",), limits: dict | None = None, timeouts: tuple = ()) -> str:
+    """
+    テスト一式・フィクスチャ・インタプリタ/依存バージョンのダイジェスト。
+    tests_dir はリポジトリ基準、fixtures_dir は copy_fixtures と同じくカレント基準。
+    tiers（段・前提による blocked）を使うなら grader/tiers.py の宣言も含める（結果が変わるので）。
+    limits（ResourceLimits.to_dict()）と timeouts（課題の pytest 全体・テスト1件の秒数）も含める
+    （上限を変えると memory_limit / timeout だった人の結果が変わるので）。
+    """
+    repo_root = Path(__file__).resolve().parent.parent
+    h = hashlib.sha256()
+    h.update(f"schema={CACHE_SCHEMA}\n{sys.version}\n{_package_versions()}\n".encode())
+    tests_abs = (repo_root / tests_dir).resolve()
+    for p in sorted(tests_abs.rglob("*")):
+        if not p.is_file() or "__pycache__" in p.parts:
+            continue
+        h.update(p.relative_to(tests_abs).as_posix().encode() + b"\0")
+        h.update(p.read_bytes())
+    for name in fixtures:
+        h.update(b"fixture\0")
+        h.update((Path(fixtures_dir) / name).read_bytes())
+    if tiers:
+        h.update(b"tiers\0")
+        h.update((repo_root / "grader" / "tiers.py").read_bytes())
+    h.update(b"limits\0" + json.dumps(limits, sort_keys=True).encode())
+    h.update(b"timeouts\0" + json.dumps(list(timeouts)).encode())
+    return h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def result_key(submission_path: Path, suite: str) -> str:
+    h = hashlib.sha256()
+    h.update(suite.encode())
+    h.update(submission_path.read_bytes())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    採点結果のディスクキャッシュ（コンテンツアドレス）。
+      <root>/results/<key[:2]>/<key>/summary.json + 成果物
+    - 参照したエントリは mtime を更新（LRU）
+    - evict() で max_age_days 超過分を削除し、合計が max_bytes を下回るまで古い順に削除
+    """
+
+    def __init__(self, root: str = CACHE_DIR_DEFAULT, max_bytes: int = 512 * 1024 * 1024,
+                 max_age_days: float = 30):
+        self.root = Path(root) / "results"
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def get(self, key: str, work: Path) -> dict | None:
+        entry = self._entry(key)
+        try:
+            summary = json.loads((entry / "summary.json").read_text(encoding="utf-8"))
+            for name in CACHED_ARTIFACTS:
+                src = entry / name
+                if src.exists():
+                    shutil.copyfile(src, work / name)
+            os.utime(entry)
+        except (OSError, ValueError):
+            self._count(False)
+            return None
+        self._count(True)
+        return summary
+
+    def put(self, key: str, summary: dict, work: Path) -> None:
+        entry = self._entry(key)
+        if entry.exists():
+            return
+        tmp = entry.parent / f".tmp-{uuid.uuid4().hex}"
+        try:
+            tmp.mkdir(parents=True)
+            for name in CACHED_ARTIFACTS:
+                src = work / name
+                if src.exists():
+                    shutil.copyfile(src, tmp / name)
+            (tmp / "summary.json").write_text(json.dumps(summary, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, entry)
+        except OSError:
+            # 並列で同じキーが書かれた等。キャッシュなので失敗しても採点は続行
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def evict(self) -> int:
+        """古い/溢れたエントリを削除し、削除件数を返す。"""
+        if not self.root.exists():
+            return 0
+        entries = []
+        for shard in self.root.iterdir():
+            if not shard.is_dir():
+                continue
+            for e in shard.iterdir():
+                if e.name.startswith(".tmp-"):
+                    continue
+                size = sum(f.stat().st_size for f in e.iterdir() if f.is_file())
+                entries.append((e.stat().st_mtime, size, e))
+        entries.sort()  # 古い順
+        cutoff = time.time() - self.max_age_days * 86400
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, e in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            shutil.rmtree(e, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+class GistCache:
+    """
+    Gist 取得の HTTP キャッシュ（条件付きリクエスト用）。
+      <root>/gists/<key>/meta.json  … etag / last_modified / version（history[0].version）/ raw_url
+      <root>/gists/<key>/content    … 前回保存した提出ファイル
+    key は Gist ID（raw URL 直指定のときは URL のハッシュ）。
+    stats に 1 回の実行分のヒット/ミス数を数える。
+    """
+
+    def __init__(self, root: str = CACHE_DIR_DEFAULT):
+        self.root = Path(root) / "gists"
+        self._lock = threading.Lock()
+        self.stats = {
+            "not_modified": 0,      # 304 → 保存済みを再利用
+            "same_revision": 0,     # 200 だがリビジョン不変 → raw の再取得を省略
+            "miss": 0,              # raw をダウンロード
+            "api_requests": 0,      # Gist API を叩いた回数
+            "bytes_saved": 0,       # 再利用で省いた raw のバイト数
+            "rate_limit_remaining": None,
+        }
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    def note_rate_limit(self, resp) -> None:
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            with self._lock:
+                self.stats["rate_limit_remaining"] = int(remaining)
+
+    def _dir(self, key: str) -> Path:
+        return self.root / key
+
+    def load(self, key: str) -> dict:
+        """メタ情報（保存済み本文が無ければ空 dict）。"""
+        d = self._dir(key)
+        try:
+            meta = json.loads((d / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return meta if (d / "content").exists() else {}
+
+    def conditional_headers(self, meta: dict) -> dict:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def restore(self, key: str, dest_path: str) -> int:
+        """保存済み本文を dest_path にコピーし、バイト数を返す。"""
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        shutil.copyfile(self._dir(key) / "content", dest_path)
+        return os.path.getsize(dest_path)
+
+    def store(self, key: str, meta: dict, content: bytes | None = None) -> None:
+        """meta（と本文）をアトミックに書き込む。content=None ならメタだけ更新。"""
+        d = self._dir(key)
+        d.mkdir(parents=True, exist_ok=True)
+        suffix = f".tmp-{uuid.uuid4().hex}"
+        try:
+            if content is not None:
+                tmp = d / ("content" + suffix)
+                tmp.write_bytes(content)
+                os.replace(tmp, d / "content")
+            tmp = d / ("meta.json" + suffix)
+            tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, d / "meta.json")
+        except OSError:
+            pass
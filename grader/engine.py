@@ -0,0 +1,109 @@
+from __future__ import annotations
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def default_jobs() -> int:
+    """--jobs 未指定時の並列数（CPU数）。"""
+    return os.cpu_count() or 1
+
+
+def run_pipeline(items: Sequence[T], fetch_fn: Callable[[T], Any],
+                 grade_fn: Callable[[T, Any], R], jobs: int | None = None,
+                 fetch_jobs: int = 16, on_result: Callable[[int, R], None] | None = None,
+                 order: Sequence[int] | None = None,
+                 priority: Callable[[int, Any], float] | None = None) -> List[R]:
+    """
+    取得（ネットワーク）と採点（CPU/サブプロセス）を重ねて流す2段パイプライン。
+    - fetch_fn(item) を fetch_jobs 並列で実行し、終わったものから採点キューへ
+    - grade_fn(item, fetched) を jobs 個のワーカが取り出して実行
+    - fetch_fn の例外は fetched として grade_fn に渡す（行として扱うのは grade_fn 側）
+    - on_result(i, result) があれば、1件採点し終わるたびにそのワーカから呼ぶ（逐次書き出し・進捗表示用）
+    - order（位置の並び）があればその順に取得を始め、priority(i, fetched) があれば取得済みのうち値の小さいもの
+      から採点する（grader.scheduler で長くかかりそうな人から。既定はどちらも入力順）
+    結果は入力順のリストで返す。
+    """
+    n = len(items)
+    if n == 0:
+        return []
+    jobs = max(1, int(jobs or default_jobs()))
+    results: List[Any] = [None] * n
+    failures: List[BaseException] = []
+    ready: "queue.PriorityQueue" = queue.PriorityQueue()
+
+    def fetch_task(i: int) -> None:
+        try:
+            fetched = fetch_fn(items[i])
+        except Exception as e:
+            fetched = e
+        ready.put((priority(i, fetched) if priority is not None else i, i, fetched))
+
+    def worker() -> None:
+        while True:
+            _, i, fetched = ready.get()
+            if i >= n:  # 番兵
+                return
+            try:
+                results[i] = grade_fn(items[i], fetched)
+                if on_result is not None:
+                    on_result(i, results[i])
+            except BaseException as e:  # ワーカが黙って死なないよう最後に再送出
+                failures.append(e)
+
+    workers = [threading.Thread(target=worker, name=f"grade-{k}", daemon=True)
+               for k in range(min(jobs, n))]
+    for t in workers:
+        t.start()
+    with ThreadPoolExecutor(max_workers=max(1, min(fetch_jobs, n)), thread_name_prefix="fetch") as ex:
+        wait([ex.submit(fetch_task, i) for i in (order if order is not None else range(n))])
+    # 取得が全部終わってから番兵を入れる（優先度 inf なので実データの後に取り出される）
+    for k in range(len(workers)):
+        ready.put((float("inf"), n + k, None))
+    for t in workers:
+        t.join()
+    if failures:
+        raise failures[0]
+    return results
+
+
+class SingleFlight:
+    """
+    同じキーの処理を1回にまとめる（バイト単位で同一の提出を1回だけ採点するため）。
+    最初に claim() した呼び出しが leader（True）になり、処理後に Future.set_result() で結果を渡す。
+    以降の呼び出しは同じ Future を受け取って結果を待つ。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict = {}
+
+    def claim(self, key: str) -> Tuple[bool, Future]:
+        with self._lock:
+            fut = self._flights.get(key)
+            if fut is None:
+                fut = self._flights[key] = Future()
+                return True, fut
+            return False, fut
+
+
+def assign_workdirs(urls: Sequence[Tuple[str, str]]) -> List[Tuple[str, str, str]]:
+    """
+    (sid, url) に作業ディレクトリ名を割り当てる。
+    同じ sid が複数行あると並列時に .out/<sid> を取り合うので、2件目以降は <sid>__2, <sid>__3 ...
+    """
+    return list(iter_workdirs(urls))
+
+
+def iter_workdirs(urls: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str, str]]:
+    """assign_workdirs の逐次版（ロスターを読みながら採点を始めるとき用）。"""
+    seen: dict = {}
+    for sid, url in urls:
+        n = seen.get(sid, 0) + 1
+        seen[sid] = n
+        yield sid, url, sid if n == 1 else f"{sid}__{n}"
@@ -1,47 +1,301 @@
 from __future__ import annotations
+import hashlib
 import os
+import random
 import re
-import requests
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict
+from urllib.parse import quote, urlsplit
+
+from grader.cache import GistCache
+
+if TYPE_CHECKING:
+    import requests
 
 GIST_RE = re.compile(r"https?://gist\.github\.com/[^/]+/([0-9a-f]+)")
-RAW_RE = re.compile(r"https?://gist\.githubusercontent\.com/.+/raw/.+/py-fnd-assessment-3\.py")
+# raw URL はどのファイルのものでもよい（課題ごとのファイルは末尾を差し替えて取る）
+RAW_RE = re.compile(r"https?://gist\.githubusercontent\.com/.+/raw/.+/[^/]+$")
+TARGET_FILE = "py-fnd-assessment-3.py"
+
+# ローカルのスタブサーバで試すときは GITHUB_API_URL を差し替える（Actions でも同名の変数が入る）
+API_BASE_DEFAULT = "https://api.github.com"
+
+# 再試行する HTTP ステータス（レート制限・一時的なサーバエラー）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
 
 class FetchError(Exception):
     pass
 
-def detect_and_fetch(url: str, dest_path: str) -> None:
-    """URLがGistページ or raw URL のどちらでも py-fnd-assessment-3.py を取得して保存。"""
+
+class FetchClient:
+    """
+    Gist 取得用の HTTP クライアント。
+    - requests.Session でコネクションを keep-alive / プール
+    - 同時リクエスト数（全体・ホスト別）を上限付きで制御
+    - 429/5xx・通信エラーは指数バックオフ + ジッタで再試行（Retry-After があれば優先）
+    - token（既定: 環境変数 GITHUB_TOKEN）があれば API（api_base 配下）への要求にだけ Authorization を付ける
+    複数スレッドから同時に get() / post() してよい。
+    """
+
+    def __init__(self, max_in_flight: int = 16, per_host: int = 8, retries: int = 4,
+                 backoff: float = 0.5, max_backoff: float = 20.0, timeout: float = 15,
+                 api_base: str | None = None, token: str | None = None):
+        import requests  # 実際に取得するときだけ読む（run.py --help などの起動を軽くする）
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        self._network_errors = (requests.ConnectionError, requests.Timeout)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_in_flight)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.api_base = (api_base or os.environ.get("GITHUB_API_URL") or API_BASE_DEFAULT).rstrip("/")
+        self.graphql_url = os.environ.get("GITHUB_GRAPHQL_URL") or f"{self.api_base}/graphql"
+        self.token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._per_host = per_host
+        self._host_slots: dict = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            sem = self._host_slots.get(host)
+            if sem is None:
+                sem = self._host_slots[host] = threading.BoundedSemaphore(self._per_host)
+            return sem
+
+    def _sleep_before_retry(self, attempt: int, resp=None) -> None:
+        wait = None
+        if resp is not None:
+            ra = resp.headers.get("Retry-After")
+            if ra and ra.isdigit():
+                wait = float(ra)
+        if wait is None:
+            # full jitter: [0, backoff * 2^attempt]
+            wait = random.uniform(0, self.backoff * (2 ** attempt))
+        time.sleep(min(wait, self.max_backoff))
+
+    def _with_auth(self, url: str, headers: dict | None) -> dict | None:
+        if not self.token or not (url.startswith(self.api_base) or url.startswith(self.graphql_url)):
+            return headers
+        return {**(headers or {}), "Authorization": f"Bearer {self.token}"}
+
+    def get(self, url: str, headers: dict | None = None) -> requests.Response:
+        """GET（再試行込み）。最終的に通信できなければ FetchError。HTTP エラーは呼び出し側で判定。"""
+        return self.request("GET", url, headers=headers)
+
+    def post(self, url: str, json: dict, headers: dict | None = None) -> requests.Response:
+        return self.request("POST", url, headers=headers, json=json)
+
+    def request(self, method: str, url: str, headers: dict | None = None, **kwargs) -> requests.Response:
+        last_exc: Exception | None = None
+        headers = self._with_auth(url, headers)
+        for attempt in range(self.retries + 1):
+            resp = None
+            with self._slots, self._host_slot(url):
+                try:
+                    resp = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+                except self._network_errors as e:
+                    last_exc = e
+            if resp is not None and resp.status_code not in RETRY_STATUS:
+                return resp
+            if attempt == self.retries:
+                break
+            self._sleep_before_retry(attempt, resp)
+        if resp is not None:
+            return resp
+        raise FetchError(f"通信エラー: {type(last_exc).__name__}: {last_exc}")
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_client: FetchClient | None = None
+_default_lock = threading.Lock()
+
+
+def default_client() -> FetchClient:
+    """client 未指定時に共有するクライアント（逐次呼び出しでも接続を再利用する）。"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = FetchClient()
+        return _default_client
+
+
+def detect_and_fetch(url: str, dest_path: str, client: FetchClient | None = None,
+                     gist_cache: GistCache | None = None, resolved=None, filename: str = TARGET_FILE) -> dict:
+    """
+    URLがGistページ or raw URL のどちらでも filename（既定: py-fnd-assessment-3.py）を取得して保存。
+    gist_cache があれば ETag/Last-Modified の条件付きリクエストを送り、
+    304 やリビジョン（history[0].version）が前回と同じときは保存済みの本文を再利用する。
+    resolved（grader.resolver.Resolution）があれば GraphQL でまとめて取得済みの本文を使い、Gist API は呼ばない。
+    戻り値は取得情報（bytes: ダウンロードしたバイト数 / revision / cache: miss|not_modified|same_revision|graphql）。
+    """
+    info = fetch_files(url, {filename: dest_path}, client=client, gist_cache=gist_cache, resolved=resolved)[filename]
+    if isinstance(info, FetchError):
+        raise info
+    return info
+
+
+def fetch_files(url: str, dests: Dict[str, str], client: FetchClient | None = None,
+                gist_cache: GistCache | None = None, resolved=None) -> Dict[str, dict | FetchError]:
+    """
+    1つの Gist から複数のファイル（ファイル名 → 保存先）を取得する（複数の課題を採点するとき用）。
+    Gist API は1回だけ呼び、各ファイルの raw を取る。raw URL が指定されたときは、同じリビジョンの
+    別ファイル（URL の末尾のファイル名を差し替えたもの）を取る。
+    URL の形式・API エラーなど Gist 全体の失敗は FetchError を送出し、ファイルが無いなどファイル単位の失敗は
+    戻り値の値を FetchError にする（成功なら detect_and_fetch と同じ取得情報）。
+    """
+    client = client or default_client()
     url = url.strip()
+    if resolved is not None:
+        return _each(dests, lambda name, dest: _use_resolved(resolved, name, dest))
     if RAW_RE.match(url):
-        _fetch_raw(url, dest_path)
-        return
+        revision = _raw_revision(url)
+
+        def raw(name: str, dest: str) -> dict:
+            raw_url = _raw_url_for(url, name)
+            return _fetch_raw(client, raw_url, dest, gist_cache, key=_raw_key(raw_url), revision=revision)
+        return _each(dests, raw)
 
     m = GIST_RE.match(url)
     if not m:
         raise FetchError("サポートしていないURL形式です：" + url)
 
     gist_id = m.group(1)
-    api = f"https://api.github.com/gists/{gist_id}"
-    r = requests.get(api, timeout=15)
+    api = f"{client.api_base}/gists/{gist_id}"
+    metas = {name: gist_cache.load(_cache_key(gist_id, name)) for name in dests} if gist_cache else {}
+    # 条件付きリクエストは、全ファイルの本文が同じ応答（ETag）から保存済みのときだけ送る
+    validators = {(meta.get("etag"), meta.get("last_modified")) for meta in metas.values()}
+    cond = next(iter(metas.values())) if metas and all(metas.values()) and len(validators) == 1 else {}
+    r = client.get(api, headers=gist_cache.conditional_headers(cond) if gist_cache else None)
+    if gist_cache:
+        gist_cache.count("api_requests")
+        gist_cache.note_rate_limit(r)
+        if r.status_code == 304 and cond:
+            out = {}
+            for name, dest in dests.items():
+                gist_cache.count("not_modified")
+                gist_cache.count("bytes_saved", metas[name].get("size", 0))
+                gist_cache.restore(_cache_key(gist_id, name), dest)
+                out[name] = {"bytes": 0, "revision": metas[name].get("version"), "cache": "not_modified"}
+            return out
     if r.status_code != 200:
         raise FetchError(f"Gist APIエラー: {r.status_code}")
     data = r.json()
 
     files = data.get("files", {})
-    target = files.get("py-fnd-assessment-3.py")
+    history = data.get("history") or []
+    version = history[0].get("version") if history else None
+    return _each(dests, lambda name, dest: _fetch_gist_file(client, gist_id, files, name, dest, version,
+                                                           gist_cache, metas.get(name) or {}, r.headers))
+
+
+def _each(dests: Dict[str, str], fn) -> Dict[str, dict | FetchError]:
+    out: Dict[str, dict | FetchError] = {}
+    for name, dest in dests.items():
+        try:
+            out[name] = fn(name, dest)
+        except FetchError as e:
+            out[name] = e
+    return out
+
+
+def _cache_key(gist_id: str, filename: str) -> str:
+    # 既定の課題のファイルは従来どおり Gist ID をキーにする（既存のキャッシュをそのまま使える）
+    return gist_id if filename == TARGET_FILE else f"{gist_id}--{filename}"
+
+
+def _fetch_gist_file(client: FetchClient, gist_id: str, files: dict, name: str, dest_path: str,
+                     version: str | None, gist_cache: GistCache | None, meta: dict, headers) -> dict:
+    target = files.get(name)
     if not target:
-        raise FetchError("Gistに 'py-fnd-assessment-3.py' が見つかりません。含まれるファイル: " + ", ".join(files.keys()))
+        raise _missing_target(name, files.keys())
 
     raw_url = target.get("raw_url")
     if not raw_url:
         raise FetchError("raw_url を取得できませんでした")
 
-    _fetch_raw(raw_url, dest_path)
+    if gist_cache:
+        key = _cache_key(gist_id, name)
+        new_meta = {
+            "etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+            "version": version, "raw_url": raw_url, "size": meta.get("size", 0),
+        }
+        if meta and version and meta.get("version") == version:
+            gist_cache.count("same_revision")
+            gist_cache.count("bytes_saved", meta.get("size", 0))
+            gist_cache.store(key, new_meta)
+            gist_cache.restore(key, dest_path)
+            return {"bytes": 0, "revision": version, "cache": "same_revision"}
+        info = _fetch_raw(client, raw_url, dest_path, revision=version)
+        new_meta["size"] = info["bytes"]
+        gist_cache.count("miss")
+        gist_cache.store(key, new_meta, Path(dest_path).read_bytes())
+        return info
+
+    return _fetch_raw(client, raw_url, dest_path, revision=version)
+
+
+def _missing_target(filename: str, names) -> FetchError:
+    return FetchError(f"Gistに '{filename}' が見つかりません。含まれるファイル: " + ", ".join(names))
+
+
+def _use_resolved(resolved, filename: str, dest_path: str) -> dict:
+    """GraphQL で解決済みの Gist（本文も取得済み）を保存する。"""
+    text = resolved.texts.get(filename)
+    if text is None:
+        raise _missing_target(filename, resolved.files)
+    content = text.encode("utf-8")
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(dest_path, "wb") as f:
+        f.write(content)
+    return {"bytes": len(content), "revision": resolved.revision, "cache": "graphql"}
+
+
+def _raw_url_for(raw_url: str, filename: str) -> str:
+    """raw URL の末尾のファイル名を filename に差し替える（同じ Gist・同じリビジョンの別ファイル）。"""
+    return raw_url.rsplit("/", 1)[0] + "/" + quote(filename)
+
+
+def _raw_key(raw_url: str) -> str:
+    return "raw-" + hashlib.sha256(raw_url.encode()).hexdigest()[:32]
+
+
+def _raw_revision(raw_url: str) -> str | None:
+    """raw URL に含まれるリビジョン（.../raw/<sha>/file）。無ければ None。"""
+    mm = re.search(r"/raw/([0-9a-f]{40})/", raw_url)
+    return mm.group(1) if mm else None
+
 
-def _fetch_raw(raw_url: str, dest_path: str) -> None:
-    rr = requests.get(raw_url, timeout=15)
+def _fetch_raw(client: FetchClient, raw_url: str, dest_path: str,
+               gist_cache: GistCache | None = None, key: str | None = None,
+               revision: str | None = None) -> dict:
+    meta = gist_cache.load(key) if (gist_cache and key) else {}
+    headers = gist_cache.conditional_headers(meta) if meta else None
+    rr = client.get(raw_url, headers=headers)
+    if gist_cache and key:
+        if rr.status_code == 304 and meta:
+            gist_cache.count("not_modified")
+            gist_cache.count("bytes_saved", meta.get("size", 0))
+            gist_cache.restore(key, dest_path)
+            return {"bytes": 0, "revision": revision, "cache": "not_modified"}
     if rr.status_code != 200:
         raise FetchError(f"raw取得エラー: {rr.status_code}")
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
     with open(dest_path, "wb") as f:
         f.write(rr.content)
+    if gist_cache and key:
+        gist_cache.count("miss")
+        gist_cache.store(key, {
+            "etag": rr.headers.get("ETag"), "last_modified": rr.headers.get("Last-Modified"),
+            "version": revision, "size": len(rr.content),
+        }, rr.content)
+    return {"bytes": len(rr.content), "revision": revision, "cache": "miss"}
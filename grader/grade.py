@@ -1,16 +1,39 @@
 from __future__ import annotations
 from pathlib import Path
 import xml.etree.ElementTree as ET
+import os
 import re
 import json
+import shutil
+import subprocess
+from typing import TYPE_CHECKING
 
-from grader.fetch import detect_and_fetch, FetchError
-from grader.sandbox import prepare_workdir, copy_fixtures, run_pytests
+from grader.fetch import detect_and_fetch, fetch_files, FetchError, FetchClient, TARGET_FILE
+from grader.sandbox import prepare_workdir, copy_fixtures, run_pytests, EVENTS_NAME, ResourceLimits
+from grader.engine import run_pipeline, assign_workdirs, default_jobs, SingleFlight
+from grader.cache import ResultCache, GistCache, suite_digest, result_key, file_digest, CACHE_DIR_DEFAULT
+from grader.ledger import Ledger, LEDGER_NAME
+from grader.trace import Tracer, NULL_TRACER, write_step_summary, total_wall
+from grader.workspace import WorkspaceManager
+from grader.resolver import resolve_gists, BATCH_SIZE_DEFAULT
+from grader.precheck import precheck as run_precheck
+from grader.tiers import BLOCKED
+from grader.assignments import Assignment, default_assignment, load_assignments, DEFAULT_ASSIGNMENT
+from grader.archive import ARCHIVE_NAME, Archive, pack_dirs, summary_line
+from grader.scheduler import Scheduler, load_schedule, save_schedule, timed_out, REDUCED_TIMEOUT_SEC, SCHEDULE_NAME
+from grader.shard import (
+    shard_indices, write_manifest, read_manifest, load_durations, save_durations, DURATIONS_NAME,
+)
 from grader.report import (
-    write_reports,
-    push_results_wide_to_google_sheets,  # ← 追加：横展開で1枚に追記
+    StreamingReport,
+    push_results_wide_to_google_sheets,  # ← 追加：横展開で1枚に upsert
+    push_analytics_to_google_sheets,
+    _resource_cells,
 )
 
+if TYPE_CHECKING:
+    from grader.similarity import MinHashIndex  # NumPy を読むので、類似度の検出を使うときだけ import
+
 
 def _parse_pytest_fallback(log_path: Path) -> dict:
     """junit.xml が無い/読めない時のフォールバック：pytest.out をざっくり集計。"""
@@ -78,14 +101,18 @@ def _parse_junit(junit_path: Path) -> dict:
                 elif tc.find("error") is not None:
                     outcome = "error"
                 elif tc.find("skipped") is not None:
-                    outcome = "skipped"
+                    # 前提が通らず実行しなかったテスト（grader.pytest_plugin が skip したもの）
+                    blocked = "[blocked]" in (tc.find("skipped").get("message") or "")
+                    outcome = BLOCKED if blocked else "skipped"
                 tsec = float(tc.get("time", 0) or 0)
                 testcases.append({"name": dotted, "outcome": outcome, "time": tsec})
 
         passed = max(0, total - failed - errors - skipped)
+        blocked = sum(1 for tc in testcases if tc["outcome"] == BLOCKED)
         return {
             "source": "junit",
-            "total_tests": total, "passed": passed, "failed": failed, "errors": errors, "skipped": skipped,
+            "total_tests": total, "passed": passed, "failed": failed, "errors": errors,
+            "skipped": skipped - blocked, "blocked": blocked,
             "tests": testcases,
         }
 
@@ -94,28 +121,257 @@ def _parse_junit(junit_path: Path) -> dict:
         return _parse_pytest_fallback(junit_path.with_name("pytest.out"))
 
 
-def grade_one(sid: str, url: str, out_dir: str) -> dict:
-    work = prepare_workdir(out_dir, sid)
-    submission_path = work / "submission.py"
+def _parse_events(events_path: Path) -> dict | None:
+    """
+    grader.pytest_plugin が書いた events.jsonl から集計（JUnit と同じ dict 形式 + 失敗メッセージ）。
+    途中で kill された場合は、収集済みなのに結果が無いテストを error（未実行）として数え、partial=True。
+    ファイルが無い/収集前に落ちた場合は None（呼び出し側で JUnit → pytest.out にフォールバック）。
+    """
+    if not events_path.exists():
+        return None
+    collected: list = []
+    tests: dict = {}
+    finished = False
+    with open(events_path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue  # kill された瞬間の書きかけ行
+            kind = ev.get("event")
+            if kind == "collected":
+                collected = list(ev.get("tests") or [])
+            elif kind in ("test", "collect_error"):
+                tests[ev["name"]] = {
+                    "name": ev["name"],
+                    "outcome": ev.get("outcome", "error"),
+                    "time": float(ev.get("time", 0) or 0),
+                    "message": ev.get("message", ""),
+                }
+            elif kind == "finished":
+                finished = True
+    if not collected and not tests:
+        return None
+
+    for name in collected:
+        if name not in tests:
+            tests[name] = {"name": name, "outcome": "error", "time": 0.0, "message": "未実行（中断されました）"}
+    order = {name: i for i, name in enumerate(collected)}
+    testcases = sorted(tests.values(), key=lambda tc: order.get(tc["name"], len(order)))
+
+    def count(outcome: str) -> int:
+        return sum(1 for tc in testcases if tc["outcome"] == outcome)
+
+    return {
+        "source": "events", "partial": not finished,
+        "total_tests": len(testcases), "passed": count("passed"), "failed": count("failed"),
+        "errors": count("error"), "skipped": count("skipped"), "blocked": count(BLOCKED),
+        "tests": testcases,
+    }
+
+
+def fetch_one(sid: str, url: str, out_dir: str, work_name: str | None = None,
+              client: FetchClient | None = None, gist_cache: GistCache | None = None,
+              tracer: Tracer | None = None, workspaces: WorkspaceManager | None = None,
+              resolved=None, filename: str = TARGET_FILE) -> tuple:
+    """
+    取得段：.out/<sid>（workspaces があればその作業場所）を用意して Gist の filename を submission.py として保存。
+    FetchError は例外ではなく戻り値で返す。resolved（GraphQL で解決済みの Gist）があれば Gist API は呼ばない。
+    戻り値は (work, 取得情報 or FetchError, perf)。perf は計測値の dict で、採点段に引き継ぐ。
+    """
+    tracer = tracer or NULL_TRACER
+    perf = {"timings": {}, "bytes_fetched": 0}
+    if workspaces is not None:
+        work = workspaces.scratch(work_name or sid)
+    else:
+        work = prepare_workdir(out_dir, work_name or sid)
+    with tracer.span("fetch", perf["timings"], student_id=sid) as ev:
+        try:
+            info = detect_and_fetch(url, str(work / "submission.py"), client=client, gist_cache=gist_cache,
+                                    resolved=resolved, filename=filename)
+        except FetchError as e:
+            ev["error"] = str(e)
+            return work, e, perf
+        perf["bytes_fetched"] = info.get("bytes", 0)
+        ev.update(bytes=perf["bytes_fetched"], cache=info.get("cache"))
+    return work, info, perf
+
+
+def fetch_assignments(sid: str, url: str, work_name: str | None, runs: list,
+                      client: FetchClient | None = None, gist_cache: GistCache | None = None,
+                      tracer: Tracer | None = None, resolved=None) -> dict:
+    """
+    取得段（課題ごと）：1つの Gist から runs（_AssignmentRun）の各課題のファイルを取り、課題ごとの作業場所に
+    submission.py として保存する。Gist API（GraphQL で解決済みならその本文）は1回だけ使う。
+    戻り値は {課題名: (work, 取得情報 or FetchError, perf)}。
+    """
+    tracer = tracer or NULL_TRACER
+    timings: dict = {}
+    works = {run.assignment.name: run.workspaces.scratch(work_name or sid) for run in runs}
+    dests: dict = {}
+    for run in runs:  # 同じファイルを使う課題が複数あれば、1回取って残りはコピー
+        dests.setdefault(run.assignment.filename, str(works[run.assignment.name] / "submission.py"))
+    with tracer.span("fetch", timings, student_id=sid) as ev:
+        try:
+            infos = fetch_files(url, dests, client=client, gist_cache=gist_cache, resolved=resolved)
+        except FetchError as e:
+            ev["error"] = str(e)
+            infos = {name: e for name in dests}
+        ok = [i for i in infos.values() if isinstance(i, dict)]
+        ev.update(bytes=sum(i.get("bytes", 0) for i in ok), cache=",".join(sorted({i.get("cache") or "" for i in ok})))
+    out = {}
+    for run in runs:
+        a = run.assignment
+        work, info = works[a.name], infos[a.filename]
+        if isinstance(info, dict) and dests[a.filename] != str(work / "submission.py"):
+            shutil.copyfile(dests[a.filename], work / "submission.py")
+        perf = {"timings": dict(timings), "bytes_fetched": info.get("bytes", 0) if isinstance(info, dict) else 0}
+        out[a.name] = (work, info, perf)
+    return out
+
+
+def assignment_suite(a: Assignment, tiers: bool = True, limits: ResourceLimits | None = None) -> str:
+    """結果キャッシュ・台帳のキーに使う、課題のテスト一式・資源の上限・タイムアウトのダイジェスト。"""
+    return suite_digest(a.tests_dir, a.fixtures_dir, tiers=tiers, fixtures=a.fixtures,
+                        limits=limits.to_dict() if limits else None, timeouts=(a.timeout_sec, a.test_timeout))
+
+
+def grade_fetched(sid: str, url: str, work: Path, fetched,
+                  cache: ResultCache | None = None, suite: str | None = None,
+                  runner=None, ledger: Ledger | None = None, incremental: bool = False,
+                  junit: bool = True, tracer: Tracer | None = None, perf: dict | None = None,
+                  limits: ResourceLimits | None = None,
+                  workspaces: WorkspaceManager | None = None, precheck: bool = True,
+                  tiers: bool = True, assignment: Assignment | None = None,
+                  timeout_sec: float | None = None) -> dict:
+    """
+    採点段：fetch_one の結果を受けて pytest を実行し、集計する。
+    各段階の wall/CPU 時間・pytest の peak RSS / CPU 秒は result["perf"] に入る（tracer があれば trace にも）。
+    limits（ResourceLimits）で pytest プロセスのメモリ / CPU 秒 / プロセス数を制限し、
+    ピークメモリ・CPU 秒・終了理由を result の peak_mem_mb / cpu_sec / termination に記録する。
+    workspaces（WorkspaceManager）があれば fixtures は共有コピーへのリンクにし、実行後に改ざんを確かめる。
+    cache があれば submission + テスト一式(suite) のダイジェストで結果を再利用する。
+    runner（ZygoteRunner）があれば pytest はサブプロセスではなく zygote から fork して実行する。
+    ledger があれば結果を台帳に記録し、incremental なら提出・テスト一式が前回と同じ人は台帳の結果を使う。
+    precheck なら先に静的チェック（grader.precheck）をし、どのテストも通りようがなければ pytest を起動しない。
+    tiers なら grader.tiers の段の順に実行し、前提のテストが通らなかったテストは実行せずに blocked にする。
+    assignment（grader.assignments.Assignment、既定は py-fnd-assessment-3）のテスト・fixtures・タイムアウトで採点する。
+    timeout_sec があれば pytest 全体のタイムアウトは課題の timeout_sec ではなくこちら（grader.scheduler の短縮）。
+    """
+    tracer = tracer or NULL_TRACER
+    a = assignment or default_assignment()
+    perf = perf if perf is not None else {"timings": {}, "bytes_fetched": 0}
+    timings = perf["timings"]
     result = {"student_id": sid, "gist_url": url, "notes": ""}
 
-    try:
-        detect_and_fetch(url, str(submission_path))
-    except FetchError as e:
+    if isinstance(fetched, FetchError):
         result.update({
             "source": "fetch_error",
             "passed": 0, "failed": 0, "errors": 0, "skipped": 0, "total_tests": 0,
-            "tests": [], "notes": f"FetchError: {e}",
+            "tests": [], "notes": f"FetchError: {fetched}",
         })
+        result["perf"] = perf
         return result
 
-    copy_fixtures(work)
-    _ = run_pytests(work)
+    suite = suite or assignment_suite(a, tiers=tiers, limits=limits)
+    revision = fetched.get("revision") if isinstance(fetched, dict) else None
+    sub_hash = file_digest(work / "submission.py")
+    if ledger is not None and incremental:
+        prev = ledger.get(sid, url)
+        if prev and prev["submission_hash"] == sub_hash and prev["suite_hash"] == suite:
+            result.update(prev["summary"])
+            result["incremental"] = "unchanged"
+            result["perf"] = perf
+            return result
+
+    if precheck:
+        with tracer.span("precheck", timings, student_id=sid) as ev:
+            pre = run_precheck(work / "submission.py", a.tests_dir, tiers=tiers)
+            ev["skip_pytest"] = pre.skip_pytest
+        if pre.skip_pytest:
+            summary = pre.summary()
+            result.update(summary)
+            result["notes"] = f"Precheck: {pre.reason}"
+            result["perf"] = perf
+            if ledger is not None:
+                ledger.record(sid, url, revision, sub_hash, suite, summary)
+            _write_debug(work, result)
+            return result
+
+    with tracer.span("copy_fixtures", timings, student_id=sid):
+        if workspaces is not None:
+            lease = workspaces.link_fixtures(work)
+        else:
+            copy_fixtures(work, a.fixtures_dir, a.fixtures)
+
+    key = None
+    if cache is not None:
+        with tracer.span("cache_lookup", timings, student_id=sid) as ev:
+            key = result_key(work / "submission.py", suite)
+            cached = cache.get(key, work)
+            ev["hit"] = cached is not None
+        if cached is not None:
+            result.update(cached)
+            result["cached"] = True
+            result["perf"] = perf
+            if ledger is not None:
+                ledger.record(sid, url, revision, sub_hash, suite, cached)
+            _write_debug(work, result)
+            return result
+
+    timeout_hit = None
+    run_stats: dict = {}
+    with tracer.span("pytest", timings, student_id=sid) as ev:
+        try:
+            _ = run_pytests(work, a.tests_dir, timeout_sec or a.timeout_sec, runner=runner, junit=junit, stats=run_stats,
+                            limits=limits, tiers=tiers, test_timeout=a.test_timeout)
+        except subprocess.TimeoutExpired as e:
+            timeout_hit = e.timeout
+        ev.update(run_stats)
+    if run_stats:
+        perf["peak_rss_kb"] = run_stats.get("peak_rss_kb")
+        perf["pytest_cpu_sec"] = run_stats.get("cpu_sec")
+    # 自分のリンクも確かめる（同じ共有コピーを他の受講生が書き換えていたら、この実行も影響を受けている）
+    tampered = workspaces.check_fixtures(work, lease) if workspaces is not None else []
 
-    junit = work / "junit.xml"
-    summary = _parse_junit(junit)
+    # 集計は events.jsonl（プラグイン）→ junit.xml → pytest.out の順で使えるもの
+    with tracer.span("parse", timings, student_id=sid):
+        summary = _parse_events(work / EVENTS_NAME) or _parse_junit(work / "junit.xml")
+    # 資源の実測もサマリに含める（キャッシュ・台帳から再利用したときも列が埋まるように）
+    if run_stats.get("peak_rss_kb") is not None:
+        summary["peak_mem_mb"] = round(run_stats["peak_rss_kb"] / 1024, 1)
+    if run_stats.get("cpu_sec") is not None:
+        summary["cpu_sec"] = run_stats["cpu_sec"]
+    summary["termination"] = run_stats.get("termination", "")
     result.update(summary)
+    result["perf"] = perf
+    if timeout_hit is not None:
+        result["notes"] = f"Timeout: pytest が {timeout_hit} 秒以内に終わりませんでした（途中までの結果）"
+    elif result["termination"] not in ("exited", ""):
+        result["notes"] = f"{_TERMINATION_NOTES.get(result['termination'], '異常終了')}（{result['termination']}）"
+    if result["termination"] not in ("exited", ""):
+        result["notes"] += f" peak={result.get('peak_mem_mb', '?')}MB cpu={result.get('cpu_sec', '?')}s"
+    if tampered:
+        result["notes"] = (result["notes"] + " " if result["notes"] else "") + \
+            f"共有 fixtures（{', '.join(tampered)}）が実行中に書き換えられたため、この結果は保存しません（元に戻しました）"
+    complete = (summary.get("source") in ("events", "junit") and not summary.get("partial")
+                and timeout_hit is None and not tampered)
+    if cache is not None and complete:  # 途中結果・フォールバック集計は保存しない
+        cache.put(key, summary, work)
+    if ledger is not None and complete:
+        ledger.record(sid, url, revision, sub_hash, suite, summary)
 
+    _write_debug(work, result)
+    return result
+
+
+_TERMINATION_NOTES = {
+    "cpu_limit": "CPU 時間の上限に達して停止しました",
+    "memory_limit": "メモリ上限に達しました",
+}
+
+
+def _write_debug(work: Path, result: dict) -> None:
     # デバッグ出力
     try:
         (work / "summary_debug.json").write_text(
@@ -124,19 +380,603 @@ def grade_one(sid: str, url: str, out_dir: str) -> dict:
     except Exception:
         pass
 
+
+def grade_one(sid: str, url: str, out_dir: str, work_name: str | None = None,
+              client: FetchClient | None = None, cache: ResultCache | None = None) -> dict:
+    work, fetched, perf = fetch_one(sid, url, out_dir, work_name, client)
+    return grade_fetched(sid, url, work, fetched, cache=cache, perf=perf)
+
+
+# 同一提出の結果を写すときに引き継がない（受講生ごと・実行ごとの）項目
+_PER_STUDENT_KEYS = ("student_id", "gist_url", "notes", "perf", "cached", "incremental")
+
+
+def _grade_deduped(sid: str, url: str, work: Path, info, perf: dict, dedup: SingleFlight, **kwargs) -> dict:
+    """
+    バイト単位で同一の提出は最初の1人（leader）だけ採点し、残りはその結果を写す。
+    leader が例外で終わったときは、待っていた側が自分で採点する。
+    """
+    is_leader, fut = dedup.claim(file_digest(work / "submission.py"))
+    if is_leader:
+        result = None
+        try:
+            result = grade_fetched(sid, url, work, info, perf=perf, **kwargs)
+            return result
+        finally:
+            fut.set_result(result)
+    leader = fut.result()
+    if leader is None:
+        return grade_fetched(sid, url, work, info, perf=perf, **kwargs)
+    result = {"student_id": sid, "gist_url": url}
+    result.update({k: v for k, v in leader.items() if k not in _PER_STUDENT_KEYS})
+    result["duplicate_of"] = leader["student_id"]
+    note = f"同一提出（{leader['student_id']}）の結果を使用"
+    result["notes"] = f"{leader['notes']} {note}" if leader.get("notes") else note
+    result["perf"] = perf
+    _write_debug(work, result)
     return result
 
 
+def grade_fetched_safe(sid: str, url: str, fetched, workspaces: WorkspaceManager | None = None,
+                       index: MinHashIndex | None = None, dedup: SingleFlight | None = None,
+                       **kwargs) -> dict:
+    """
+    並列実行用：1人分の想定外の例外でバッチ全体を落とさないよう、結果行に変換する。
+    workspaces があれば、最後に残す成果物を <out>/<name> へ移して作業場所を片付ける。
+    index（MinHashIndex）があれば取得できた提出を類似度の索引に加え、
+    dedup（SingleFlight）があれば同一の提出は1回だけ採点する。
+    """
+    work = None
+    try:
+        if isinstance(fetched, BaseException):  # 取得段で FetchError 以外の例外が出た
+            raise fetched
+        work, info, perf = fetched
+        if isinstance(info, FetchError):
+            return grade_fetched(sid, url, work, info, perf=perf, workspaces=workspaces, **kwargs)
+        if index is not None:
+            index.add(work.name, (work / "submission.py").read_bytes())
+        if dedup is not None:
+            return _grade_deduped(sid, url, work, info, perf, dedup, workspaces=workspaces, **kwargs)
+        return grade_fetched(sid, url, work, info, perf=perf, workspaces=workspaces, **kwargs)
+    except subprocess.TimeoutExpired as e:
+        note = f"Timeout: pytest が {e.timeout} 秒以内に終わりませんでした"
+    except Exception as e:
+        note = f"InternalError: {type(e).__name__}: {e}"
+    finally:
+        if workspaces is not None and work is not None:
+            workspaces.finish(work)
+    return {
+        "student_id": sid, "gist_url": url, "source": "grader_error",
+        "passed": 0, "failed": 0, "errors": 0, "skipped": 0, "total_tests": 0,
+        "tests": [], "notes": note,
+    }
+
+
+def _attach_similarity(index: MinHashIndex, tasks: list, results: list, out_dir: str) -> tuple:
+    """類似ペアをクラスタにまとめ、result["similarity"] と <out>/similarity.csv に出力する。"""
+    from grader.similarity import write_similarity_csv
+    pairs = index.pairs()
+    clusters = index.clusters(pairs)
+    labels = {t[2]: t[0] for t in tasks}  # 作業ディレクトリ名 → student_id
+    for t, r in zip(tasks, results):
+        c = clusters.get(t[2])
+        if c is not None:
+            r["similarity"] = {"cluster": c["cluster"], "size": c["size"], "max_similarity": c["max_similarity"],
+                               "peers": [labels.get(p, p) for p in c["peers"]]}
+    write_similarity_csv(str(Path(out_dir) / "similarity.csv"), pairs, clusters, labels)
+    return pairs, clusters
+
+
+def _similarity_index(assignment: Assignment, threshold: float) -> MinHashIndex:
+    from grader.similarity import MinHashIndex
+    # 模範解答と共通の部分は除いて比べる
+    solution = assignment.solution_path
+    return MinHashIndex(threshold=threshold,
+                        base=[solution.read_bytes()] if solution is not None and solution.exists() else [])
+
+
+def assignment_out_dir(out_dir: str, assignment: Assignment, multi: bool) -> str:
+    """課題の出力先。課題が1つなら従来どおり <out>、複数なら <out>/<課題名>。"""
+    return str(Path(out_dir) / assignment.name) if multi else out_dir
+
+
+class _AssignmentRun:
+    """grade_all の課題1つ分：出力先・作業場所・台帳・類似度の索引・同一提出の1回採点・逐次レポート。"""
+
+    def __init__(self, assignment: Assignment, out_dir: str, total: int, workspace: str = "disk",
+                 similarity: bool = True, similarity_threshold: float = 0.8, dedup: bool = True,
+                 tiers: bool = True, label: str | None = None, limits: ResourceLimits | None = None):
+        self.assignment = assignment
+        self.out_dir = out_dir
+        self.label = label
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        # 作業場所（disk: <out>/<name> で直接 / ram: /dev/shm で実行し成果物だけ <out> へ）。fixtures は共有コピーをリンク
+        self.workspaces = WorkspaceManager(out_dir, mode=workspace, fixtures_dir=assignment.fixtures_dir,
+                                           fixtures=assignment.fixtures)
+        self.suite = assignment_suite(assignment, tiers=tiers, limits=limits)
+        # 台帳は毎回更新し、--incremental のときだけ「前回と同じ提出」を採点せずに台帳の結果で埋める
+        self.ledger = Ledger(Path(out_dir) / LEDGER_NAME)
+        self.index = _similarity_index(assignment, similarity_threshold) if similarity else None
+        self.flights = SingleFlight() if dedup else None
+        # 終わった人から results.jsonl / results.csv に追記し、進捗をログに出す
+        self.report = StreamingReport(out_dir, total=total, label=label)
+        self.results: list = []
+
+    def tag(self, name: str) -> str:
+        """ログの接頭辞（課題が複数なら課題名を付ける）。"""
+        return f"[{name}] {self.label}:" if self.label else f"[{name}]"
+
+    def close(self) -> None:
+        self.ledger.close()
+        self.workspaces.close()
+
+
 def grade_all(list_path: str | None, out_dir: str, push_to_sheets: bool = False,
-              sheet_id: str | None = None, sheet_tab: str | None = None) -> None:
+              sheet_id: str | None = None, sheet_tab: str | None = None,
+              jobs: int | None = None, fetch_jobs: int = 16,
+              use_cache: bool = True, cache_dir: str | None = None,
+              runner: str = "subprocess", run_tag: str | None = None,
+              incremental: bool = False, junit: bool = True,
+              limits: ResourceLimits | None = None, workspace: str = "disk",
+              graphql: bool = True, graphql_batch: int = BATCH_SIZE_DEFAULT,
+              similarity: bool = True, similarity_threshold: float = 0.8, dedup: bool = True,
+              shard: tuple | None = None, precheck: bool = True, tiers: bool = True,
+              assignments: list | None = None, analytics: bool = True,
+              analytics_tab: str | None = None, archive: bool = False, schedule: bool = True,
+              reduced_timeout_sec: float | None = REDUCED_TIMEOUT_SEC) -> None:
+    """
+    ロスター全員を採点して <out> にレポートを書く（push_to_sheets なら Sheets にも upsert）。
+    shard=(i, N) ならロスターを N 分割した i 番目だけを採点し、<out>/shard.json を書く。
+    Sheets への書き込みはせず、run.py merge（merge_shards）でまとめてから行う。
+    assignments（grader.assignments.Assignment のリスト、既定は py-fnd-assessment-3 のみ）が複数なら、
+    Gist は1人1回だけ取得して全課題を同じパイプラインで採点し、課題ごとに <out>/<課題名> へ書く。
+    analytics なら採点後にコホート全体の集計（grader.analytics）を analytics.csv / analytics.json に書き、
+    analytics_tab があれば Sheets のそのタブ（課題が複数なら <タブ>-<課題名>）にも書く。
+    archive なら最後に受講生ごとの成果物を <out>/artifacts.grarc（grader.archive）にまとめ、個別のディレクトリは消す。
+    schedule なら前回の所要時間から長くかかりそうな人を先に採点し（grader.scheduler）、前回タイムアウトした人は
+    reduced_timeout_sec で走らせて、切れたら最後に本来のタイムアウトでやり直す（None で短縮しない）。
+    """
     from grader.sources import load_from_file, load_from_sheet
-    urls = load_from_sheet(sheet_id, sheet_tab) if sheet_id else load_from_file(list_path)
+    assignments = list(assignments or [default_assignment()])
+    multi = len(assignments) > 1
+    limits = limits or ResourceLimits()  # 既定の上限（無制限にするなら ResourceLimits(None, None, None)）
+    # 各段階の計測（<out>/trace.json に Chrome trace 形式で出力、Perfetto で開ける）
+    tracer = Tracer()
+    run_timings: dict = {}
+    with tracer.span("load_roster", run_timings, cat="run", source="sheet" if sheet_id else "file"):
+        # シートは必要な列だけを読み、GistURL の列が前回と同じなら <cache_dir>/rosters/ のスナップショットを使う
+        urls = (load_from_sheet(sheet_id, sheet_tab, cache_dir=(cache_dir or CACHE_DIR_DEFAULT) if use_cache else None)
+                if sheet_id else load_from_file(list_path))
+
+    # 取得（fetch_jobs 並列）と採点（jobs 並列）をパイプラインで重ねる。
+    # 結果は入力順のまま1つのリストにまとめる
+    tasks = assign_workdirs(urls)  # シャードに分ける前にロスター全体で決める（シャード間で名前がぶつからないように）
+    durations_path = Path(cache_dir or CACHE_DIR_DEFAULT) / DURATIONS_NAME
+    if shard is not None:
+        durations = load_durations(durations_path)
+        indices = shard_indices(tasks, shard[0], shard[1], durations)
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        write_manifest(out_dir, shard[0], shard[1], len(tasks), "duration" if durations else "hash",
+                       tasks, indices, assignments=[a.name for a in assignments])
+        print(f"[shard] {shard[0]}/{shard[1]}: {len(indices)}/{len(tasks)} 人を採点します"
+              f"（{'所要時間の履歴' if durations else 'ハッシュ'}で分割）", flush=True)
+        tasks = [tasks[i] for i in indices]
+        if push_to_sheets:
+            print("[shard] Sheets への書き込みは run.py merge で行います", flush=True)
+            push_to_sheets = False
+    client = FetchClient(max_in_flight=fetch_jobs)
+    # GITHUB_TOKEN があれば Gist の本文を GraphQL でまとめて取得（失敗分・raw URL は従来どおり1件ずつ）
+    resolved: dict = {}
+    graphql_stats = None
+    if graphql:
+        with tracer.span("resolve_gists", run_timings, cat="run") as ev:
+            resolved, graphql_stats = resolve_gists([t[1] for t in tasks], client, batch_size=graphql_batch,
+                                                    filenames=[a.filename for a in assignments])
+            ev.update(graphql_stats)
+    cache = ResultCache(cache_dir or CACHE_DIR_DEFAULT) if use_cache else None
+    gist_cache = GistCache(cache_dir or CACHE_DIR_DEFAULT) if use_cache else None
+    runs = []
+    try:
+        for a in assignments:
+            runs.append(_AssignmentRun(a, assignment_out_dir(out_dir, a, multi), len(tasks), workspace=workspace,
+                                       similarity=similarity, similarity_threshold=similarity_threshold,
+                                       dedup=dedup, tiers=tiers, label=a.name if multi else None,
+                                       limits=limits))
+    except BaseException:
+        for run in runs:
+            run.report.close()
+            run.close()
+        client.close()
+        raise
+    for run in runs:
+        unfinished = run.ledger.start_run()
+        if unfinished and incremental:
+            print(f"{run.tag('ledger')} 前回の実行 {', '.join(unfinished)} は途中で終了しています。続きから再開します",
+                  flush=True)
+    zygote = None
+    if runner == "zygote":
+        from grader.zygote import ZygoteRunner
+        zygote = ZygoteRunner()
+    # 採点の単位は（受講生, 課題）。Gist の取得は受講生ごとに1回だけ（最初に来た課題が全課題分を取る）
+    items = [(t, run) for t in tasks for run in runs]
+    fetches = SingleFlight()
+    schedule_path = Path(cache_dir or CACHE_DIR_DEFAULT) / SCHEDULE_NAME
+    scheduler = None
+    if schedule:
+        scheduler = Scheduler(tasks, load_durations(durations_path), load_schedule(schedule_path),
+                              jobs=max(1, int(jobs or default_jobs())),
+                              timeout_sec=max(a.timeout_sec for a in assignments),
+                              reduced_timeout_sec=reduced_timeout_sec)
+
+    def fetch(item):
+        t, run = item
+        is_leader, fut = fetches.claim(t[2])
+        if is_leader:
+            try:
+                fut.set_result(fetch_assignments(t[0], t[1], t[2], runs, client, gist_cache, tracer,
+                                                 resolved.get(t[1].strip())))
+            except BaseException as e:
+                fut.set_exception(e)
+        return fut.result()[run.assignment.name]
+
+    def reduced_timeout(item) -> float | None:
+        t, run = item
+        return scheduler.timeout_for(t[2], run.assignment.timeout_sec) if scheduler is not None else None
+
+    def grade(item, fetched, full_timeout: bool = False, flights: dict | None = None):
+        t, run = item
+        return grade_fetched_safe(t[0], t[1], fetched, cache=cache, suite=run.suite, runner=zygote,
+                                  ledger=run.ledger, incremental=incremental, junit=junit, tracer=tracer,
+                                  limits=limits, workspaces=run.workspaces, index=run.index,
+                                  dedup=flights[run.assignment.name] if flights is not None else run.flights,
+                                  precheck=precheck, tiers=tiers, assignment=run.assignment,
+                                  timeout_sec=None if full_timeout else reduced_timeout(item))
+
+    predicted_makespan = scheduler.predicted_makespan() if scheduler is not None else None
+
+    def priority(i: int, fetched) -> float:
+        return scheduler.priority(items[i][0][2], _submission_size(fetched))
+
+    try:
+        with tracer.span("grade_pipeline", run_timings, cat="run", students=len(tasks),
+                         assignments=len(runs)) as ev:
+            order = None
+            if scheduler is not None:
+                order = [k * len(runs) + j for k in scheduler.order() for j in range(len(runs))]
+                ev["predicted_makespan"] = round(predicted_makespan, 2)
+            results = run_pipeline(
+                items, fetch, grade, jobs=jobs, fetch_jobs=fetch_jobs,
+                on_result=lambda i, r: items[i][1].report.add(i // len(runs), r),
+                order=order, priority=priority if scheduler is not None else None,
+            )
+        # 短縮したタイムアウトで切れた人（と、その結果を写した同一提出の人）は、全員の後に本来のタイムアウトで
+        # 採点し直す
+        retry = _retry_indices(items, results, reduced_timeout)
+        if retry:
+            print(f"[schedule] 短縮したタイムアウトで切れた {len(retry)} 件を本来のタイムアウトで採点し直します",
+                  flush=True)
+            flights = {run.assignment.name: SingleFlight() if run.flights is not None else None for run in runs}
+
+            def refetch(item):
+                # 作業場所は片付け済みなので取得し直す（Gist のキャッシュが効く）。採点し直す課題の分だけ
+                t, run = item
+                return fetch_assignments(t[0], t[1], t[2], [run], client, gist_cache, tracer,
+                                         resolved.get(t[1].strip()))[run.assignment.name]
+
+            with tracer.span("retry_timeouts", run_timings, cat="run", items=len(retry)):
+                retried = run_pipeline(
+                    [items[i] for i in retry], refetch,
+                    lambda item, fetched: grade(item, fetched, full_timeout=True, flights=flights),
+                    jobs=jobs, fetch_jobs=fetch_jobs,
+                    on_result=lambda k, r: items[retry[k]][1].report.add(retry[k] // len(runs), r),
+                )
+            for i, r in zip(retry, retried):
+                results[i] = r
+        for run in runs:
+            run.ledger.finish_run()
+    except BaseException:
+        for run in runs:
+            run.report.close()  # ここまでの行は書き出し済み
+        raise
+    finally:
+        client.close()
+        for run in runs:
+            run.close()
+        if zygote is not None:
+            zygote.close()
+    for j, run in enumerate(runs):
+        run.results = results[j::len(runs)]
+    for run in runs:
+        if incremental:
+            unchanged = sum(1 for r in run.results if r.get("incremental") == "unchanged")
+            print(f"{run.tag('ledger')} incremental: graded={len(run.results) - unchanged} unchanged={unchanged}",
+                  flush=True)
+        if run.flights is not None:
+            dups = sum(1 for r in run.results if r.get("duplicate_of"))
+            if dups:
+                print(f"{run.tag('dedup')} 同一提出 {dups} 件は採点を省略しました", flush=True)
+        if run.index is not None:
+            with tracer.span("similarity", run_timings, cat="run", indexed=len(run.index),
+                             assignment=run.assignment.name) as ev:
+                pairs, clusters = _attach_similarity(run.index, tasks, run.results, run.out_dir)
+                ev.update(pairs=len(pairs), clusters=len({c["cluster"] for c in clusters.values()}))
+            print(f"{run.tag('similarity')} indexed={len(run.index)} pairs={ev['pairs']} clusters={ev['clusters']} "
+                  f"students={len(clusters)}", flush=True)
+    if cache is not None:
+        evicted = cache.evict()
+        print(f"[cache] results: hit={cache.hits} miss={cache.misses} evicted={evicted}", flush=True)
+    if graphql_stats and graphql_stats["requests"]:
+        print(f"[graphql] requests={graphql_stats['requests']} resolved={graphql_stats['resolved']} "
+              f"fallback={graphql_stats['fallback']} "
+              f"rate_limit_remaining={graphql_stats['rate_limit_remaining']}", flush=True)
+    if gist_cache is not None:
+        st = gist_cache.stats
+        print(f"[cache] gists: not_modified={st['not_modified']} same_revision={st['same_revision']} "
+              f"miss={st['miss']} bytes_saved={st['bytes_saved']} "
+              f"rate_limit_remaining={st['rate_limit_remaining']}", flush=True)
+        with open(Path(out_dir) / "fetch_stats.json", "w", encoding="utf-8") as f:
+            json.dump({**st, "graphql": graphql_stats}, f, ensure_ascii=False, indent=2)
+    with tracer.span("write_reports", run_timings, cat="run"):
+        # 採点後に分かった項目（類似度）だけを足して、results.jsonl から入力順の最終版を作る
+        for run in runs:
+            try:
+                run.report.finalize({i: {"similarity": r["similarity"]}
+                                     for i, r in enumerate(run.results) if "similarity" in r})
+            finally:
+                run.report.close()
+    summaries = {}
+    if analytics:
+        with tracer.span("analytics", run_timings, cat="run"):
+            for run in runs:
+                summaries[run.assignment.name] = _analyze(run.results, run.out_dir, run.tag("analytics"))
+
+    if scheduler is not None:
+        reduced = sum(1 for t in tasks if scheduler.timeout_for(t[2], scheduler.timeout_sec) is not None)
+        accuracy = scheduler.observe(tasks, [run.results for run in runs])
+        actual = run_timings["grade_pipeline"]["wall"] + run_timings.get("retry_timeouts", {}).get("wall", 0.0)
+        error = accuracy["mean_abs_error"]
+        print(f"[schedule] jobs={scheduler.jobs} predicted_makespan={predicted_makespan:.1f}s "
+              f"actual={actual:.1f}s history={accuracy['with_history']}/{accuracy['students']} "
+              f"mean_abs_error={'-' if error is None else f'{error:.1f}s'} "
+              f"reduced_timeout={reduced} "
+              f"retried={len(retry)}", flush=True)
+    if use_cache:  # 次回 --shard で所要時間の釣り合うように分けるための履歴
+        _update_durations(durations_path, tasks, [run.results for run in runs])
+        if scheduler is not None:
+            save_schedule(schedule_path, scheduler.history)
+
+    if push_to_sheets:
+        with tracer.span("push_sheets", run_timings, cat="run"):
+            for run in runs:  # 課題ごとに別のタブ（横展開の列も課題ごと）
+                push_results_wide_to_google_sheets(run.results, worksheet_name=run.assignment.result_tab,
+                                                   run_tag=run_tag)
+            _push_analytics(summaries, analytics_tab, multi)
+
+    if archive:
+        with tracer.span("archive", run_timings, cat="run") as ev:
+            ev.update(_archive_outputs(out_dir, [(run.out_dir, tasks) for run in runs]))
+
+    tracer.write(Path(out_dir) / "trace.json")
+    print("[trace] " + " ".join(f"{k}={v['wall']:.2f}s" for k, v in run_timings.items()), flush=True)
+    step_summary = os.environ.get("GITHUB_STEP_SUMMARY")
+    if step_summary:
+        for run in runs:
+            write_step_summary(run.results, step_summary, title=run.label)
+
+
+def _retry_indices(items: list, results: list, reduced_timeout) -> list:
+    """
+    短縮したタイムアウトで切れた項目の位置。同一提出の結果を写した人（duplicate_of）も、
+    写し元がやり直しになるなら含める（短縮したタイムアウトでの結果を残さない）。
+    """
+    retry = {i for i, r in enumerate(results) if timed_out(r) and reduced_timeout(items[i]) is not None}
+    leaders = {(items[i][1].assignment.name, results[i]["student_id"]) for i in retry}
+    retry |= {i for i, r in enumerate(results)
+              if r.get("duplicate_of") and timed_out(r)
+              and (items[i][1].assignment.name, r["duplicate_of"]) in leaders}
+    return sorted(retry)
+
+
+def _submission_size(fetched) -> int | None:
+    """取得段の結果（work, 取得情報, perf）から submission.py の大きさ。取得できていなければ None。"""
+    try:
+        work, info, _ = fetched
+        return (work / "submission.py").stat().st_size if isinstance(info, dict) else None
+    except (TypeError, ValueError, OSError):
+        return None
 
-    results = [grade_one(sid, url, out_dir) for sid, url in urls]
-    write_reports(results, out_dir)
+
+def _archive_outputs(out_dir: str, runs: list) -> dict:
+    """受講生ごとのディレクトリ（課題が複数なら <課題名>/<name>）を <out>/artifacts.grarc にまとめて消す。"""
+    dirs = []
+    for run_dir, tasks in runs:
+        prefix = Path(run_dir).relative_to(out_dir)
+        dirs += [(prefix / t[2]).as_posix() for t in tasks]
+    stats = pack_dirs(out_dir, dirs, remove=True)
+    print(f"[archive] {Path(out_dir) / ARCHIVE_NAME}: {summary_line(stats)}", flush=True)
+    return stats
+
+
+def _analyze(results: list, out_dir: str, tag: str) -> dict:
+    from grader.analytics import analyze, summarize  # pandas を読むので使うときだけ import
+    summary = analyze(results, out_dir)
+    print(f"{tag} {summarize(summary)}", flush=True)
+    return summary
+
+
+def _push_analytics(summaries: dict, tab: str | None, multi: bool) -> None:
+    """集計を Sheets の tab（課題が複数なら <tab>-<課題名>）に書く。tab が無ければ何もしない。"""
+    if not tab:
+        return
+    from grader.analytics import analytics_rows
+    for name, summary in summaries.items():
+        push_analytics_to_google_sheets(analytics_rows(summary), f"{tab}-{name}" if multi else tab)
+
+
+def _update_durations(path: Path, tasks: list, result_lists: list) -> None:
+    """受講生（作業ディレクトリ名）ごとの所要時間。課題が複数なら全課題の合計。"""
+    durations = load_durations(path)
+    for k, t in enumerate(tasks):
+        rows = [results[k] for results in result_lists if results[k].get("perf")]
+        if rows:
+            durations[t[2]] = round(sum(total_wall(r) for r in rows), 3)
+    save_durations(path, durations)
+
+
+def merge_shards(shard_dirs: list, out_dir: str, push_to_sheets: bool = False, run_tag: str | None = None,
+                 similarity: bool = True, similarity_threshold: float = 0.8,
+                 cache_dir: str | None = None, registry: dict | None = None, analytics: bool = True,
+                 analytics_tab: str | None = None, archive: bool = False) -> dict:
+    """
+    grade_all(shard=...) の出力ディレクトリ（shard.json があるもの）をまとめて、<out> に
+    入力順の results.jsonl / results*.csv / results.json を作る。受講生ごとの成果物も <out>/<name> にコピーする。
+    - 複数の課題を採点したシャードは課題ごと（<out>/<課題名>）にまとめる。課題の設定は registry
+      （既定: grader.assignments.load_assignments()）から名前で引く
+    - 類似提出の検出はシャードをまたいで全員分でやり直す
+    - 結果の無い受講生（シャードのジョブが落ちた等）は grader_error の行にする
+    - push_to_sheets なら Sheets への書き込みはここで1回だけ（analytics_tab があれば集計のタブも）
+    - analytics なら全員分でコホートの集計（analytics.csv / analytics.json）を作り直す
+    - シャードの成果物が artifacts.grarc にまとめてあればそこから取り出す。archive なら <out> でもまとめ直す
+    戻り値は {課題名: 入力順の結果}。
+    """
+    manifests = {}
+    for d in shard_dirs:
+        m = read_manifest(d)
+        manifests[Path(d)] = m
+    if not manifests:
+        raise ValueError("shard.json のあるディレクトリがありません")
+    n_shards = {m["of"] for m in manifests.values()}
+    roster_size = {m["roster_size"] for m in manifests.values()}
+    names = {tuple(m.get("assignments") or [DEFAULT_ASSIGNMENT]) for m in manifests.values()}
+    if len(n_shards) != 1 or len(roster_size) != 1 or len(names) != 1:
+        raise ValueError(f"シャード数・ロスターの人数・課題が一致しません: of={sorted(n_shards)} "
+                         f"roster={sorted(roster_size)} assignments={sorted(names)}")
+    total, n = roster_size.pop(), n_shards.pop()
+    registry = registry if registry is not None else load_assignments()
+    names = names.pop()
+    unknown = [name for name in names if name not in registry]
+    if unknown:
+        raise ValueError(f"登録されていない課題です: {', '.join(unknown)}")
+    assignments = [registry[name] for name in names]
+    multi = len(assignments) > 1
+    missing_shards = sorted(set(range(1, n + 1)) - {m["shard"] for m in manifests.values()})
+    if missing_shards:
+        print(f"[merge] シャード {missing_shards} の出力がありません（担当の受講生は結果に含まれません）", flush=True)
+
+    tasks: list = [None] * total
+    owner: list = [None] * total  # 位置 → (シャードの出力ディレクトリ, manifest)
+    for d, m in manifests.items():
+        for st in m["students"]:
+            tasks[st["index"]] = (st["student_id"], st["gist_url"], st["work"])
+            owner[st["index"]] = (d, m)
+    # どのシャードにも入っていない位置（シャード自体が欠けている）は詰める
+    keep = [i for i in range(total) if tasks[i] is not None]
+
+    merged: dict = {}
+    archives = {d: Archive(d / ARCHIVE_NAME) for d in manifests if (d / ARCHIVE_NAME).exists()}
+    try:
+        for a in assignments:
+            merged[a.name] = _merge_assignment(a, [tasks[i] for i in keep], [owner[i] for i in keep], n,
+                                               assignment_out_dir(out_dir, a, multi), multi,
+                                               similarity, similarity_threshold, archives)
+    finally:
+        for ar in archives.values():
+            ar.close()
+    tasks = [tasks[i] for i in keep]
+    if archive:
+        _archive_outputs(out_dir, [(assignment_out_dir(out_dir, a, multi), tasks) for a in assignments])
+    summaries = {}
+    if analytics:
+        for a in assignments:
+            summaries[a.name] = _analyze(merged[a.name], assignment_out_dir(out_dir, a, multi),
+                                         f"[analytics] {a.name}:" if multi else "[analytics]")
+    _update_durations(Path(cache_dir or CACHE_DIR_DEFAULT) / DURATIONS_NAME, tasks, list(merged.values()))
+    print(f"[merge] {len(manifests)}/{n} シャード・{len(tasks)}/{total} 人・{len(assignments)} 課題をまとめました",
+          flush=True)
 
     if push_to_sheets:
-        push_results_wide_to_google_sheets(results)  # ← これ1発で横展開して追記
+        for a in assignments:
+            push_results_wide_to_google_sheets(merged[a.name], worksheet_name=a.result_tab, run_tag=run_tag)
+        _push_analytics(summaries, analytics_tab, multi)
+    step_summary = os.environ.get("GITHUB_STEP_SUMMARY")
+    if step_summary:
+        for a in assignments:
+            write_step_summary(merged[a.name], step_summary, title=a.name if multi else None)
+    return merged
+
+
+def _merge_assignment(assignment: Assignment, tasks: list, owners: list, n: int, out_dir: str, multi: bool,
+                      similarity: bool, similarity_threshold: float, archives: dict | None = None) -> list:
+    """
+    merge_shards の課題1つ分。各シャードの <shard>（複数の課題なら <shard>/<課題名>）から結果を集める。
+    受講生ごとの成果物は <shard>/<name> が無ければ archives（シャード → Archive）から取り出す。
+    """
+    archives = archives or {}
+
+    def src_dir(d: Path) -> Path:
+        return d / assignment.name if multi else d
+
+    def member(name: str) -> str:
+        return f"{assignment.name}/{name}" if multi else name
+
+    found: dict = {}
+    for d in {o[0] for o in owners}:
+        src = src_dir(d)
+        # results.json（最後まで終わったシャード）が無ければ、途中まで書かれた results.jsonl を使う
+        if (src / "results.json").exists():
+            rows = json.loads((src / "results.json").read_text(encoding="utf-8"))
+        elif (src / "results.jsonl").exists():
+            with open(src / "results.jsonl", encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = []
+        for r in rows:
+            found.setdefault((d, r.get("student_id"), r.get("gist_url")), []).append(r)
+    results = []
+    for t, (d, m) in zip(tasks, owners):
+        same = found.get((d, t[0], t[1]))
+        results.append(same.pop(0) if same else {
+            "student_id": t[0], "gist_url": t[1], "source": "grader_error",
+            "passed": 0, "failed": 0, "errors": 0, "skipped": 0, "total_tests": 0,
+            "tests": [], "notes": f"シャード {m['shard']}/{n} に結果がありません",
+        })
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    for t, (d, _) in zip(tasks, owners):
+        src = src_dir(d) / t[2]
+        if src.is_dir():
+            if src.resolve() != (out / t[2]).resolve():
+                shutil.copytree(src, out / t[2], dirs_exist_ok=True)
+        elif d in archives:
+            prefix = member(t[2]) + "/"
+            ar = archives[d]
+            for name in ar.members(member(t[2])):
+                target = out / t[2] / name[len(prefix):]
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(ar.read(name))
+
+    index = None
+    if similarity:
+        index = _similarity_index(assignment, similarity_threshold)
+        for t in tasks:
+            sub = out / t[2] / "submission.py"
+            if sub.exists():
+                index.add(t[2], sub.read_bytes())
+    report = StreamingReport(out_dir, total=len(tasks), progress=False)
+    try:
+        for i, r in enumerate(results):
+            r.pop("similarity", None)  # シャード内だけで見た類似度は捨てる
+            report.add(i, r)
+        if index is not None:
+            pairs, clusters = _attach_similarity(index, tasks, results, out_dir)
+            print(f"[similarity]{' ' + assignment.name + ':' if multi else ''} indexed={len(index)} "
+                  f"pairs={len(pairs)} clusters={len({c['cluster'] for c in clusters.values()})} "
+                  f"students={len(clusters)}", flush=True)
+        report.finalize({i: {"similarity": r["similarity"]} for i, r in enumerate(results) if "similarity" in r})
+    finally:
+        report.close()
+    return results
 
 
 def _to_rows(results: list) -> list:
@@ -158,6 +998,6 @@ def _to_rows(results: list) -> list:
         rows.append([
             ts, r.get("student_id"), r.get("gist_url"),
             passed, total, failed, errors, skipped, rate_str,
-            r.get("notes", ""),
+            r.get("notes", ""), *_resource_cells(r), int(r.get("blocked", 0) or 0),
         ])
     return rows
@@ -0,0 +1,90 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+LEDGER_NAME = "ledger.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    student_id      TEXT NOT NULL,
+    gist_url        TEXT NOT NULL,
+    revision        TEXT,
+    submission_hash TEXT,
+    suite_hash      TEXT,
+    summary         TEXT NOT NULL,
+    run_id          TEXT,
+    updated_at      REAL,
+    PRIMARY KEY (student_id, gist_url)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    started_at  REAL,
+    finished_at REAL,
+    status      TEXT
+);
+"""
+
+
+class Ledger:
+    """
+    採点台帳（SQLite、既定は <out>/ledger.sqlite）。
+    受講生ごとに gist_url / 解決したリビジョン / 提出ハッシュ / テスト一式ハッシュ / 直近サマリを持つ。
+    1人採点するたびにコミットするので、途中で落ちても次回 --incremental で続きから再開できる。
+    複数スレッドから使ってよい。
+    """
+
+    def __init__(self, path: str | Path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+        self.run_id: str | None = None
+
+    def start_run(self) -> list:
+        """実行開始を記録し、前回以前に完了していない run_id のリストを返す。"""
+        with self._lock:
+            unfinished = [r[0] for r in self._conn.execute(
+                "SELECT run_id FROM runs WHERE status = 'running' ORDER BY started_at")]
+            self._conn.execute("UPDATE runs SET status = 'aborted' WHERE status = 'running'")
+            self.run_id = uuid.uuid4().hex[:12]
+            self._conn.execute("INSERT INTO runs VALUES (?, ?, NULL, 'running')", (self.run_id, time.time()))
+            self._conn.commit()
+        return unfinished
+
+    def finish_run(self) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ?, status = 'done' WHERE run_id = ?",
+                               (time.time(), self.run_id))
+            self._conn.commit()
+
+    def get(self, sid: str, url: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revision, submission_hash, suite_hash, summary, run_id, updated_at "
+                "FROM students WHERE student_id = ? AND gist_url = ?", (sid, url)).fetchone()
+        if row is None:
+            return None
+        return {
+            "revision": row[0], "submission_hash": row[1], "suite_hash": row[2],
+            "summary": json.loads(row[3]), "run_id": row[4], "updated_at": row[5],
+        }
+
+    def record(self, sid: str, url: str, revision: str | None, submission_hash: str,
+               suite_hash: str, summary: dict) -> None:
+        payload = json.dumps(summary, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sid, url, revision, submission_hash, suite_hash, payload, self.run_id, time.time()))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,252 @@
+"""
+pytest を起動する前の静的チェック（ast のみ。提出コードは実行しない）。
+
+どのテストも通りようがない提出は、pytest（と pandas / matplotlib の import）を起動せずに
+テストごとの結果を合成する。テスト名は tests/*.py を ast で読んで pytest と同じ名前にするので、
+results_wide.csv の列は pytest を実行した人と揃う。
+
+- 構文エラー・Python ではない（HTML のエラーページ等）・読めない → 全テスト error
+  （pytest でも submission_module フィクスチャの import で落ちて error になる）
+- import 時に止まる/落ちる構文（モジュール直下の input() / exit() / break の無い while True）→ 全テスト error
+  （import できるものは、どのモジュールを使っていても pytest に任せる。--no-precheck と結果を変えない）
+- テストが使う関数・クラス（submission_module.X）が未定義 → そのテストは failed（AttributeError）。
+  全テストが未定義の名前を使う場合だけ合成し、1つでも実行しうるテストがあれば pytest に任せる
+
+grader.tiers の前提があれば、pytest と同じく前提の通らないテストは blocked にする。
+テストの結果を静的に決められないとき（parametrize、submission_module を使わないテスト等）は常に pytest に任せる。
+
+    pre = precheck(work / "submission.py")
+    if pre.skip_pytest:
+        summary = pre.summary()
+"""
+from __future__ import annotations
+import ast
+import functools
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from grader.sandbox import REPO_ROOT
+from grader.tiers import BLOCKED, apply_blocking
+
+SUBMISSION_FIXTURE = "submission_module"
+# モジュール直下で呼ぶと import が止まる / 終わってしまう
+_BLOCKING_CALLS = {"input": "input()", "exit": "exit()", "quit": "quit()",
+                   "sys.exit": "sys.exit()", "os._exit": "os._exit()"}
+
+
+class Precheck:
+    """静的チェックの結果。skip_pytest なら summary() がそのまま採点結果になる。"""
+
+    def __init__(self, reason: str = "", tests: Optional[List[dict]] = None):
+        self.reason = reason
+        self.tests = tests
+
+    @property
+    def skip_pytest(self) -> bool:
+        return self.tests is not None
+
+    def summary(self) -> dict:
+        tests = self.tests or []
+
+        def count(outcome: str) -> int:
+            return sum(1 for tc in tests if tc["outcome"] == outcome)
+
+        return {
+            "source": "precheck",
+            "total_tests": len(tests), "passed": 0, "failed": count("failed"),
+            "errors": count("error"), "skipped": 0, "blocked": count(BLOCKED),
+            "tests": tests, "termination": "precheck",
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def suite_requirements(tests_dir: str = "tests") -> Optional[Tuple[Tuple[str, frozenset], ...]]:
+    """
+    テスト名（pytest_plugin.dotted_name と同じ）と、そのテストが使う submission_module の属性の組。
+    静的に決められない（parametrize・submission_module を使わないテストがある）なら None。
+    """
+    root = (REPO_ROOT / tests_dir).resolve()
+    out: List[Tuple[str, frozenset]] = []
+    for path in sorted(root.glob("test_*.py")):
+        module = ".".join(path.relative_to(REPO_ROOT).with_suffix("").parts)
+        try:
+            tree = ast.parse(path.read_text(encoding="utf-8"))
+        except (OSError, SyntaxError):
+            return None
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+                return None  # クラス形式はフィクスチャの継承などがあるので対象外
+            if not (isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")):
+                continue
+            if node.decorator_list or SUBMISSION_FIXTURE not in [a.arg for a in node.args.args]:
+                return None
+            used = frozenset(n.attr for n in ast.walk(node)
+                             if isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name)
+                             and n.value.id == SUBMISSION_FIXTURE)
+            out.append((f"{module}.{node.name}", used))
+    return tuple(out) or None
+
+
+def _not_python(data: bytes) -> Optional[str]:
+    head = data.lstrip()[:256].lower()
+    if not head:
+        return "提出ファイルが空です"
+    if head.startswith((b"<!doctype", b"<html", b"<?xml", b"<head", b"<body")):
+        return "Python ではありません（HTML/XML が保存されています）"
+    if b"\0" in data:
+        return "Python ではありません（バイナリファイル）"
+    return None
+
+
+def _module_statements(body: List[ast.stmt]):
+    """import 時に実行されうる文（関数・クラスの中身と if __name__ == "__main__" の中は除く）。"""
+    for node in body:
+        if isinstance(node, ast.If) and _is_main_guard(node.test):
+            yield from _module_statements(node.orelse)
+            continue
+        yield node
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        for field in ("body", "orelse", "finalbody"):
+            yield from _module_statements(getattr(node, field, None) or [])
+        for handler in getattr(node, "handlers", None) or []:
+            yield from _module_statements(handler.body)
+
+
+def _is_main_guard(test: ast.expr) -> bool:
+    return (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+            and any(isinstance(c, ast.Constant) and c.value == "__main__" for c in test.comparators))
+
+
+def _header_exprs(stmt: ast.stmt) -> list:
+    """文のうち、その場で評価される式（中の文は _module_statements が別に返す）。"""
+    if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return stmt.decorator_list + stmt.args.defaults + [d for d in stmt.args.kw_defaults if d is not None]
+    if isinstance(stmt, ast.ClassDef):
+        return stmt.decorator_list + stmt.bases + [k.value for k in stmt.keywords]
+    if isinstance(stmt, (ast.If, ast.While)):
+        return [stmt.test]
+    if isinstance(stmt, (ast.For, ast.AsyncFor)):
+        return [stmt.target, stmt.iter]
+    if isinstance(stmt, (ast.With, ast.AsyncWith)):
+        return [e for item in stmt.items for e in (item.context_expr, item.optional_vars) if e is not None]
+    if isinstance(stmt, ast.Try) or hasattr(ast, "TryStar") and isinstance(stmt, ast.TryStar):
+        return []
+    return [stmt]
+
+
+def _walk_expr(node: ast.AST):
+    """式の中を辿る。lambda の中身は import 時には実行されないので入らない。"""
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        yield n
+        stack.extend(c for c in ast.iter_child_nodes(n) if not isinstance(c, ast.Lambda))
+
+
+def _call_name(call: ast.Call) -> str:
+    f = call.func
+    if isinstance(f, ast.Name):
+        return f.id
+    if isinstance(f, ast.Attribute) and isinstance(f.value, ast.Name):
+        return f"{f.value.id}.{f.attr}"
+    return ""
+
+
+def _has_break(loop: ast.While) -> bool:
+    stack = list(loop.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Break):
+            return True
+        if isinstance(node, (ast.While, ast.For, ast.AsyncFor, ast.FunctionDef, ast.AsyncFunctionDef,
+                             ast.ClassDef, ast.Lambda)):
+            continue  # 内側のループの break は外側を抜けない
+        stack.extend(ast.iter_child_nodes(node))
+    return False
+
+
+def _import_blocker(tree: ast.Module) -> Optional[str]:
+    """import が止まる / 終わってしまう文（pytest でも submission_module の import で error になる）。"""
+    for stmt in _module_statements(tree.body):
+        if isinstance(stmt, ast.While) and isinstance(stmt.test, ast.Constant) and stmt.test.value \
+                and not _has_break(stmt):
+            return f"モジュール直下に終わらない while ループがあります（{stmt.lineno}行目）"
+        for expr in _header_exprs(stmt):
+            for node in _walk_expr(expr):
+                if isinstance(node, ast.Call) and _call_name(node) in _BLOCKING_CALLS:
+                    return (f"モジュール直下で {_BLOCKING_CALLS[_call_name(node)]} を呼んでいます"
+                            f"（{node.lineno}行目。import 時に止まる/終了します）")
+    return None
+
+
+def _defined_names(tree: ast.Module) -> Optional[set]:
+    """モジュール直下で定義される名前。import * や globals() などで決められなければ None。"""
+    if any(isinstance(n, ast.Call) and _call_name(n) in ("globals", "vars", "setattr", "exec")
+           for n in ast.walk(tree)):
+        return None
+    names = set()
+    for stmt in _module_statements(tree.body):
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(stmt.name)
+        elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+            for a in stmt.names:
+                if a.name == "*":
+                    return None
+                names.add((a.asname or a.name).split(".")[0])
+        for expr in _header_exprs(stmt):
+            for node in _walk_expr(expr):
+                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                    names.add(node.id)
+    if "__getattr__" in names:
+        return None
+    return names
+
+
+def precheck(path: str | Path, tests_dir: str = "tests", tiers: bool = True) -> Precheck:
+    """tiers なら pytest と同じく、前提のテストが通らないテストを blocked にする。"""
+    pre = _precheck(path, tests_dir)
+    if tiers and pre.tests:
+        apply_blocking(pre.tests)
+    return pre
+
+
+def _precheck(path: str | Path, tests_dir: str) -> Precheck:
+    suite = suite_requirements(tests_dir)
+    if suite is None:
+        return Precheck()
+    try:
+        data = Path(path).read_bytes()
+    except OSError as e:
+        return _all(suite, "error", f"提出ファイルを読めません: {e}")
+    reason = _not_python(data)
+    if reason:
+        return _all(suite, "error", reason)
+    try:
+        tree = ast.parse(data, filename="submission.py")
+    except SyntaxError as e:
+        return _all(suite, "error", f"{type(e).__name__}: {e.msg}（{e.lineno}行目）")
+    except ValueError as e:  # ソース中の NUL など
+        return _all(suite, "error", f"構文を解析できません: {e}")
+    reason = _import_blocker(tree)
+    if reason:
+        return _all(suite, "error", reason)
+
+    defined = _defined_names(tree)
+    if defined is None:
+        return Precheck()
+    tests = []
+    missing_all: set = set()
+    for name, used in suite:
+        missing = sorted(used - defined)
+        if not missing:
+            return Precheck()  # 実行しうるテストがある → pytest に任せる
+        missing_all.update(missing)
+        tests.append({"name": name, "outcome": "failed", "time": 0.0,
+                      "message": f"AttributeError: module 'submission' has no attribute '{missing[0]}'"})
+    return Precheck(f"必要な関数・クラスが定義されていません: {', '.join(sorted(missing_all))}", tests)
+
+
+def _all(suite, outcome: str, reason: str) -> Precheck:
+    return Precheck(reason, [{"name": name, "outcome": outcome, "time": 0.0, "message": reason}
+                             for name, _ in suite])
@@ -0,0 +1,134 @@
+"""
+採点用 pytest プラグイン（`-p grader.pytest_plugin` で読み込む）。
+
+環境変数 GRADER_EVENTS で指定したファイルに、テストごとの結果を JSON Lines で逐次書き出す。
+1行書くたびに flush するので、タイムアウトで kill されてもそこまでの結果は残る。
+
+  {"event": "collected", "tests": ["tests.test_01_load_game_data.test_returns_dataframe", ...]}
+  {"event": "test", "name": ..., "outcome": "passed|failed|error|skipped|blocked", "time": 0.12, "message": "..."}
+  {"event": "collect_error", "name": ..., "message": "..."}
+  {"event": "memory_error", "name": ...}   … テスト・収集が MemoryError（の子クラス）で落ちた
+  {"event": "finished", "exitstatus": 0}
+
+テスト名は JUnit XML の classname + name と同じ規則（ドット区切り）で作る。
+
+grader.tiers の宣言に従って、段（tier）の小さいテストから実行し、前提のテストが通っていないテストは
+実行せずに blocked にする（pytest 上は skip、JUnit XML では skipped）。GRADER_TIERS=0 で無効。
+"""
+from __future__ import annotations
+import json
+import os
+import re
+
+import pytest
+
+from grader import tiers
+
+EVENTS_ENV = "GRADER_EVENTS"
+MAX_MESSAGE = 2000
+
+
+def dotted_name(nodeid: str) -> str:
+    """nodeid → JUnit と同じドット区切り名（_pytest.junitxml.mangle_test_address 相当）。"""
+    path, bracket, params = nodeid.partition("[")
+    names = path.split("::")
+    names[0] = re.sub(r"\.py$", "", names[0].replace("/", "."))
+    names[-1] += bracket + params
+    return ".".join(names)
+
+
+def _message(report) -> str:
+    longrepr = getattr(report, "longrepr", None)
+    if isinstance(longrepr, tuple):  # skip は (path, lineno, reason)
+        return str(longrepr[-1])[:MAX_MESSAGE]
+    crash = getattr(longrepr, "reprcrash", None)
+    text = crash.message if crash is not None else (report.longreprtext or "")
+    return text[:MAX_MESSAGE]
+
+
+_BLOCKED_PREFIX = "[blocked] "
+
+
+def _blocked_reason(message: str):
+    """_TierGate が skip した理由なら、その本文（接頭辞を除く）。pytest は "Skipped: " を前に付ける。"""
+    i = message.find(_BLOCKED_PREFIX)
+    return message[i + len(_BLOCKED_PREFIX):] if 0 <= i <= len("Skipped: ") else None
+
+
+class _EventStream:
+    def __init__(self, path: str):
+        self._f = open(path, "w", encoding="utf-8")
+        self._pending: dict = {}  # nodeid -> {"outcome", "time", "message"}
+
+    def emit(self, **event) -> None:
+        self._f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def pytest_collection_finish(self, session) -> None:
+        self.emit(event="collected", tests=[dotted_name(item.nodeid) for item in session.items])
+
+    def pytest_collectreport(self, report) -> None:
+        if report.failed:
+            self.emit(event="collect_error", name=dotted_name(report.nodeid), message=_message(report))
+
+    def pytest_exception_interact(self, node, call, report) -> None:
+        # メモリ上限の判定用。出力の文字列ではなく、送出された例外の型で見る
+        if call.excinfo is not None and call.excinfo.errisinstance(MemoryError):
+            self.emit(event="memory_error", name=dotted_name(report.nodeid))
+
+    def pytest_runtest_logreport(self, report) -> None:
+        st = self._pending.setdefault(report.nodeid, {"outcome": "passed", "time": 0.0, "message": ""})
+        st["time"] += float(getattr(report, "duration", 0) or 0)
+        # JUnit と同じ判定：setup/teardown の失敗は error、call の失敗は failed
+        if report.failed and st["outcome"] == "passed":
+            st["outcome"] = "failed" if report.when == "call" else "error"
+            st["message"] = _message(report)
+        elif report.skipped and st["outcome"] == "passed":
+            st["message"] = _message(report)
+            reason = _blocked_reason(st["message"])
+            st["outcome"] = "skipped" if reason is None else tiers.BLOCKED
+            st["message"] = st["message"] if reason is None else reason
+        if report.when == "teardown":
+            st = self._pending.pop(report.nodeid)
+            self.emit(event="test", name=dotted_name(report.nodeid), outcome=st["outcome"],
+                      time=round(st["time"], 6), message=st["message"])
+
+    def pytest_sessionfinish(self, session, exitstatus) -> None:
+        self.emit(event="finished", exitstatus=int(exitstatus))
+        self._f.close()
+
+
+class _TierGate:
+    """段の順に並べ替え、前提のテストが passed でなければ skip（blocked）する。"""
+
+    def __init__(self):
+        self._outcomes: dict = {}  # dotted name -> passed / failed / error / skipped / blocked
+
+    def pytest_collection_modifyitems(self, session, config, items) -> None:
+        items.sort(key=lambda item: tiers.tier(dotted_name(item.nodeid)))  # 同じ段の中は元の順
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item) -> None:
+        failed = tiers.blocked_by(dotted_name(item.nodeid), self._outcomes)
+        if failed:
+            pytest.skip(_BLOCKED_PREFIX + tiers.blocked_message(failed))
+
+    def pytest_runtest_logreport(self, report) -> None:
+        name = dotted_name(report.nodeid)
+        prev = self._outcomes.get(name, "passed")
+        if prev != "passed":
+            return
+        if report.failed:
+            self._outcomes[name] = "failed" if report.when == "call" else "error"
+        elif report.skipped:
+            self._outcomes[name] = "skipped" if _blocked_reason(_message(report)) is None else tiers.BLOCKED
+        else:
+            self._outcomes[name] = "passed"
+
+
+def pytest_configure(config) -> None:
+    path = os.environ.get(EVENTS_ENV)
+    if path and not config.pluginmanager.has_plugin("grader-events"):
+        config.pluginmanager.register(_EventStream(path), "grader-events")
+    if os.environ.get(tiers.TIERS_ENV, "1") != "0" and not config.pluginmanager.has_plugin("grader-tiers"):
+        config.pluginmanager.register(_TierGate(), "grader-tiers")
@@ -2,19 +2,46 @@ from __future__ import annotations
 import csv
 import json
 import os
+import threading
+import time
 from typing import List, Any, Optional, Sequence, Dict, Set
 
-import gspread
-from google.oauth2.service_account import Credentials
-
 
 BASE_HEADERS = [
     "time", "student_id", "gist_url",
     "passed", "total_tests", "failed", "errors", "skipped", "pass_rate",
     "notes",
+    "peak_mem_mb", "cpu_sec", "termination", "blocked",
+]
+
+
+def _resource_cells(r: dict) -> list:
+    """pytest プロセスのピークメモリ（MB）・CPU 秒・終了理由（未計測は空欄）。"""
+    return [("" if r.get(k) is None else r.get(k)) for k in ("peak_mem_mb", "cpu_sec", "termination")]
+
+
+SUMMARY_HEADERS = [
+    "student_id", "gist_url",
+    "passed", "total_tests", "failed", "errors", "skipped", "pass_rate",
+    "notes", "peak_mem_mb", "cpu_sec", "termination", "blocked",
 ]
 
 
+def _summary_row(r: dict) -> list:
+    """results.csv の1行（SUMMARY_HEADERS の順）。"""
+    total  = int(r.get("total_tests", 0) or 0)
+    passed = int(r.get("passed", 0) or 0)
+    failed = int(r.get("failed", 0) or 0)
+    errors = int(r.get("errors", 0) or 0)
+    skipped = int(r.get("skipped", 0) or 0)
+    rate = f"{(passed/total*100):.0f}%" if total else "0%"
+    return [
+        r.get("student_id"), r.get("gist_url"),
+        passed, total, failed, errors, skipped, rate,
+        r.get("notes", ""), *_resource_cells(r), int(r.get("blocked", 0) or 0),
+    ]
+
+
 def write_reports(results: list, out_dir: str) -> None:
     """結果を CSV / JSON に書き出す。CSV はサマリも保存。"""
     os.makedirs(out_dir, exist_ok=True)
@@ -23,21 +50,9 @@ def write_reports(results: list, out_dir: str) -> None:
     csv_path = os.path.join(out_dir, "results.csv")
     with open(csv_path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
-        w.writerow(["student_id", "gist_url",
-                    "passed", "total_tests", "failed", "errors", "skipped", "pass_rate",
-                    "notes"])
+        w.writerow(SUMMARY_HEADERS)
         for r in results:
-            total  = int(r.get("total_tests", 0) or 0)
-            passed = int(r.get("passed", 0) or 0)
-            failed = int(r.get("failed", 0) or 0)
-            errors = int(r.get("errors", 0) or 0)
-            skipped = int(r.get("skipped", 0) or 0)
-            rate = f"{(passed/total*100):.0f}%" if total else "0%"
-            w.writerow([
-                r.get("student_id"), r.get("gist_url"),
-                passed, total, failed, errors, skipped, rate,
-                r.get("notes", ""),
-            ])
+            w.writerow(_summary_row(r))
 
     # --- 横展開 CSV（ヘッダに全テスト名を並べる） ---
     test_names = _collect_all_test_names(results)
@@ -55,6 +70,112 @@ def write_reports(results: list, out_dir: str) -> None:
         json.dump(results, f, ensure_ascii=False, indent=2)
 
 
+class StreamingReport:
+    """
+    採点が終わった人から順に書き出すレポート（途中で落ちても、それまでの結果は残る）。
+        report = StreamingReport(".out", total=len(tasks))
+        report.add(i, result)        # 複数スレッドから呼んでよい
+        report.finalize(patches)     # 入力順に並べ直して results.csv / results_wide.csv / results.json を作る
+        report.close()
+    - results.jsonl … 1人1行の JSON を終わった順に追記して flush
+    - results.csv   … 実行中は終わった順に1行ずつ追記、finalize で入力順に書き直す
+    - results_wide.csv / results.json は finalize で results.jsonl から作る。
+      全員分を読み込まず、行の位置（オフセット）だけを覚えておいて1人ずつ読み直す
+    - add のたびに進捗（何人目・経過・残り時間の見込み）を1行出す（Actions のログでも逐次見える）
+    """
+
+    def __init__(self, out_dir: str, total: int, progress: bool = True, label: Optional[str] = None):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.label = label  # 進捗行に付ける名前（複数の課題を同時に採点するとき）
+        self.total = total
+        self.progress = progress
+        self._lock = threading.Lock()
+        self._offsets: Dict[int, int] = {}
+        self._t0 = time.monotonic()
+        self._jsonl = open(os.path.join(out_dir, "results.jsonl"), "wb")
+        self._csv_file = open(os.path.join(out_dir, "results.csv"), "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._csv_file)
+        self._csv.writerow(SUMMARY_HEADERS)
+        self._csv_file.flush()
+
+    def add(self, index: int, result: dict) -> None:
+        line = json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            self._offsets[index] = self._jsonl.tell()
+            self._jsonl.write(line)
+            self._jsonl.flush()
+            self._csv.writerow(_summary_row(result))
+            self._csv_file.flush()
+            done = len(self._offsets)
+            if self.progress:
+                print(self._progress_line(done, result), flush=True)
+
+    def _progress_line(self, done: int, r: dict) -> str:
+        elapsed = time.monotonic() - self._t0
+        eta = elapsed / done * (self.total - done) if done else 0.0
+        width = len(str(self.total))
+        notes = (r.get("notes") or "").splitlines()
+        return (f"[progress]{' ' + self.label if self.label else ''} {done:>{width}}/{self.total} "
+                f"{r.get('student_id')} "
+                f"{r.get('passed', 0)}/{r.get('total_tests', 0)} passed"
+                f"{'  ' + notes[0][:60] if notes else ''}  elapsed={elapsed:.0f}s eta={eta:.0f}s")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _iter_results(self, patches: Dict[int, dict]):
+        """入力順に1人ずつ results.jsonl から読み直す（patches[i] があれば上書き）。"""
+        with open(self._jsonl.name, "rb") as f:
+            for i in sorted(self._offsets):
+                f.seek(self._offsets[i])
+                r = json.loads(f.readline())
+                if i in patches:
+                    r.update(patches[i])
+                yield r
+
+    def finalize(self, patches: Dict[int, dict] | None = None) -> None:
+        """
+        results.csv（入力順）・results_wide.csv・results.json を作る。patches は {入力順の番号: 追加する項目}
+        （採点後に分かる類似度など）。書き終えてから置き換えるので、途中で落ちても古い/途中のファイルは壊れない。
+        """
+        patches = patches or {}
+        with self._lock:
+            self._jsonl.flush()
+            self._csv_file.flush()
+        # 1回目：テスト名の一覧（横展開の列）
+        names: Set[str] = set()
+        for r in self._iter_results(patches):
+            names.update(tc.get("name") for tc in (r.get("tests") or []) if tc.get("name"))
+        test_names = sorted(names)
+
+        paths = {k: os.path.join(self.out_dir, k) for k in ("results.csv", "results_wide.csv", "results.json")}
+        with open(paths["results.csv"] + ".tmp", "w", newline="", encoding="utf-8") as fs, \
+                open(paths["results_wide.csv"] + ".tmp", "w", newline="", encoding="utf-8") as fw, \
+                open(paths["results.json"] + ".tmp", "w", encoding="utf-8") as fj:
+            ws, ww = csv.writer(fs), csv.writer(fw)
+            ws.writerow(SUMMARY_HEADERS)
+            ww.writerow(BASE_HEADERS + test_names)
+            # 2回目：1人ずつ書く（results.json は json.dump(results, indent=2) と同じ形）
+            fj.write("[")
+            for n, r in enumerate(self._iter_results(patches)):
+                ws.writerow(_summary_row(r))
+                ww.writerows(_to_wide_rows([r], test_names))
+                body = json.dumps(r, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                fj.write(("," if n else "") + "\n  " + body)
+            fj.write("\n]" if self._offsets else "]")
+        with self._lock:
+            self._csv_file.close()
+            for path in paths.values():
+                os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._jsonl.close()
+            if not self._csv_file.closed:
+                self._csv_file.close()
+
+
 def _get_gspread_client():
     """Secrets からクライアントと書き込み先シートIDを取得。未設定なら (None, None)。"""
     sa_json = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
@@ -62,6 +183,8 @@ def _get_gspread_client():
     if not sa_json or not sheet_id:
         return None, None
 
+    import gspread  # Sheets を使うときだけ読む（Google の認証ライブラリごと重い）
+    from google.oauth2.service_account import Credentials
     info = json.loads(sa_json)
     scopes = ["https://www.googleapis.com/auth/spreadsheets"]
     creds = Credentials.from_service_account_info(info, scopes=scopes)
@@ -69,9 +192,17 @@ def _get_gspread_client():
     return gc, sheet_id
 
 
-def push_results_wide_to_google_sheets(results: List[dict], worksheet_name: Optional[str] = None) -> bool:
+# 1回の values.batchUpdate に載せるセル数の上限（API のペイロード上限に対して余裕を持たせる）
+MAX_CELLS_PER_BATCH = 40000
+
+
+def push_results_wide_to_google_sheets(results: List[dict], worksheet_name: Optional[str] = None,
+                                       run_tag: Optional[str] = None) -> bool:
     """
-    サマリの右側に各テスト名列を横展開して1枚のシートに追記する。
+    サマリの右側に各テスト名列を横展開して1枚のシートに **upsert** する。
+    - キーは student_id（run_tag 指定時は student_id + run_tag）。既にある行は上書き、無ければ末尾に追加
+    - シートはヘッダ行とキー列、今回更新する行だけを読み、変わったセルだけを1回の values.batchUpdate で書く
+      （ヘッダ変更も同じリクエストに含める。巨大な場合は MAX_CELLS_PER_BATCH ごとに分割）
     - 既存のヘッダを尊重しつつ、足りないテスト列は末尾に追加
     - pass_rate は "100%" の文字列
     """
@@ -81,37 +212,260 @@ def push_results_wide_to_google_sheets(results: List[dict], worksheet_name: Opti
 
     sh = gc.open_by_key(sheet_id)
     target_tab = worksheet_name or os.environ.get("RESULT_TAB") or "results"
+    run_tag = run_tag or os.environ.get("RESULT_RUN_TAG") or None
     try:
         ws = sh.worksheet(target_tab)
     except Exception:
-        # 無ければ新規作成＆ヘッダ行
+        # 無ければ新規作成（ヘッダは下の batchUpdate で書く）
         ws = sh.add_worksheet(title=target_tab, rows=1000, cols=26)
-        ws.append_row(BASE_HEADERS, value_input_option="USER_ENTERED")
 
-    # 既存ヘッダを取得（1行目）
-    existing_header: List[str] = ws.row_values(1) or []
+    upsert_wide_rows(ws, results, run_tag)
+    return True
 
-    # 既存ヘッダのうち、BASE_HEADERS以外は「既存テスト列」とみなす
-    existing_test_cols = [h for h in existing_header if h not in BASE_HEADERS]
 
-    # 今回バッチで現れたテスト名を収集
-    new_test_names = _collect_all_test_names(results)
+def push_analytics_to_google_sheets(rows: List[List[Any]], worksheet_name: str) -> bool:
+    """
+    集計（grader.analytics.analytics_rows）でタブを丸ごと置き換える。
+    枠を表の大きさに合わせてから、表全体（空きセルは "" で埋める）を1回の values.batchUpdate で書く。
+    """
+    gc, sheet_id = _get_gspread_client()
+    if not (gc and sheet_id):
+        return False
 
-    # ヘッダ確定：BASE_HEADERS + 既存テスト列 + （不足分の新テスト列）
-    #   ※ BASE_HEADERS の順序は固定
-    missing = [t for t in new_test_names if t not in existing_test_cols]
-    header = BASE_HEADERS + existing_test_cols + missing
+    sh = gc.open_by_key(sheet_id)
+    width = max((len(r) for r in rows), default=1)
+    try:
+        ws = sh.worksheet(worksheet_name)
+    except Exception:
+        ws = sh.add_worksheet(title=worksheet_name, rows=len(rows), cols=width)
+    if ws.row_count != len(rows) or ws.col_count != width:
+        ws.resize(rows=len(rows), cols=width)  # 前回の表の残り（行・列）は枠ごと消える
+    values = [list(r) + [""] * (width - len(r)) for r in rows]
+    ws.batch_update([{"range": f"A1:{_col_letter(width)}{len(rows)}", "values": values}],
+                    value_input_option="USER_ENTERED")
+    return True
 
-    # ヘッダ更新（必要なら）
-    if existing_header != header:
-        ws.update("A1", [header])
 
-    # 行データを作成して追記
-    test_col_order = header[len(BASE_HEADERS):]  # ヘッダからテスト列リストを抽出
-    rows = _to_wide_rows(results, test_col_order)
-    if rows:
-        ws.append_rows(rows, value_input_option="USER_ENTERED")
-    return True
+def upsert_wide_rows(ws, results: Sequence[dict], run_tag: Optional[str] = None) -> dict:
+    """
+    worksheet（gspread.Worksheet 互換）に横展開行を upsert する。書いた範囲数・セル数を返す。
+    使うのは row_values / batch_get / row_count / col_count / resize / batch_update と、
+    既存列の並びが変わるときだけ get_all_values。
+    """
+    header, data, n_rows = _plan_upsert(ws, results, run_tag)
+    n_cells = sum(len(row) for d in data for row in d["values"])
+    if not data:
+        return {"ranges": 0, "cells": 0}
+
+    # シートの枠が足りなければ広げる（values API は枠外に書けない）
+    if n_rows > ws.row_count or len(header) > ws.col_count:
+        ws.resize(rows=max(ws.row_count, n_rows), cols=max(ws.col_count, len(header)))
+
+    for chunk in _chunk_ranges(data, MAX_CELLS_PER_BATCH):
+        ws.batch_update(chunk, value_input_option="USER_ENTERED")
+    return {"ranges": len(data), "cells": n_cells}
+
+
+def _read_keys(ws, existing_header: List[str], key_cols: List[str]) -> List[tuple]:
+    """
+    既存のデータ行（2行目〜）のキー。キー列だけを1回の batch_get で読む（末尾の空行は含まない）。
+    書式を通さない値で読み、_cell_value で揃える（"001" が 1 として入っていても今回の "001" と一致する）。
+    """
+    pos = [existing_header.index(k) if k in existing_header else None for k in key_cols]
+    cols = [p for p in pos if p is not None]
+    if not cols or ws.row_count < 2:
+        return []
+    got = ws.batch_get([f"{_col_letter(p + 1)}2:{_col_letter(p + 1)}{ws.row_count}" for p in cols],
+                       major_dimension="COLUMNS", value_render_option="UNFORMATTED_VALUE")
+    values = {p: (vr[0] if vr else []) for p, vr in zip(cols, got)}
+    n = max(len(v) for v in values.values())
+    return [tuple("" if p is None or i >= len(values[p]) else _cell_value(values[p][i]) for p in pos)
+            for i in range(n)]
+
+
+def _as_text(row: List[Any], cols: List[int]) -> List[Any]:
+    """キー列の値は先頭に ' を付けて文字列のまま書く（USER_ENTERED で日付・数値に変えられないように）。"""
+    out = list(row)
+    for j in cols:
+        v = out[j]
+        if isinstance(v, str) and v and not v.startswith("'"):
+            out[j] = "'" + v
+    return out
+
+
+def _read_rows(ws, indices: List[int], width: int) -> Dict[int, List[Any]]:
+    """
+    既存のデータ行 index（0始まり）→ 値。連続する行を1範囲にまとめて1回の batch_get で読む。
+    書式を通さない値（UNFORMATTED_VALUE）で読むので、比較は _cell_value で揃えてから行う。
+    """
+    runs: List[List[int]] = []
+    for i in indices:
+        if runs and i == runs[-1][-1] + 1:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    if not runs or width == 0:
+        return {}
+    got = ws.batch_get([f"A{r[0] + 2}:{_col_letter(width)}{r[-1] + 2}" for r in runs],
+                       value_render_option="UNFORMATTED_VALUE")
+    out: Dict[int, List[Any]] = {}
+    for r, vr in zip(runs, got):
+        for k, i in enumerate(r):
+            out[i] = list(vr[k]) if k < len(vr) else []
+    return out
+
+
+def _cell_value(v: Any) -> str:
+    """書く値とシートの値を比べるための正規化（1 / 1.0 / "1"、"50%" / 0.5 を同じ値とみなす）。"""
+    s = "" if v is None else str(v).strip()
+    try:
+        f = float(s[:-1]) / 100 if s.endswith("%") else float(s)
+    except ValueError:
+        return s
+    return repr(f) if f == f else s
+
+
+def _plan_upsert(ws, results: Sequence[dict], run_tag: Optional[str]) -> tuple:
+    """
+    既存シートと今回の結果から (header, batchUpdate 用 data, 必要な行数) を作る。
+    - ヘッダ行とキー列だけを読んで行を突き合わせ、今回の結果がある行だけを読んでセル単位で比較する。
+      変わった列だけを連続範囲ごとに書く（time は他に変化がある行だけ更新）
+    - 既存列の並びが変わる場合（基本列の追加など）はシート全体を読み、既存行を列名で並べ替えて丸ごと書き直す
+    - 旧方式（追記）で同じキーが複数行ある場合は最後の行を更新対象にする
+    """
+    existing_header = list(ws.row_values(1))
+    key_cols = ["student_id"] + (["run_tag"] if run_tag else [])
+    base = BASE_HEADERS + (["run_tag"] if (run_tag or "run_tag" in existing_header) else [])
+
+    existing_test_cols = [h for h in existing_header if h and h not in base]
+    missing = [t for t in _collect_all_test_names(results) if t not in existing_test_cols]
+    header = base + existing_test_cols + missing
+
+    def row_dict(values: List[Any], cols: List[str]) -> Dict[str, str]:
+        return {c: ("" if i >= len(values) else values[i]) for i, c in enumerate(cols)}
+
+    existing_keys = _read_keys(ws, existing_header, key_cols)
+    # 既存列の位置が保たれていれば差分書き込み、ずれるなら全面書き直し
+    rewrite = header[:len(existing_header)] != existing_header and len(existing_keys) > 0
+    existing_rows: List[Dict[str, str]] = []
+    if rewrite:
+        existing_rows = [row_dict(v, existing_header) for v in ws.get_all_values()[1:]]
+        existing_keys = [tuple(_cell_value(rd.get(k, "")) for k in key_cols) for rd in existing_rows]
+    n_existing = len(existing_keys)
+    index: Dict[tuple, int] = {}
+    for i, key in enumerate(existing_keys):
+        index[key] = i  # 後勝ち
+
+    tag_value = (run_tag or "") if "run_tag" in base else None
+    new_rows = _to_wide_rows(results, header[len(base):], run_tag=tag_value)
+    key_idx = [header.index(k) for k in key_cols]
+    data: List[dict] = []
+    appended: List[List[Any]] = []
+    pending: Dict[int, List[Any]] = {}  # 既存行 index -> 新しい行
+
+    for row in new_rows:
+        rd = row_dict(row, header)
+        key = tuple(_cell_value(rd.get(k, "")) for k in key_cols)
+        if key in index:
+            pending[index[key]] = row
+        else:
+            index[key] = n_existing + len(appended)
+            appended.append(_as_text(row, key_idx))
+
+    if rewrite or header != existing_header:
+        data.append({"range": f"A1:{_col_letter(len(header))}1", "values": [header]})
+
+    if rewrite:
+        body = []
+        for i, rd in enumerate(existing_rows):
+            body.append(_as_text(pending[i] if i in pending else [rd.get(c, "") for c in header], key_idx))
+        if body:
+            data.append({"range": f"A2:{_col_letter(len(header))}{len(body) + 1}", "values": body})
+    else:
+        old_rows = _read_rows(ws, sorted(i for i in pending if i < n_existing), len(existing_header))
+        for i in sorted(pending):
+            row, old = pending[i], row_dict(old_rows.get(i, []), existing_header)
+            changed = [j for j, c in enumerate(header)
+                       if c != "time" and _cell_value(row[j]) != _cell_value(old.get(c, ""))]
+            if not changed:
+                continue
+            changed = sorted(set(changed) | {header.index("time")})
+            data.extend(_runs_to_ranges(i + 2, changed, row))
+
+    if appended:
+        start = n_existing + 2
+        data.append({
+            "range": f"A{start}:{_col_letter(len(header))}{start + len(appended) - 1}",
+            "values": appended,
+        })
+
+    n_rows = n_existing + 1 + len(appended)
+    return header, data, n_rows
+
+
+def _runs_to_ranges(sheet_row: int, cols: List[int], row: List[Any]) -> List[dict]:
+    """0始まりの列番号リストを連続区間にまとめて A1 範囲にする。"""
+    out = []
+    start = prev = cols[0]
+    for c in cols[1:] + [None]:
+        if c is not None and c == prev + 1:
+            prev = c
+            continue
+        out.append({
+            "range": f"{_col_letter(start + 1)}{sheet_row}:{_col_letter(prev + 1)}{sheet_row}",
+            "values": [row[start:prev + 1]],
+        })
+        if c is not None:
+            start = prev = c
+    return out
+
+
+def _chunk_ranges(data: List[dict], max_cells: int) -> List[List[dict]]:
+    """範囲リストをセル数上限ごとに分割（大きな追記ブロックは行単位で割る）。"""
+    chunks: List[List[dict]] = []
+    cur: List[dict] = []
+    cur_cells = 0
+    for d in data:
+        for piece in _split_block(d, max_cells):
+            cells = sum(len(r) for r in piece["values"])
+            if cur and cur_cells + cells > max_cells:
+                chunks.append(cur)
+                cur, cur_cells = [], 0
+            cur.append(piece)
+            cur_cells += cells
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _split_block(d: dict, max_cells: int) -> List[dict]:
+    values = d["values"]
+    width = max((len(r) for r in values), default=1) or 1
+    per = max(1, max_cells // width)
+    if len(values) <= per:
+        return [d]
+    first, last = d["range"].split(":")
+    c1, r1 = _split_a1(first)
+    c2, _ = _split_a1(last)
+    out = []
+    for off in range(0, len(values), per):
+        part = values[off:off + per]
+        out.append({"range": f"{c1}{r1 + off}:{c2}{r1 + off + len(part) - 1}", "values": part})
+    return out
+
+
+def _split_a1(cell: str) -> tuple:
+    letters = cell.rstrip("0123456789")
+    return letters, int(cell[len(letters):])
+
+
+def _col_letter(n: int) -> str:
+    """1始まりの列番号 → A, B, ..., Z, AA, ..."""
+    s = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(ord("A") + r) + s
+    return s
 
 
 def _collect_all_test_names(results: Sequence[dict]) -> List[str]:
@@ -125,7 +479,12 @@ def _collect_all_test_names(results: Sequence[dict]) -> List[str]:
     return sorted(names)
 
 
-def _to_wide_rows(results: Sequence[dict], test_col_order: Sequence[str]) -> List[List[Any]]:
+def _to_wide_rows(results: Sequence[dict], test_col_order: Sequence[str],
+                  run_tag: Optional[str] = None) -> List[List[Any]]:
+    """
+    BASE_HEADERS (+ run_tag) + テスト列の順で1人1行を作る。
+    テスト列は passed / failed / error / skipped / blocked（前提が通らず実行しなかった）のいずれか。
+    """
     import time
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     out_rows: List[List[Any]] = []
@@ -139,8 +498,10 @@ def _to_wide_rows(results: Sequence[dict], test_col_order: Sequence[str]) -> Lis
         base = [
             ts, r.get("student_id"), r.get("gist_url"),
             passed, total, failed, errors, skipped, rate,
-            r.get("notes", ""),
+            r.get("notes", ""), *_resource_cells(r), int(r.get("blocked", 0) or 0),
         ]
+        if run_tag is not None:
+            base.append(run_tag)
         # outcome マップ
         outcomes: Dict[str, str] = {tc.get("name", ""): tc.get("outcome", "") for tc in (r.get("tests") or [])}
         row = base + [outcomes.get(name, "") for name in test_col_order]
@@ -1,8 +1,14 @@
 from __future__ import annotations
+import itertools
+import json
 import os
+import resource
 import shutil
+import signal
 import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
 
 
@@ -12,39 +18,304 @@ def prepare_workdir(base_out: str, student_id: str) -> Path:
     return work
 
 
-def copy_fixtures(work_dir: Path, fixtures_dir: str = "fixtures") -> None:
-    src = Path(fixtures_dir) / "game_scores.csv"
-    dst = work_dir / "game_scores.csv"
-    shutil.copy2(src, dst)
+def copy_fixtures(work_dir: Path, fixtures_dir: str = "fixtures", names=("game_scores.csv",)) -> None:
+    for name in names:
+        shutil.copy2(Path(fixtures_dir) / name, work_dir / name)
 
 
-def run_pytests(work_dir: Path, tests_dir: str = "tests", timeout_sec: int = 120) -> int:
+REPO_ROOT = Path(__file__).resolve().parent.parent  # grader/ の親 = リポジトリルート
+
+
+EVENTS_NAME = "events.jsonl"
+
+
+def pytest_args(tests_dir: str = "tests", junit: bool = True, test_timeout: int = 20) -> list:
+    """
+    pytest に渡す引数（サブプロセス / zygote 共通）。
+    結果は grader.pytest_plugin が events.jsonl に逐次書く。JUnit XML は成果物としてのみ（junit=False で省略）。
+    rootdir はリポジトリに固定する（作業場所が /dev/shm などリポジトリ外でもテスト名が tests.test_XX... のまま）。
+    """
+    tests_abs = (REPO_ROOT / tests_dir).resolve()
+    args = [
+        str(tests_abs),
+        f"--rootdir={REPO_ROOT}",
+        "-q", f"--timeout={test_timeout}",
+        "-p", "no:cacheprovider",
+        "-p", "grader.pytest_plugin",
+    ]
+    if junit:
+        junit_name = "junit.xml"
+        args += ["-o", "junit_family=xunit2", f"--junitxml={junit_name}"]
+    return args
+
+
+def pytest_env(work_dir: Path, tiers: bool = True) -> dict:
+    env = os.environ.copy()
+    env.setdefault("MPLBACKEND", "Agg")
+    # work_dir: submission を import するため / REPO_ROOT: grader.pytest_plugin を読み込むため
+    env["PYTHONPATH"] = os.pathsep.join([str(work_dir), str(REPO_ROOT)])
+    env["GRADER_EVENTS"] = str((work_dir / EVENTS_NAME).resolve())
+    env["GRADER_TIERS"] = "1" if tiers else "0"  # grader.tiers の段・前提（blocked）を使うか
+    return env
+
+
+class ResourceLimits:
+    """
+    受講生コード（pytest プロセス）に課す上限。None の項目は制限しない。
+    - mem_mb    … RLIMIT_AS（仮想メモリ）。超えた確保は MemoryError になる
+    - cpu_sec   … RLIMIT_CPU。超えると SIGXCPU（猶予5秒後に SIGKILL）
+    - nproc     … RLIMIT_NPROC。Linux ではユーザー単位（スレッド含む）で数えられ、root には効かない
+    - cgroup_root … 書き込み可能な cgroup v2 のディレクトリ（委譲済みのもの）。
+                    指定すると提出ごとに子 cgroup を作り、memory.max / pids.max と実測値を使う
+    """
+
+    def __init__(self, mem_mb: int | None = 2048, cpu_sec: int | None = 100, nproc: int | None = None,
+                 cgroup_root: str | None = None):
+        self.mem_mb = mem_mb
+        self.cpu_sec = cpu_sec
+        self.nproc = nproc
+        self.cgroup_root = cgroup_root
+
+    def rlimits(self) -> list:
+        out = []
+        if self.mem_mb:
+            out.append((resource.RLIMIT_AS, self.mem_mb * 1024 * 1024, self.mem_mb * 1024 * 1024))
+        if self.cpu_sec:
+            out.append((resource.RLIMIT_CPU, self.cpu_sec, self.cpu_sec + 5))
+        if self.nproc:
+            out.append((resource.RLIMIT_NPROC, self.nproc, self.nproc))
+        return out
+
+    def apply(self, pid: int = 0) -> None:
+        """pid（0 なら自分自身）に rlimit を設定する。"""
+        for res, soft, hard in self.rlimits():
+            if pid:
+                resource.prlimit(pid, res, (soft, hard))
+            else:
+                resource.setrlimit(res, (soft, hard))
+
+    def to_dict(self) -> dict:
+        return {"mem_mb": self.mem_mb, "cpu_sec": self.cpu_sec, "nproc": self.nproc,
+                "cgroup_root": self.cgroup_root}
+
+    @classmethod
+    def from_dict(cls, d: dict | None) -> "ResourceLimits | None":
+        return cls(**d) if d else None
+
+
+class CgroupScope:
+    """
+    提出1件分の cgroup v2（<root>/grader-<pid>-<n>）。作れない環境では enabled=False で何もしない。
+    pids.max / memory.max を設定し、終了後に memory.peak・cpu.stat・memory.events（oom_kill）を読む。
+    """
+
+    _seq = itertools.count(1)
+    _warned = False
+    _warn_lock = threading.Lock()
+
+    def __init__(self, root: str | None, limits: ResourceLimits | None = None):
+        self.path = None
+        if not root:
+            return
+        path = Path(root) / f"grader-{os.getpid()}-{next(self._seq)}"
+        try:
+            path.mkdir()
+            if limits is not None and limits.mem_mb:
+                _write_quiet(path / "memory.max", str(limits.mem_mb * 1024 * 1024))
+                _write_quiet(path / "memory.swap.max", "0")
+            if limits is not None and limits.nproc:
+                _write_quiet(path / "pids.max", str(limits.nproc))
+            self.path = path
+        except OSError as e:
+            with self._warn_lock:
+                if not CgroupScope._warned:
+                    CgroupScope._warned = True
+                    print(f"[sandbox] cgroup v2 を使えません（{root}: {e}）。rlimit のみで実行します",
+                          file=sys.stderr, flush=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def attach(self, pid: int) -> None:
+        if self.path is not None:
+            _write_quiet(self.path / "cgroup.procs", str(pid))
+
+    def stats(self) -> dict:
+        """memory.peak（KB）・cpu.stat の usage（秒）・OOM kill の有無。読めない項目は省く。"""
+        if self.path is None:
+            return {}
+        out: dict = {}
+        try:
+            out["peak_rss_kb"] = int((self.path / "memory.peak").read_text()) // 1024
+        except (OSError, ValueError):
+            pass
+        cpu = _read_keyed(self.path / "cpu.stat").get("usage_usec")
+        if cpu is not None:
+            out["cpu_sec"] = round(cpu / 1e6, 3)
+        out["oom_kill"] = _read_keyed(self.path / "memory.events").get("oom_kill", 0)
+        return out
+
+    def kill(self) -> None:
+        if self.path is not None:
+            _write_quiet(self.path / "cgroup.kill", "1")
+
+    def remove(self) -> None:
+        if self.path is None:
+            return
+        for _ in range(50):  # 中のプロセスが消えるまで少し待つ
+            try:
+                self.path.rmdir()
+                return
+            except OSError:
+                time.sleep(0.02)
+
+
+def _read_keyed(path: Path) -> dict:
+    """cpu.stat / memory.events 形式（"key value" の行）を読む。"""
+    try:
+        return {k: int(v) for k, _, v in (line.partition(" ") for line in path.read_text().splitlines()) if v}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_quiet(path: Path, value: str) -> None:
+    try:
+        path.write_text(value)
+    except FileNotFoundError:  # コントローラが無効な cgroup では該当ファイルが無い
+        pass
+
+
+def termination_reason(returncode: int | None, timed_out: bool, events_path: Path | None = None,
+                       oom_kill: int = 0, limits: ResourceLimits | None = None) -> str:
+    """
+    pytest プロセスが終わった理由。
+    exited / timeout / cpu_limit / memory_limit / signal:<名前>
+    memory_limit は cgroup の oom_kill か、RLIMIT_AS を掛けた実行でテストが MemoryError で落ちたとき
+    （プラグインが例外の型を見て書く memory_error イベント。pytest.out の文字列は見ない）。
+    """
+    if timed_out:
+        return "timeout"
+    if oom_kill:
+        return "memory_limit"
+    if returncode is not None and returncode < 0:
+        sig = -returncode
+        if sig == signal.SIGXCPU:
+            return "cpu_limit"
+        try:
+            return f"signal:{signal.Signals(sig).name}"
+        except ValueError:
+            return f"signal:{sig}"
+    # RLIMIT_AS は確保の失敗（MemoryError）として現れ、プロセス自体は普通に終わる
+    if events_path is not None and limits is not None and limits.mem_mb and _memory_error(events_path):
+        return "memory_limit"
+    return "exited"
+
+
+def _memory_error(events_path: Path) -> bool:
+    """events.jsonl に memory_error イベントがあるか（kill された瞬間の書きかけ行は飛ばす）。"""
+    try:
+        with open(events_path, encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                try:
+                    if json.loads(line).get("event") == "memory_error":
+                        return True
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return False
+
+
+def run_pytests(work_dir: Path, tests_dir: str = "tests", timeout_sec: int = 120,
+                runner=None, junit: bool = True, stats: dict | None = None,
+                limits: ResourceLimits | None = None, tiers: bool = True, test_timeout: int = 20) -> int:
     """
     pytest をサブプロセスで実行。
     - cwd は work_dir（conftest が submission.py を拾えるように）
     - tests_dir はリポジトリ内 tests の “絶対パス” を渡す
     - junit.xml は カレント直下のファイル名で渡して、パスの二重解決を防ぐ
+    - 並列採点で .pytest_cache を取り合わないよう cacheprovider は無効化
+    - runner（grader.zygote.ZygoteRunner）を渡すと、import 済みの常駐プロセスから fork して実行
+    - stats を渡すと子プロセスの peak_rss_kb / cpu_sec（user+sys）/ termination（終了理由）を書き込む
+    - limits（ResourceLimits）で メモリ / CPU 秒 / プロセス数 を制限する
+    - 子は新しいセッション（プロセスグループ）で動かし、タイムアウト時はグループごと kill する
+    - tiers なら grader.tiers の段の順に実行し、前提が通らなかったテストは実行せず blocked にする
+    - test_timeout はテスト1件あたりの秒数（pytest-timeout）、timeout_sec は pytest 全体
+    タイムアウト時はどちらも subprocess.TimeoutExpired を送出する。
     """
-    env = os.environ.copy()
-    env.setdefault("MPLBACKEND", "Agg")
-    env["PYTHONPATH"] = str(work_dir)
+    env = pytest_env(work_dir, tiers=tiers)
+    args = pytest_args(tests_dir, junit=junit, test_timeout=test_timeout)
+    log_path = work_dir / "pytest.out"
+    (work_dir / EVENTS_NAME).unlink(missing_ok=True)  # 前回分が残っていると集計を誤る
+    if junit:
+        (work_dir / "junit.xml").unlink(missing_ok=True)
 
-    repo_root = Path(__file__).resolve().parent.parent  # grader/ の親 = リポジトリルート
-    tests_abs = (repo_root / tests_dir).resolve()
+    if runner is not None:
+        return runner.run(work_dir, args, env, timeout_sec, log_path, stats=stats, limits=limits)
 
-    junit_name = "junit.xml"
-    log_path = work_dir / "pytest.out"
+    cmd = [sys.executable, "-m", "pytest", *args]
+    cgroup = CgroupScope(limits.cgroup_root if limits else None, limits)
+    try:
+        with open(log_path, "w", encoding="utf-8") as logf:
+            # preexec_fn はスレッドから使うと危ういので、起動直後に prlimit で外から設定する
+            proc = subprocess.Popen(cmd, cwd=str(work_dir), env=env, stdout=logf, stderr=subprocess.STDOUT,
+                                    start_new_session=True)
+            try:
+                if limits is not None:
+                    limits.apply(proc.pid)
+                cgroup.attach(proc.pid)
+            except OSError:
+                _kill_group(proc.pid)
+                proc.wait()
+                raise
+            returncode, ru = _wait_with_rusage(proc, timeout_sec, cgroup)
+            _kill_group(proc.pid)  # 提出コードが起動して残ったプロセスも片付ける
+        cg = cgroup.stats()
+    finally:
+        cgroup.kill()
+        cgroup.remove()
+    if stats is not None:
+        if ru is not None:
+            stats.update(rusage_stats(ru))
+        stats.update({k: v for k, v in cg.items() if k != "oom_kill"})  # cgroup は孫プロセスも含む
+        stats["termination"] = termination_reason(returncode, returncode is None, work_dir / EVENTS_NAME,
+                                                  cg.get("oom_kill", 0), limits)
+    if returncode is None:
+        raise subprocess.TimeoutExpired(cmd, timeout_sec)
+    return returncode
 
-    cmd = [
-        sys.executable, "-m", "pytest",
-        str(tests_abs),
-        "-q", "--timeout=20",
-        "-o", "junit_family=xunit2",
-        f"--junitxml={junit_name}",
-    ]
-    with open(log_path, "w", encoding="utf-8") as logf:
-        proc = subprocess.run(
-            cmd, cwd=str(work_dir), env=env,
-            stdout=logf, stderr=subprocess.STDOUT, timeout=timeout_sec
-        )
-    return proc.returncode
+
+def rusage_stats(ru) -> dict:
+    """os.wait4 の rusage → 記録用 dict（ru_maxrss は Linux では KB）。"""
+    return {"peak_rss_kb": int(ru.ru_maxrss), "cpu_sec": round(ru.ru_utime + ru.ru_stime, 3)}
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _wait_with_rusage(proc: subprocess.Popen, timeout_sec: float, cgroup: CgroupScope | None = None) -> tuple:
+    """
+    wait4 で子を回収して rusage（メモリ・CPU）を得る。subprocess.run では取れないため自前で待つ。
+    タイムアウト時はプロセスグループ（と cgroup）ごと kill して (None, rusage) を返す。
+    """
+    deadline = time.monotonic() + timeout_sec
+    delay = 0.001
+    while True:
+        pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return proc.returncode, ru
+        if time.monotonic() >= deadline:
+            _kill_group(proc.pid)  # start_new_session なので pid = プロセスグループID
+            if cgroup is not None:
+                cgroup.kill()
+            _, status, ru = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return None, ru
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
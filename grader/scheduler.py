@@ -0,0 +1,130 @@
+"""
+採点の順番（長くかかりそうな人から）と、タイムアウトを繰り返す提出の短縮タイムアウト。
+
+並列で採点すると、タイムアウトまで走る提出が最後に始まって他のワーカが空いたまま待つことがある。
+- 見込みの所要時間は前回の所要時間（<cache>/durations.json、--shard の分割と同じ履歴）。
+  履歴の無い人は履歴の中央値を提出の大きさ（前回までの中央値との比、0.5〜2 倍）で補正したもの。
+  前回タイムアウトした人は短縮したタイムアウトいっぱい
+- 取得も採点も見込みの長い順（LPT）に始める（run_pipeline の order / priority）
+- 前回タイムアウトした人（<cache>/schedule.json に連続回数）は短縮したタイムアウトで走らせ、
+  それでも切れたら全員の後に本来のタイムアウトでやり直す（retry）
+- 見込みの makespan（jobs 個のワーカに LPT で割り当てたときの最大負荷）と実際の採点時間を並べて出す
+
+    sched = Scheduler(tasks, load_durations(p), load_schedule(q), jobs=8, timeout_sec=120)
+    run_pipeline(items, fetch, grade, order=..., priority=...)
+    sched.observe(tasks, result_lists); save_schedule(q, sched.history)
+"""
+from __future__ import annotations
+import json
+import statistics
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from grader.shard import partition
+from grader.trace import total_wall
+
+SCHEDULE_NAME = "schedule.json"
+REDUCED_TIMEOUT_SEC = 30  # 前回タイムアウトした人の1回目のタイムアウト（切れたら本来のタイムアウトでやり直す）
+REPEAT_AFTER = 1          # 連続でこの回数タイムアウトした人を短縮の対象にする
+SIZE_FACTOR = (0.5, 2.0)  # 提出の大きさによる補正の下限・上限
+
+
+def timed_out(result: dict) -> bool:
+    return result.get("termination") == "timeout" or (result.get("notes") or "").startswith("Timeout")
+
+
+def load_schedule(path: str | Path) -> Dict[str, dict]:
+    """作業ディレクトリ名 → {"bytes": 提出の大きさ, "timeouts": 連続でタイムアウトした回数}。無ければ空。"""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+
+
+def save_schedule(path: str | Path, history: Dict[str, dict]) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(history, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+
+
+class Scheduler:
+    """1回の grade_all での順番・タイムアウトの決め方。tasks は assign_workdirs の戻り値。"""
+
+    def __init__(self, tasks: Sequence[Tuple[str, str, str]], durations: Dict[str, float],
+                 history: Dict[str, dict], jobs: int, timeout_sec: float,
+                 reduced_timeout_sec: float | None = REDUCED_TIMEOUT_SEC, repeat_after: int = REPEAT_AFTER):
+        self.tasks = list(tasks)
+        self.durations = durations
+        self.history = {k: dict(v) for k, v in history.items()}
+        self.jobs = max(1, jobs)
+        self.timeout_sec = timeout_sec
+        self.reduced_timeout_sec = (reduced_timeout_sec if reduced_timeout_sec and reduced_timeout_sec < timeout_sec
+                                    else None)
+        self.repeat_after = repeat_after
+        known = [durations[t[2]] for t in self.tasks if t[2] in durations]
+        self._default = statistics.median(known) if known else 0.0
+        sizes = [h["bytes"] for h in history.values() if h.get("bytes")]
+        self._ref_bytes = statistics.median(sizes) if sizes else None
+        self.sizes: Dict[str, int] = {}
+        self.predicted = {t[2]: self.predict(t[2]) for t in self.tasks}
+
+    def offender(self, work: str) -> bool:
+        return self.history.get(work, {}).get("timeouts", 0) >= self.repeat_after
+
+    def timeout_for(self, work: str, timeout_sec: float) -> float | None:
+        """短縮したタイムアウト（対象でなければ None = 課題のタイムアウトのまま）。"""
+        if self.reduced_timeout_sec is None or not self.offender(work):
+            return None
+        return min(self.reduced_timeout_sec, timeout_sec)
+
+    def predict(self, work: str, size: int | None = None) -> float:
+        """見込みの所要時間（秒）。"""
+        if self.offender(work):
+            return self.reduced_timeout_sec or self.timeout_sec
+        if work in self.durations:
+            return self.durations[work]
+        if size and self._ref_bytes:
+            lo, hi = SIZE_FACTOR
+            return self._default * min(hi, max(lo, size / self._ref_bytes))
+        return self._default
+
+    def order(self) -> List[int]:
+        """tasks の位置を見込みの長い順に（同じなら入力順）。"""
+        return sorted(range(len(self.tasks)), key=lambda i: (-self.predicted[self.tasks[i][2]], i))
+
+    def priority(self, work: str, size: int | None) -> float:
+        """取得できた時点の優先度（小さいほど先）。取得した提出の大きさで履歴の無い人の見込みを補正する。"""
+        if size:
+            self.sizes[work] = max(size, self.sizes.get(work, 0))
+            if work not in self.durations and not self.offender(work):
+                self.predicted[work] = self.predict(work, size)
+        return -self.predicted[work]
+
+    def predicted_makespan(self) -> float:
+        """
+        見込みの所要時間を jobs 個のワーカに LPT で割り当てたときの最大負荷（shard.partition と同じ割り当て）。
+        短縮したタイムアウトの人はまた切れるものとして、最後の本来のタイムアウトでのやり直しの分も足す。
+        """
+        if not self.tasks:
+            return 0.0
+        groups = partition(self.tasks, self.jobs, self.predicted)
+        makespan = max(sum(self.predicted[self.tasks[i][2]] for i in g) for g in groups)
+        retries = sum(1 for t in self.tasks if self.timeout_for(t[2], self.timeout_sec) is not None)
+        return makespan + -(-retries // self.jobs) * self.timeout_sec
+
+    def observe(self, tasks: Sequence[Tuple[str, str, str]], result_lists: List[list]) -> dict:
+        """
+        今回の結果で history（大きさ・連続タイムアウト回数）を更新し、見込みとの比較を返す。
+        {"students", "with_history", "mean_abs_error"}（平均誤差は履歴のあった人だけ）
+        """
+        errors = []
+        for k, t in enumerate(tasks):
+            rows = [results[k] for results in result_lists]
+            h = self.history.setdefault(t[2], {})
+            if t[2] in self.sizes:
+                h["bytes"] = self.sizes[t[2]]
+            h["timeouts"] = h.get("timeouts", 0) + 1 if any(timed_out(r) for r in rows) else 0
+            if t[2] in self.durations and all(r.get("perf") for r in rows):
+                errors.append(abs(sum(total_wall(r) for r in rows) - self.durations[t[2]]))
+        return {"students": len(tasks), "with_history": len(errors),
+                "mean_abs_error": round(statistics.mean(errors), 2) if errors else None}
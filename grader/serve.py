@@ -0,0 +1,473 @@
+"""
+常駐採点（python run.py serve）。1つのプロセスを温めたまま、新しい提出・変わった提出だけを採点する。
+
+- ロスター（load_from_file / iter_sheet_roster）を interval 秒ごとに読み直し、初めて見る受講生・Gist URL が変わった
+  受講生だけを優先度付きキューに入れる。recheck 秒ごとに全員を低い優先度で入れ直すと、URL はそのままで
+  Gist を更新した人も拾える（条件付きリクエストと台帳 --incremental で、変わっていない人は pytest を起動しない）
+- ローカルの HTTP（既定 127.0.0.1:8765）で提出を直接受け付ける（POST /submit、最優先）
+- jobs 個のワーカがキューから取り出して採点し、終わるたびに <out>/results.jsonl に追記する
+  （課題が複数なら <out>/<課題名>/results.jsonl）。Sheets へは push_interval 秒ごとにまとめて upsert
+- GET /status でキューの長さ・採点中の数・スループット、GET /results で受講生ごとの最新の結果を返す
+
+同じ受講生がキューに複数回入ったときは最後のもの（新しい URL・高い優先度）だけを採点する。
+
+    service = GradeService(".out", lambda: load_from_file("gists.txt"), interval=60, jobs=4)
+    service.run()                     # SIGINT / SIGTERM で止まる
+"""
+from __future__ import annotations
+import heapq
+import http.server
+import itertools
+import json
+import signal
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from grader.assignments import Assignment, default_assignment
+from grader.cache import CACHE_DIR_DEFAULT, GistCache, ResultCache
+from grader.engine import iter_workdirs
+from grader.fetch import FetchClient
+from grader.grade import assignment_out_dir, assignment_suite, fetch_assignments, grade_fetched_safe
+from grader.ledger import LEDGER_NAME, Ledger
+from grader.report import push_results_wide_to_google_sheets
+from grader.sandbox import ResourceLimits
+from grader.workspace import WorkspaceManager, safe_work_name
+
+PRIORITY_PUSH = 0      # POST /submit
+PRIORITY_NEW = 1       # ロスターに新しく現れた / URL が変わった
+PRIORITY_RECHECK = 2   # 定期的な再確認
+_REASONS = {PRIORITY_PUSH: "push", PRIORITY_NEW: "roster", PRIORITY_RECHECK: "recheck"}
+THROUGHPUT_WINDOW = 300  # /status のスループットを数える直近の秒数
+
+
+class WorkQueue:
+    """
+    作業ディレクトリ名ごとに1件だけ持つ優先度付きキュー。同じ受講生を入れ直すと内容を差し替え、
+    優先度は高い方（小さい値）に上げる。get() は止められるまで待ち、取り出した項目は done() で返す。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._pending: Dict[str, Tuple[int, int, tuple]] = {}  # work → (priority, seq, task)
+        self._busy: set = set()
+        self._seq = itertools.count()
+        self._closed = False
+
+    def put(self, task: tuple, priority: int) -> bool:
+        """task = (sid, url, work)。新しく入れた / 優先度を上げたなら True。"""
+        work = task[2]
+        with self._cond:
+            cur = self._pending.get(work)
+            if cur is not None and cur[0] <= priority:
+                self._pending[work] = (cur[0], cur[1], task)  # 優先度はそのまま、中身だけ新しく
+                return False
+            entry = (priority, next(self._seq), task)
+            self._pending[work] = entry
+            heapq.heappush(self._heap, (entry[0], entry[1], work))
+            self._cond.notify()
+            return True
+
+    def get(self) -> Optional[Tuple[int, tuple]]:
+        """
+        (priority, task)。close() 後は None。差し替え前の古い項目は読み飛ばし、採点中の受講生の項目は
+        done() まで後回しにする（同じ作業ディレクトリを2つのワーカが同時に使わない）。
+        """
+        with self._cond:
+            while True:
+                deferred = []
+                try:
+                    while self._heap:
+                        item = heapq.heappop(self._heap)
+                        priority, seq, work = item
+                        cur = self._pending.get(work)
+                        if cur is None or cur[1] != seq:
+                            continue
+                        if work in self._busy:
+                            deferred.append(item)
+                            continue
+                        del self._pending[work]
+                        self._busy.add(work)
+                        return priority, cur[2]
+                finally:
+                    for item in deferred:
+                        heapq.heappush(self._heap, item)
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+    def done(self, work: str) -> None:
+        with self._cond:
+            self._busy.discard(work)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+
+class _Lane:
+    """課題1つ分：出力先・作業場所・台帳・結果の追記先・Sheets へ送る前の結果。"""
+
+    def __init__(self, assignment: Assignment, out_dir: str, workspace: str, tiers: bool,
+                 limits: ResourceLimits | None):
+        self.assignment = assignment
+        self.out_dir = out_dir
+        Path(out_dir).mkdir(parents=True, exist_ok=True)
+        self.workspaces = WorkspaceManager(out_dir, mode=workspace, fixtures_dir=assignment.fixtures_dir,
+                                           fixtures=assignment.fixtures)
+        self.suite = assignment_suite(assignment, tiers=tiers, limits=limits)
+        self.ledger = Ledger(Path(out_dir) / LEDGER_NAME)
+        self.ledger.start_run()
+        self._lock = threading.Lock()
+        self._log = open(Path(out_dir) / "results.jsonl", "ab")
+        # 作業ディレクトリ名（<sid> / <sid>__2 ...）→ 結果。同じ sid がロスターに複数行あっても上書きし合わない
+        self.latest: Dict[str, dict] = {}
+        self.unpushed: Dict[str, dict] = {}
+
+    def write(self, work: str, result: dict) -> None:
+        line = json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            self._log.write(line)
+            self._log.flush()
+            self.latest[work] = result
+            self.unpushed[work] = result
+
+    def take_unpushed(self) -> Dict[str, dict]:
+        with self._lock:
+            rows, self.unpushed = self.unpushed, {}
+        return rows
+
+    def results(self) -> Dict[str, dict]:
+        with self._lock:
+            return dict(self.latest)
+
+    def requeue(self, rows: Dict[str, dict]) -> None:
+        """送れなかった結果を戻す（その間に出た新しい結果の方を残す）。"""
+        with self._lock:
+            for work, result in rows.items():
+                self.unpushed.setdefault(work, result)
+
+    def close(self) -> None:
+        self.ledger.finish_run()
+        self.ledger.close()
+        self.workspaces.close()
+        with self._lock:
+            self._log.close()
+
+
+class GradeService:
+    """run.py serve の本体。start() でスレッドを起動し、stop() で後片付けする（run() は両方とシグナル待ち）。"""
+
+    def __init__(self, out_dir: str, load_roster: Callable[[], List[Tuple[str, str]]] | None,
+                 interval: float = 60, jobs: int = 1, host: str = "127.0.0.1", port: int | None = 8765,
+                 recheck: float = 0, use_cache: bool = True, cache_dir: str | None = None,
+                 runner: str = "subprocess", limits: ResourceLimits | None = None, workspace: str = "disk",
+                 precheck: bool = True, tiers: bool = True, junit: bool = True,
+                 assignments: List[Assignment] | None = None, push_to_sheets: bool = False,
+                 push_interval: float = 10, run_tag: str | None = None, fetch_jobs: int = 16):
+        self.out_dir = out_dir
+        self.load_roster = load_roster
+        self.interval = interval
+        self.recheck = recheck
+        self.jobs = max(1, jobs)
+        self.host = host
+        self.port = port
+        self.push_to_sheets = push_to_sheets
+        self.push_interval = push_interval
+        self.run_tag = run_tag
+        self.grade_kwargs = {"junit": junit, "limits": limits or ResourceLimits(), "precheck": precheck,
+                             "tiers": tiers}
+        assignments = list(assignments or [default_assignment()])
+        multi = len(assignments) > 1
+        self.lanes = [_Lane(a, assignment_out_dir(out_dir, a, multi), workspace, tiers, self.grade_kwargs["limits"])
+                      for a in assignments]
+        self.client = FetchClient(max_in_flight=fetch_jobs)
+        self.cache = ResultCache(cache_dir or CACHE_DIR_DEFAULT) if use_cache else None
+        self.gist_cache = GistCache(cache_dir or CACHE_DIR_DEFAULT) if use_cache else None
+        self.zygote = None
+        if runner == "zygote":
+            from grader.zygote import ZygoteRunner
+            self.zygote = ZygoteRunner()
+        self.queue = WorkQueue()
+        self.known: Dict[str, str] = {}  # work → 最後に見た gist_url
+        self.roster_works: Dict[str, List[Tuple[str, str]]] = {}  # sid → ロスター上の [(work, url)]（行の順）
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poke = threading.Event()   # POST /poll ですぐに読み直す
+        self._threads: List[threading.Thread] = []
+        self._httpd: http.server.ThreadingHTTPServer | None = None
+        self._started = time.time()
+        self._done: deque = deque()      # 採点し終えた時刻（スループット用）
+        self.stats = {"graded": 0, "unchanged": 0, "errors": 0, "in_flight": 0, "enqueued": 0,
+                      "polls": 0, "last_poll": None, "last_poll_error": None, "pushes": 0}
+
+    # ---- キューへの投入 ----
+
+    def resolve_work(self, sid: str, url: str) -> str:
+        """
+        POST された sid の作業ディレクトリ名（ロスターの読み込みと同じ <sid> / <sid>__2 ...）。
+        ロスターがあれば載っている sid だけを受け付け（無ければ LookupError）、同じ sid が複数行あれば
+        URL が一致する行。決められなければ ValueError。ロスター無しなら sid がそのまま作業ディレクトリ名になるので、
+        パスの1要素として使えない sid（"../x" や "/tmp/x"）は ValueError。
+        """
+        with self._lock:
+            rows = self.roster_works.get(sid) or []
+        if not rows:
+            if self.load_roster is not None:
+                raise LookupError(f"{sid} はロスターにありません")
+            if not safe_work_name(sid):
+                raise ValueError(f"student_id は作業ディレクトリ名として使えません: {sid!r}")
+            return sid
+        if len(rows) == 1:
+            return rows[0][0]
+        matched = [work for work, u in rows if u == url]
+        if len(matched) != 1:
+            raise ValueError(f"ロスターに {sid} が {len(rows)} 行あり、gist_url からどの行か決められません"
+                             f"（{', '.join(w for w, _ in rows)}）")
+        return matched[0]
+
+    def submit(self, sid: str, url: str, priority: int = PRIORITY_PUSH, work: str | None = None) -> bool:
+        work = work or self.resolve_work(sid, url)
+        with self._lock:
+            self.known[work] = url
+        added = self.queue.put((sid, url, work), priority)
+        with self._lock:
+            self.stats["enqueued"] += added
+        return added
+
+    def poll_once(self, recheck: bool = False) -> int:
+        """ロスターを読み、新しい・URL が変わった受講生（recheck なら全員）をキューに入れる。入れた件数を返す。"""
+        if self.load_roster is None:
+            return 0
+        added = seen = 0
+        works: Dict[str, List[Tuple[str, str]]] = {}
+        try:
+            # 読めた行から順にキューに入れる（iter_sheet_roster なら最初の塊が届いた時点で採点が始まる）
+            for sid, url, work in iter_workdirs(self.load_roster()):
+                seen += 1
+                url = url.strip()
+                works.setdefault(sid, []).append((work, url))
+                with self._lock:
+                    prev = self.known.get(work)
+                    self.known[work] = url
+                    if len(works[sid]) > 1 or sid not in self.roster_works:
+                        self.roster_works[sid] = works[sid]  # 読み終える前の POST にも分かるように
+                if prev != url:
+                    added += self.queue.put((sid, url, work), PRIORITY_NEW)
+                elif recheck:
+                    added += self.queue.put((sid, url, work), PRIORITY_RECHECK)
+        except Exception as e:  # Sheets の一時的なエラーなどで常駐を止めない
+            with self._lock:
+                self.stats["last_poll_error"] = f"{type(e).__name__}: {e}"
+                self.stats["enqueued"] += added
+            print(f"[serve] ロスターを読めませんでした: {e}", flush=True)
+            return added
+        with self._lock:
+            self.roster_works = works
+            self.stats.update(polls=self.stats["polls"] + 1, last_poll=time.time(), last_poll_error=None,
+                              enqueued=self.stats["enqueued"] + added)
+        if added:
+            print(f"[serve] roster={seen} enqueued={added}{' (recheck)' if recheck else ''} "
+                  f"queue={len(self.queue)}", flush=True)
+        return added
+
+    # ---- スレッド ----
+
+    def _poller(self) -> None:
+        last_recheck = time.monotonic()
+        while not self._stop.is_set():
+            recheck = bool(self.recheck) and time.monotonic() - last_recheck >= self.recheck
+            if recheck:
+                last_recheck = time.monotonic()
+            self.poll_once(recheck=recheck)
+            self._poke.wait(self.interval)
+            self._poke.clear()
+
+    def _worker(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            priority, (sid, url, work) = item
+            with self._lock:
+                self.stats["in_flight"] += 1
+            try:
+                self._grade(sid, url, work, priority)
+            finally:
+                self.queue.done(work)
+                with self._lock:
+                    self.stats["in_flight"] -= 1
+
+    def _grade(self, sid: str, url: str, work: str, priority: int) -> None:
+        try:
+            fetched = fetch_assignments(sid, url, work, self.lanes, self.client, self.gist_cache)
+        except Exception as e:
+            fetched = {lane.assignment.name: e for lane in self.lanes}
+        for lane in self.lanes:
+            result = grade_fetched_safe(sid, url, fetched[lane.assignment.name], cache=self.cache,
+                                        suite=lane.suite, runner=self.zygote, ledger=lane.ledger,
+                                        incremental=True, workspaces=lane.workspaces,
+                                        assignment=lane.assignment, **self.grade_kwargs)
+            unchanged = result.get("incremental") == "unchanged"
+            with self._lock:
+                self._done.append(time.time())
+                self.stats["unchanged" if unchanged else "graded"] += 1
+                self.stats["errors"] += result.get("source") in ("fetch_error", "grader_error")
+            if unchanged and lane.latest.get(work, {}).get("gist_url") == url:
+                continue  # 再確認で変わっていなかった：書き出さない
+            result["trigger"] = _REASONS.get(priority, "")
+            lane.write(work, result)
+            tag = f" {lane.assignment.name}" if len(self.lanes) > 1 else ""
+            print(f"[serve]{tag} {sid} {result.get('passed', 0)}/{result.get('total_tests', 0)} passed "
+                  f"({result['trigger']}) queue={len(self.queue)}", flush=True)
+
+    def _pusher(self) -> None:
+        while not self._stop.wait(self.push_interval):
+            self.flush_sheets()
+
+    def flush_sheets(self) -> None:
+        """前回から後に出た結果を、課題ごとのタブへまとめて upsert する。"""
+        for lane in self.lanes:
+            rows = lane.take_unpushed()
+            if not rows:
+                continue
+            try:
+                push_results_wide_to_google_sheets(list(rows.values()),
+                                                   worksheet_name=lane.assignment.result_tab, run_tag=self.run_tag)
+            except Exception as e:  # 次の回にもう一度送る
+                print(f"[serve] Sheets への書き込みに失敗しました: {type(e).__name__}: {e}", flush=True)
+                lane.requeue(rows)
+                continue
+            with self._lock:
+                self.stats["pushes"] += 1
+
+    # ---- 状態 ----
+
+    def status(self) -> dict:
+        now = time.time()
+        with self._lock:
+            while self._done and self._done[0] < now - THROUGHPUT_WINDOW:
+                self._done.popleft()
+            recent = len(self._done)
+            stats = dict(self.stats)
+        window = min(THROUGHPUT_WINDOW, max(now - self._started, 1.0))
+        return {
+            "queue_depth": len(self.queue), "workers": self.jobs, **stats,
+            "throughput_per_min": round(recent / window * 60, 2),
+            "uptime_sec": round(now - self._started, 1),
+            "students": len(self.known),
+            "assignments": [lane.assignment.name for lane in self.lanes],
+        }
+
+    def latest(self) -> dict:
+        return {lane.assignment.name: lane.results() for lane in self.lanes}
+
+    # ---- 起動・停止 ----
+
+    def start(self) -> None:
+        self._threads = [threading.Thread(target=self._worker, name=f"serve-grade-{k}", daemon=True)
+                         for k in range(self.jobs)]
+        if self.load_roster is not None:
+            self._threads.append(threading.Thread(target=self._poller, name="serve-poll", daemon=True))
+        if self.push_to_sheets:
+            self._threads.append(threading.Thread(target=self._pusher, name="serve-push", daemon=True))
+        if self.port is not None:
+            self._httpd = http.server.ThreadingHTTPServer((self.host, self.port), _handler(self))
+            self._httpd.daemon_threads = True
+            self._threads.append(threading.Thread(target=self._httpd.serve_forever, name="serve-http", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    @property
+    def address(self) -> Optional[Tuple[str, int]]:
+        return self._httpd.server_address[:2] if self._httpd is not None else None
+
+    def stop(self) -> None:
+        """新しい受け付けを止め、キューに残った分は採点せずに終える（採点中のものは待つ）。"""
+        self._stop.set()
+        self._poke.set()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        self.queue.close()
+        for t in self._threads:
+            t.join()
+        if self.push_to_sheets:
+            self.flush_sheets()
+        self.client.close()
+        for lane in self.lanes:
+            lane.close()
+        if self.zygote is not None:
+            self.zygote.close()
+
+    def run(self) -> None:
+        """start() して SIGINT / SIGTERM まで待ち、stop() する。"""
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        self.start()
+        where = f"http://{self.address[0]}:{self.address[1]}" if self.address else "HTTP なし"
+        print(f"[serve] 起動しました（workers={self.jobs} interval={self.interval}s {where}）", flush=True)
+        stop.wait()
+        print("[serve] 停止します（採点中の提出を待っています）", flush=True)
+        self.stop()
+
+
+def _handler(service: GradeService):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, code: int, body) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/status":
+                return self._json(200, service.status())
+            if path == "/results":
+                return self._json(200, service.latest())
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if path == "/poll":
+                service._poke.set()
+                return self._json(202, {"queued": len(service.queue)})
+            if path != "/submit":
+                return self._json(404, {"error": "not found"})
+            try:
+                payload = json.loads(body or b"{}")
+                items = payload if isinstance(payload, list) else [payload]
+                pairs = [(str(d["student_id"]).strip(), str(d["gist_url"]).strip()) for d in items]
+            except (ValueError, KeyError, TypeError):
+                return self._json(400, {"error": 'JSON {"student_id": ..., "gist_url": ...}（またはその配列）を送ってください'})
+            if not all(safe_work_name(sid) for sid, _ in pairs):
+                return self._json(400, {"error": "student_id は / や \\ を含まず、. で始まらない名前にしてください"})
+            try:  # ロスターに同じ sid が複数行ある人は、どの行（作業ディレクトリ）かを先に決める
+                works = [service.resolve_work(sid, url) for sid, url in pairs]
+            except LookupError as e:
+                return self._json(404, {"error": e.args[0]})
+            except ValueError as e:
+                return self._json(409, {"error": str(e)})
+            added = sum(service.submit(sid, url, work=work) for (sid, url), work in zip(pairs, works))
+            self._json(202, {"accepted": len(pairs), "enqueued": added, "queue_depth": len(service.queue)})
+
+    return Handler
@@ -0,0 +1,95 @@
+"""
+ロスターを N 個のシャードに分けて、複数ジョブ（GitHub Actions の matrix）で並行して採点する。
+
+- 分け方は全シャードで同じ入力（ロスター・所要時間の履歴）から決まるので、ジョブ間で相談しなくてよい
+- 所要時間の履歴（<cache>/durations.json）があれば、長い人から順に合計が一番少ないシャードへ入れる（LPT）。
+  履歴の無い人は履歴の中央値とみなす。履歴が無ければ作業ディレクトリ名の安定ハッシュの順に配る
+- 各シャードは <out>/shard.json に担当した受講生（ロスター上の位置つき）を書き、run.py merge がそれを使って
+  入力順の results*.csv / results.json にまとめ直す
+
+    tasks = assign_workdirs(urls)                     # 先にロスター全体で作業ディレクトリ名を決める
+    idx = shard_indices(tasks, 2, 4, durations)       # 4分割の2番目（1始まり）が担当する位置
+"""
+from __future__ import annotations
+import hashlib
+import json
+import statistics
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+SHARD_MANIFEST = "shard.json"
+DURATIONS_NAME = "durations.json"
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """"2/4" → (2, 4)。番号は 1 始まり。"""
+    try:
+        i, n = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise ValueError(f"--shard は i/N の形式で指定してください: {text!r}") from None
+    if not (n >= 1 and 1 <= i <= n):
+        raise ValueError(f"--shard の番号が範囲外です（1 ≤ i ≤ N）: {text!r}")
+    return i, n
+
+
+def _stable_hash(key: str) -> int:
+    # hash() は実行ごとに変わる（PYTHONHASHSEED）ので使わない
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def partition(tasks: Sequence[Tuple[str, str, str]], n: int,
+              durations: Dict[str, float] | None = None) -> List[List[int]]:
+    """tasks（assign_workdirs の戻り値）をシャードごとの位置のリスト（入力順）に分ける。"""
+    shards: List[List[int]] = [[] for _ in range(n)]
+    known = [durations[t[2]] for t in tasks if durations and t[2] in durations]
+    if not known:  # ハッシュ順に配ると、人数が少なくても各シャードの人数が揃う
+        for j, i in enumerate(sorted(range(len(tasks)), key=lambda i: _stable_hash(tasks[i][2]))):
+            shards[j % n].append(i)
+        return [sorted(s) for s in shards]
+
+    default = statistics.median(known)
+    est = [durations.get(t[2], default) for t in tasks]
+    load = [0.0] * n
+    # 長い順（同じならハッシュ順）に、合計が一番少ないシャードへ
+    for i in sorted(range(len(tasks)), key=lambda i: (-est[i], _stable_hash(tasks[i][2]))):
+        k = min(range(n), key=lambda k: (load[k], k))
+        shards[k].append(i)
+        load[k] += est[i]
+    return [sorted(s) for s in shards]
+
+
+def shard_indices(tasks: Sequence[Tuple[str, str, str]], shard: int, n: int,
+                  durations: Dict[str, float] | None = None) -> List[int]:
+    return partition(tasks, n, durations)[shard - 1]
+
+
+def load_durations(path: str | Path) -> Dict[str, float]:
+    """作業ディレクトリ名 → 前回の所要時間（秒）。無ければ空。"""
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {str(k): float(v) for k, v in data.items() if isinstance(v, (int, float))}
+
+
+def save_durations(path: str | Path, durations: Dict[str, float]) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(durations, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+
+
+def write_manifest(out_dir: str | Path, shard: int, n: int, roster_size: int, balance: str,
+                   tasks: Sequence[Tuple[str, str, str]], indices: Sequence[int],
+                   assignments: Sequence[str] = ()) -> None:
+    """<out>/shard.json：担当した受講生と、それぞれのロスター上の位置（と採点した課題の名前）。"""
+    manifest = {
+        "shard": shard, "of": n, "roster_size": roster_size, "balance": balance,
+        "assignments": list(assignments),
+        "students": [{"index": i, "student_id": tasks[i][0], "gist_url": tasks[i][1], "work": tasks[i][2]}
+                     for i in indices],
+    }
+    (Path(out_dir) / SHARD_MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2),
+                                                encoding="utf-8")
+
+
+def read_manifest(shard_dir: str | Path) -> dict:
+    return json.loads((Path(shard_dir) / SHARD_MANIFEST).read_text(encoding="utf-8"))
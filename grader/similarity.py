@@ -0,0 +1,202 @@
+"""
+提出どうしの類似度（コピーの検出）。総当たり O(n²) の比較はせず、MinHash + LSH で候補だけを比べる。
+
+1. tokenize でトークン列にし、コメント・空行を捨て、識別子 → ID / 文字列 → STR / 数値 → NUM に正規化
+   （変数名・関数名の付け替えやコメントの差では似ていないことにならない）
+2. k トークンの連続（shingle）を 32bit に落とした集合を作る。模範解答など配布コード（base）に含まれる shingle と、
+   提出の max_df 割合以上に現れるありふれた shingle は除く（正解どうしが似ているだけでは引っかからないように）
+3. num_perm 個のハッシュ関数で MinHash 署名にし、bands 個の帯に分けてバケットに入れ、
+   同じバケットに入った組だけ推定 Jaccard 類似度を計算する
+4. threshold 以上の組と、バイト単位で同一の組（similarity=1.0, identical）を union-find でまとめてクラスタにする。
+   同一内容のグループは代表（キーの最小）と残りの組だけ、LSH で似ていたグループどうしは代表どうしの組だけを出す
+   （同じ雛形を500人が出しても 499 組。全員の組み合わせにはしない）
+
+    index = MinHashIndex(base=[solution_bytes])
+    index.add("001", source_bytes)      # 複数スレッドから呼んでよい
+    pairs = index.pairs()               # [(a, b, similarity, identical)]
+    clusters = index.clusters(pairs)    # {key: {"cluster": "C001", "size": .., "max_similarity": .., "peers": [...]}}
+"""
+from __future__ import annotations
+import builtins
+import csv
+import hashlib
+import io
+import keyword
+import threading
+import tokenize
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_MERSENNE = (1 << 31) - 1
+_KEEP_NAMES = set(keyword.kwlist) | set(dir(builtins))  # キーワード・組み込み名は残す
+_SKIP = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT,
+         tokenize.ENCODING, tokenize.ENDMARKER}
+
+
+def normalize_tokens(source: bytes) -> List[str]:
+    """ソース → 正規化したトークン列。閉じていない括弧・文字列などで tokenize が止まったらそこまで。"""
+    out: List[str] = []
+    try:
+        for tok in tokenize.tokenize(io.BytesIO(source).readline):
+            if tok.type in _SKIP:
+                continue
+            if tok.type == tokenize.NAME:
+                out.append(tok.string if tok.string in _KEEP_NAMES else "ID")
+            elif tok.type == tokenize.STRING:
+                out.append("STR")
+            elif tok.type == tokenize.NUMBER:
+                out.append("NUM")
+            else:
+                out.append(tok.string)
+    except (tokenize.TokenError, SyntaxError):  # IndentationError は SyntaxError の子
+        pass
+    return out
+
+
+def shingles(tokens: Sequence[str], k: int = 5) -> np.ndarray:
+    """k トークンずつの連続を crc32 で 32bit 整数にした集合（重複なし・uint64）。"""
+    if len(tokens) < k:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHashIndex:
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.8, k: int = 5,
+                 base: Sequence[bytes] = (), max_df: float = 0.5, min_shingles: int = 8, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm は bands で割り切れる必要があります")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.k = k
+        self.max_df = max_df
+        self.min_shingles = min_shingles
+        rng = np.random.RandomState(seed)
+        # h(x) = (a*x + b) mod p。a < 2^31, x < 2^32 なので積は uint64 に収まる
+        self._a = rng.randint(1, _MERSENNE, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE, size=num_perm).astype(np.uint64)
+        base_sets = [shingles(normalize_tokens(src), k) for src in base]
+        self._base = np.unique(np.concatenate(base_sets)) if base_sets else np.zeros(0, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._shingles: Dict[str, np.ndarray] = {}
+        self._digest: Dict[str, str] = {}
+
+    def signature(self, sh: np.ndarray) -> np.ndarray:
+        # (num_perm, n_shingles) の行列で一度に計算し、行ごとの最小値を取る
+        h = (np.outer(self._a, sh) + self._b[:, None]) % _MERSENNE
+        return h.min(axis=1)
+
+    def add(self, key: str, source: bytes) -> None:
+        sh = np.setdiff1d(shingles(normalize_tokens(source), self.k), self._base, assume_unique=True)
+        digest = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            self._shingles[key] = sh
+            self._digest[key] = digest
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    def _common(self) -> np.ndarray:
+        """提出（同一内容は1つと数える）の max_df 割合以上に現れる shingle。少人数では除かない。"""
+        uniq = {}
+        for key, d in self._digest.items():
+            uniq.setdefault(d, self._shingles[key])
+        if len(uniq) < 10 or not uniq:
+            return np.zeros(0, dtype=np.uint64)
+        values, counts = np.unique(np.concatenate(list(uniq.values())), return_counts=True)
+        return values[counts > self.max_df * len(uniq)]
+
+    def pairs(self) -> List[Tuple[str, str, float, bool]]:
+        """
+        類似ペア（a < b の順）：バイト単位で同一のグループは代表と各メンバーの組、
+        LSH の候補のうち推定類似度が threshold 以上のものは両グループの代表どうしの組。
+        """
+        with self._lock:
+            shingle_sets = dict(self._shingles)
+            digests = dict(self._digest)
+        out: Dict[Tuple[str, str], Tuple[str, str, float, bool]] = {}
+
+        by_digest: Dict[str, List[str]] = {}
+        for key in sorted(digests):
+            by_digest.setdefault(digests[key], []).append(key)
+        for keys in by_digest.values():
+            for other in keys[1:]:  # keys は昇順なので代表 keys[0] が小さい側
+                out[(keys[0], other)] = (keys[0], other, 1.0, True)
+
+        # 同一内容は代表1件だけを LSH にかける（グループの他の人とは上の組でつながる）
+        common = self._common()
+        sigs: Dict[str, np.ndarray] = {}
+        buckets: Dict[tuple, List[str]] = {}
+        for keys in by_digest.values():
+            rep = keys[0]
+            sh = np.setdiff1d(shingle_sets[rep], common, assume_unique=True)
+            if sh.size < self.min_shingles:  # 配布コードとありふれた部分しか無い
+                continue
+            sig = sigs[rep] = self.signature(sh)
+            for b in range(self.bands):
+                buckets.setdefault((b, sig[b * self.rows:(b + 1) * self.rows].tobytes()), []).append(rep)
+
+        candidates = set()
+        for reps in buckets.values():
+            for i in range(len(reps)):
+                for j in range(i + 1, len(reps)):
+                    candidates.add((min(reps[i], reps[j]), max(reps[i], reps[j])))
+        for a, b in candidates:
+            sim = round(float(np.mean(sigs[a] == sigs[b])), 3)
+            if sim >= self.threshold:
+                out[(a, b)] = (a, b, sim, False)
+        return sorted(out.values())
+
+    def clusters(self, pairs: Sequence[Tuple[str, str, float, bool]] | None = None) -> Dict[str, dict]:
+        """
+        類似ペアを union-find でまとめる。クラスタに属するキーだけを返す。
+        peers は直接の組の相手（同一内容のグループのメンバーは代表だけ）、size はクラスタの人数。
+        """
+        pairs = self.pairs() if pairs is None else pairs
+        parent: Dict[str, str] = {}
+
+        def find(x: str) -> str:
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        peers: Dict[str, Dict[str, float]] = {}
+        for a, b, sim, _ in pairs:
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+            peers.setdefault(a, {})[b] = sim
+            peers.setdefault(b, {})[a] = sim
+
+        groups: Dict[str, List[str]] = {}
+        for key in peers:
+            groups.setdefault(find(key), []).append(key)
+        out: Dict[str, dict] = {}
+        for n, root in enumerate(sorted(groups), start=1):
+            cid = f"C{n:03d}"
+            for key in sorted(groups[root]):
+                out[key] = {
+                    "cluster": cid,
+                    "size": len(groups[root]),
+                    "max_similarity": max(peers[key].values()),
+                    "peers": sorted(peers[key], key=lambda p: -peers[key][p]),
+                }
+        return out
+
+
+def write_similarity_csv(path: str, pairs: Sequence[Tuple[str, str, float, bool]], clusters: Dict[str, dict],
+                         labels: Dict[str, str] | None = None) -> None:
+    """similarity.csv：クラスタ ID・クラスタの人数・2人のキー（labels で student_id 等に置換）・類似度・同一かどうか。"""
+    labels = labels or {}
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["cluster", "cluster_size", "student_a", "student_b", "similarity", "identical"])
+        for a, b, sim, identical in sorted(pairs, key=lambda p: (clusters[p[0]]["cluster"], -p[2], p[0], p[1])):
+            w.writerow([clusters[a]["cluster"], clusters[a]["size"], labels.get(a, a), labels.get(b, b), sim, "yes" if identical else ""])
@@ -1,10 +1,15 @@
 from __future__ import annotations
-from typing import List, Tuple
-import csv
+from typing import Iterator, List, Sequence, Tuple
+import hashlib
 import os
 import json
-import gspread
-from google.oauth2.service_account import Credentials
+from pathlib import Path
+
+# 氏名・GistURL として読むヘッダ（先勝ち）
+NAME_KEYS = ["Name", "student_id"]
+URL_KEYS = ["Gist URL", "gist_url"]
+ROSTER_SNAPSHOT_DIR = "rosters"  # <cache_dir>/rosters/ にシートごとのスナップショット
+CHUNK_ROWS = 2000                # 1回の batch_get で読む行数（読めた分から順に返す）
 
 
 def load_from_file(list_path: str) -> List[Tuple[str, str]]:
@@ -19,46 +24,143 @@ def load_from_file(list_path: str) -> List[Tuple[str, str]]:
     return rows
 
 
-def _pick(d: dict, keys: list[str]) -> str | None:
-    """辞書 d から候補キーのどれかを見つけて値を返す（空文字は無視）。"""
-    for k in keys:
-        if k in d and str(d[k]).strip():
-            return str(d[k]).strip()
-    # ゆるめの小文字化一致も試す
-    lower = {str(k).strip().lower(): v for k, v in d.items()}
+def _header_columns(header: Sequence[str], keys: List[str]) -> List[int]:
+    """候補キーに当たる列の位置（0始まり）を優先順に。完全一致を先に、次にゆるめの小文字化一致。"""
+    cols = [header.index(k) for k in keys if k in header]
+    lower = [str(h).strip().lower() for h in header]
     for k in keys:
-        lk = str(k).strip().lower()
-        if lk in lower and str(lower[lk]).strip():
-            return str(lower[lk]).strip()
+        lk = k.strip().lower()
+        if lk in lower and lower.index(lk) not in cols:
+            cols.append(lower.index(lk))
+    return cols
+
+
+def _first_value(values: dict, cols: List[int], k: int) -> str | None:
+    """候補列のうち k 行目が空でない最初の値。"""
+    for c in cols:
+        col = values[c]
+        if k < len(col) and str(col[k]).strip():
+            return str(col[k]).strip()
     return None
 
 
-def load_from_sheet(sheet_id: str, worksheet: str | None = None) -> List[Tuple[str, str]]:
-    """
-    Google Sheets から提出URLを読む。
-    対応ヘッダ（先勝ち）:
-      - 氏名:  "Name", "student_id"
-      - GistURL :  "Gist URL", "gist_url"
-    いずれも無ければ、Name は連番(001,002,...)、URL は空ならスキップ。
-    """
+def _col_letter(n: int) -> str:
+    s = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(ord("A") + r) + s
+    return s
+
+
+def _get_sheets_reader():
+    """読み取り用の gspread クライアント。"""
     sa_json = os.environ.get("GOOGLE_SERVICE_ACCOUNT_JSON")
     if not sa_json:
         raise RuntimeError("GOOGLE_SERVICE_ACCOUNT_JSON が未設定です")
 
+    import gspread  # ファイルのロスターでは読まない
+    from google.oauth2.service_account import Credentials
     info = json.loads(sa_json)
     scopes = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
     creds = Credentials.from_service_account_info(info, scopes=scopes)
-    gc = gspread.authorize(creds)
+    return gspread.authorize(creds)
+
+
+def _snapshot_path(cache_dir: str, sheet_id: str, worksheet: str | None) -> Path:
+    key = hashlib.sha256(f"{sheet_id}\0{worksheet or ''}".encode("utf-8")).hexdigest()[:24]
+    return Path(cache_dir) / ROSTER_SNAPSHOT_DIR / f"{key}.json"
+
+
+def _roster_key(ws, header: Sequence[str], url_cols: List[int]) -> str:
+    """
+    スナップショットの鍵：ヘッダ行と GistURL の候補列の中身のハッシュ（1回の batch_get）。
+    採点結果を同じスプレッドシートの別タブに書くとファイルの更新時刻は毎回変わるので、時刻ではなく中身で見る。
+    """
+    from gspread.utils import Dimension
+    ranges = [f"{_col_letter(c + 1)}2:{_col_letter(c + 1)}{max(ws.row_count, 2)}" for c in url_cols]
+    got = ws.batch_get(ranges, major_dimension=Dimension.cols)
+    payload = json.dumps([list(header), [vr[0] if vr else [] for vr in got]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _read_snapshot(path: Path, key: str) -> List[Tuple[str, str]] | None:
+    try:
+        snap = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if snap.get("key") != key:
+        return None
+    return [(sid, url) for sid, url in snap["rows"]]
+
+
+def _write_snapshot(path: Path, sheet_id: str, worksheet: str | None, key: str,
+                    rows: List[Tuple[str, str]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"sheet_id": sheet_id, "worksheet": worksheet, "key": key,
+                               "rows": rows}, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def iter_sheet_roster(sheet_id: str, worksheet: str | None = None, cache_dir: str | None = None,
+                      chunk_rows: int = CHUNK_ROWS) -> Iterator[Tuple[str, str]]:
+    """
+    Google Sheets から (氏名, 提出URL) を読んだ順に返す（最初の chunk_rows 行が届いた時点で採点を始められる）。
+    - 1行目（ヘッダ）だけを先に読み、氏名・GistURL の候補列だけを chunk_rows 行ずつ1回の batch_get で読む
+      （他の列は読まない）
+    - cache_dir があれば <cache_dir>/rosters/ にスナップショットを残し、ヘッダと GistURL の列が前回と同じなら
+      氏名の列は読まずにスナップショットから返す（氏名だけを書き換えたときは --no-cache で読み直す）
+    列の選び方・連番・空行の扱いは load_from_sheet と同じ。
+    """
+    # get_all_records と同じく、数値に見える氏名は数値にしてから文字列に戻す（既存の結果行のキーと揃える）
+    from gspread.utils import Dimension, numericise
+    gc = _get_sheets_reader()
     sh = gc.open_by_key(sheet_id)
     ws = sh.worksheet(worksheet) if worksheet else sh.sheet1
+    header = ws.row_values(1)
+    name_cols = _header_columns(header, NAME_KEYS)
+    url_cols = _header_columns(header, URL_KEYS)
+    snapshot = _snapshot_path(cache_dir, sheet_id, worksheet) if cache_dir and url_cols else None
+    key = _roster_key(ws, header, url_cols) if snapshot is not None else None
+    if key is not None:
+        rows = _read_snapshot(snapshot, key)
+        if rows is not None:
+            print(f"[roster] GistURL の列は前回から変わっていません。スナップショットの {len(rows)} 行を使います",
+                  flush=True)
+            yield from rows
+            return
 
-    values = ws.get_all_records()  # 1行目をヘッダとして辞書化
     rows: List[Tuple[str, str]] = []
-    for i, rec in enumerate(values, start=1):
-        # ヘッダの候補を順に探す（Name / Gist URL or student_id / gist_url）
-        sid = _pick(rec, ["Name", "student_id"]) or f"{i:03d}"
-        url = _pick(rec, ["Gist URL", "gist_url"]) or ""
-        if not url:
-            continue
-        rows.append((sid, url))
-    return rows
+    cols = list(dict.fromkeys(name_cols + url_cols))
+    start = 2
+    while url_cols and start <= ws.row_count:
+        end = min(start + chunk_rows - 1, ws.row_count)
+        ranges = [f"{_col_letter(c + 1)}{start}:{_col_letter(c + 1)}{end}" for c in cols]
+        got = ws.batch_get(ranges, major_dimension=Dimension.cols)
+        values = {c: [numericise(v) for v in vr[0]] if vr else [] for c, vr in zip(cols, got)}
+        n = max(len(v) for v in values.values())
+        if n == 0:
+            break  # 以降は空行
+        for k in range(n):
+            url = _first_value(values, url_cols, k)
+            if not url:
+                continue
+            sid = _first_value(values, name_cols, k) or f"{start + k - 1:03d}"
+            rows.append((sid, url))
+            yield sid, url
+        start = end + 1
+    if key is not None:
+        _write_snapshot(snapshot, sheet_id, worksheet, key, rows)
+
+
+def load_from_sheet(sheet_id: str, worksheet: str | None = None,
+                    cache_dir: str | None = None) -> List[Tuple[str, str]]:
+    """
+    Google Sheets から提出URLを読む。
+    対応ヘッダ（先勝ち）:
+      - 氏名:  "Name", "student_id"
+      - GistURL :  "Gist URL", "gist_url"
+    いずれも無ければ、Name は連番(001,002,...)、URL は空ならスキップ。
+    読み方（必要な列だけ・スナップショット）は iter_sheet_roster を参照。
+    """
+    return list(iter_sheet_roster(sheet_id, worksheet, cache_dir=cache_dir))
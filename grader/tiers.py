@@ -0,0 +1,77 @@
+"""
+テストの段（tier）と前提（依存）の宣言。
+
+- 段の小さいテストから実行する（安い読み込みテストを先に、matplotlib で描画する重いテストは最後に）
+- 前提のテストが passed でなければ、そのテストは実行せず "blocked" にする
+  （load_game_data が動かないのに、それを使う後続のテストを1つずつ実行・タイムアウトさせない）
+
+キーはテスト名（pytest_plugin.dotted_name の形式）の前方一致で、モジュール単位でもテスト単位でも書ける。
+宣言の無いテストは段 0・前提なし。GRADER_TIERS=0 で無効（すべて従来どおり実行）。
+"""
+from __future__ import annotations
+from typing import Dict, List, Mapping
+
+TIERS_ENV = "GRADER_TIERS"
+BLOCKED = "blocked"
+
+_LOADER = "tests.test_01_load_game_data.test_returns_dataframe"
+_AVERAGE = "tests.test_02_get_average_score_by_game.test_average_values"
+
+TIERS: Dict[str, int] = {
+    "tests.test_01_load_game_data": 0,
+    "tests.test_02_get_average_score_by_game": 1,
+    "tests.test_03_get_player_info": 1,
+    "tests.test_04_filter_high_score_players": 1,
+    "tests.test_05_plot_score_chart": 2,
+}
+
+DEPENDS: Dict[str, List[str]] = {
+    "tests.test_01_load_game_data.test_shape_and_cols": [_LOADER],
+    "tests.test_02_get_average_score_by_game": [_LOADER],
+    "tests.test_03_get_player_info": [_LOADER],
+    "tests.test_04_filter_high_score_players": [_LOADER],
+    "tests.test_05_plot_score_chart": [_LOADER, _AVERAGE],
+}
+
+
+def _lookup(table: Mapping, name: str, default):
+    """name に前方一致（. 区切りの単位で）するキーのうち最長のものの値。"""
+    best = None
+    for key in table:
+        if (name == key or name.startswith(key + ".") or name.startswith(key + "[")) \
+                and (best is None or len(key) > len(best)):
+            best = key
+    return table[best] if best is not None else default
+
+
+def tier(name: str) -> int:
+    return _lookup(TIERS, name, 0)
+
+
+def prerequisites(name: str) -> List[str]:
+    return list(_lookup(DEPENDS, name, []))
+
+
+def blocked_by(name: str, outcomes: Mapping[str, str]) -> List[str]:
+    """既に結果の出た前提のうち passed でないもの（空なら実行してよい）。まだ結果の無い前提は問わない。"""
+    return [p for p in prerequisites(name) if p in outcomes and outcomes[p] != "passed"]
+
+
+def blocked_message(failed: List[str]) -> str:
+    return f"前提のテストが通っていないため実行しませんでした: {', '.join(failed)}"
+
+
+def apply_blocking(tests: List[dict]) -> List[dict]:
+    """
+    段の順にテスト結果を見て、前提が通っていないものを blocked に置き換える（pytest を起動しない合成結果用）。
+    入力の並びは保ったまま返す。
+    """
+    outcomes: Dict[str, str] = {}
+    by_name = {tc["name"]: tc for tc in tests}
+    for name in sorted(by_name, key=lambda n: tier(n)):  # sorted は安定なので同じ段は元の順
+        tc = by_name[name]
+        failed = blocked_by(name, outcomes)
+        if failed:
+            tc.update(outcome=BLOCKED, time=0.0, message=blocked_message(failed))
+        outcomes[name] = tc["outcome"]
+    return tests
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+
+class Tracer:
+    """
+    採点の各段階の計測。
+    - span() で囲んだ区間の wall / CPU（スレッド）時間を計り、timings（受講生ごとの dict）に書く
+    - enabled なら Chrome trace-event 形式（ph="X"）のイベントも貯め、write() で trace.json に出す
+      （Perfetto / chrome://tracing でそのまま開ける）
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._events: List[dict] = []
+        self._threads: dict = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def span(self, name: str, timings: Optional[dict] = None, cat: str = "grade", **args) -> Iterator[dict]:
+        """区間を計測する。yield した dict に入れた値はイベントの args に載る。"""
+        extra: dict = {}
+        start = time.perf_counter()
+        cpu0 = time.thread_time()
+        try:
+            yield extra
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu0
+            if timings is not None:
+                timings[name] = {"wall": round(wall, 4), "cpu": round(cpu, 4)}
+            if self.enabled:
+                th = threading.current_thread()
+                ev = {
+                    "name": name, "cat": cat, "ph": "X",
+                    "ts": round((start - self._t0) * 1e6, 1), "dur": round(wall * 1e6, 1),
+                    "pid": self._pid, "tid": th.ident,
+                    "args": {**args, **extra, "cpu_ms": round(cpu * 1000, 2)},
+                }
+                with self._lock:
+                    self._events.append(ev)
+                    self._threads[th.ident] = th.name
+
+    def write(self, path: str | Path) -> None:
+        with self._lock:
+            events = list(self._events)
+            meta = [{"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in self._threads.items()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+NULL_TRACER = Tracer(enabled=False)
+
+
+def total_wall(result: dict) -> float:
+    timings = (result.get("perf") or {}).get("timings") or {}
+    return sum(float(t.get("wall", 0)) for t in timings.values())
+
+
+def write_step_summary(results: Sequence[dict], path: str, top_n: int = 10, title: str | None = None) -> None:
+    """
+    $GITHUB_STEP_SUMMARY に、時間のかかった受講生トップN と段階別合計を Markdown で追記する。
+    title（課題名など）があれば見出しにする。
+    """
+    stages: dict = {}
+    for r in results:
+        for name, t in ((r.get("perf") or {}).get("timings") or {}).items():
+            stages[name] = stages.get(name, 0.0) + float(t.get("wall", 0))
+    slow = sorted(results, key=total_wall, reverse=True)[:top_n]
+
+    lines = (["", f"## {title}"] if title else []) + ["", f"### Slowest {len(slow)} students", "",
+             "| student_id | total (s) | fetch (s) | pytest (s) | peak RSS (MB) | bytes fetched |",
+             "| --- | ---: | ---: | ---: | ---: | ---: |"]
+    for r in slow:
+        perf = r.get("perf") or {}
+        tm = perf.get("timings") or {}
+        rss = perf.get("peak_rss_kb")
+        lines.append(
+            f"| {r.get('student_id')} | {total_wall(r):.2f} "
+            f"| {tm.get('fetch', {}).get('wall', 0):.2f} | {tm.get('pytest', {}).get('wall', 0):.2f} "
+            f"| {'' if rss is None else f'{rss / 1024:.0f}'} | {perf.get('bytes_fetched', 0)} |")
+    lines += ["", "| stage | total wall (s) |", "| --- | ---: |"]
+    lines += [f"| {name} | {sec:.2f} |" for name, sec in sorted(stages.items(), key=lambda kv: -kv[1])]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
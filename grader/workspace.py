@@ -0,0 +1,212 @@
+"""
+受講生ごとの作業場所（pytest の cwd）の管理。
+
+- fixtures（game_scores.csv）は実行ごとに1回だけ共有コピーを作って読み取り専用にし、各作業場所へはハードリンクで置く
+  （ファイルシステムをまたぐ場合だけコピー）。同じ uid なら chmod して書き換えられてしまうので、
+  採点のたびに共有コピーの stat を確かめ、変わっていればハッシュを比べて元に戻す。
+  同じ inode を同時に読んでいた他の受講生も、自分のリンクの stat（リンクした時点と比べる）と、
+  改ざんを検出した inode の一覧から分かるので、その結果はキャッシュ・台帳に残さない
+- mode="ram" なら作業場所を /dev/shm（tmpfs）に作り、残す成果物だけを <out>/<name> にコピーして消す
+- mode="disk" なら従来どおり <out>/<name> で直接実行する
+"""
+from __future__ import annotations
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+FIXTURE_FILES = ("game_scores.csv",)
+# <out>/<name> に残す成果物（画像は *.png すべて）
+KEEP_ARTIFACTS = ("submission.py", "pytest.out", "junit.xml", "events.jsonl", "summary_debug.json")
+KEEP_GLOBS = ("*.png",)
+SHARED_DIR = ".fixtures"
+RAM_DIR_DEFAULT = "/dev/shm"
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _signature(path: Path) -> tuple:
+    # ctime はハードリンクを作るたびに変わるので使わない
+    st = os.stat(path)
+    return st.st_ino, st.st_size, st.st_mtime_ns, stat.S_IMODE(st.st_mode)
+
+
+def safe_work_name(name: str) -> bool:
+    """作業ディレクトリ名（<out> 直下の1要素）として使えるか。区切り文字・NUL・先頭の "."（. / .. / .fixtures）は不可。"""
+    return bool(name) and not name.startswith(".") and not any(c in name for c in ("/", "\\", "\0"))
+
+
+class SharedFixtures:
+    """読み取り専用の共有 fixtures。link_into() で作業場所へ置き、verify() で改ざんを検出・復元する。"""
+
+    def __init__(self, src_dir: str | Path, dest_dir: str | Path, names: Sequence[str] = FIXTURE_FILES):
+        self.src_dir = Path(src_dir)
+        self.dest_dir = Path(dest_dir)
+        self.names = list(names)
+        self.dest_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._digest: dict = {}
+        self._sig: dict = {}
+        self.copies = 0      # ハードリンクできずコピーした回数
+        self.restored = 0    # 改ざんを検出して戻した回数
+        self._bad_inodes: set = set()  # 改ざんを検出した共有コピーの inode（まだリンクしている作業場所がある）
+        for name in self.names:
+            self._install(name)
+
+    def _install(self, name: str) -> None:
+        """元の fixtures から共有コピーを作り直す（新しい inode にするので、既存のリンクとは切り離される）。"""
+        src = self.src_dir / name
+        dst = self.dest_dir / name
+        tmp = dst.with_name(f".{name}.tmp")
+        shutil.copyfile(src, tmp)
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, dst)
+        self._digest[name] = _sha256(src)
+        self._sig[name] = _signature(dst)
+
+    def link_into(self, work: Path) -> dict:
+        """作業場所へリンク（できなければコピー）し、リンクした時点の stat（verify に渡す lease）を返す。"""
+        lease = {}
+        for name in self.names:
+            dst = work / name
+            dst.unlink(missing_ok=True)
+            try:
+                os.link(self.dest_dir / name, dst)
+            except OSError:
+                shutil.copy2(self.dest_dir / name, dst)
+                with self._lock:
+                    self.copies += 1
+            lease[name] = _signature(dst)
+        return lease
+
+    def verify(self, work: Path | None = None, lease: dict | None = None) -> List[str]:
+        """
+        共有コピーが書き換えられていれば元に戻す。戻り値はこの受講生の実行が影響を受けたかもしれないファイル名：
+        - 共有コピーの改ざんをここで検出したもの
+        - work・lease（link_into の戻り値）があれば、自分のリンクの stat がリンクした時点から変わったもの、
+          またはリンクした inode の改ざんを（他の受講生の verify で）検出済みのもの
+        """
+        tampered = []
+        with self._lock:
+            for name in self.names:
+                path = self.dest_dir / name
+                try:
+                    if _signature(path) == self._sig[name]:
+                        continue
+                    ok = _sha256(path) == self._digest[name] and not (os.stat(path).st_mode & 0o222)
+                except OSError:
+                    ok = False
+                if ok:
+                    self._sig[name] = _signature(path)
+                    continue
+                tampered.append(name)
+                self.restored += 1
+                self._bad_inodes.add(self._sig[name][0])
+                try:
+                    self._bad_inodes.add(os.stat(path).st_ino)
+                except OSError:
+                    pass
+                self._install(name)
+            for name, sig in (lease or {}).items():
+                if name in tampered:
+                    continue
+                try:
+                    changed = _signature(Path(work) / name) != sig
+                except OSError:
+                    changed = True
+                if changed or sig[0] in self._bad_inodes:
+                    tampered.append(name)
+        return tampered
+
+
+class WorkspaceManager:
+    """
+    作業場所の割り当てと後始末。
+        ws = WorkspaceManager(".out", mode="ram")
+        work = ws.scratch("001")      # pytest の cwd
+        ws.link_fixtures(work)
+        ...                           # pytest 実行
+        ws.check_fixtures()           # 共有 fixtures の改ざん検出
+        ws.finish(work)               # 残す成果物を .out/001 へ
+        ws.close()
+    """
+
+    def __init__(self, out_dir: str | Path, mode: str = "disk", fixtures_dir: str = "fixtures",
+                 ram_dir: Optional[str] = None, fixtures: Sequence[str] = FIXTURE_FILES):
+        if mode not in ("disk", "ram"):
+            raise ValueError(f"workspace mode は disk / ram のどちらか: {mode}")
+        self.out_dir = Path(out_dir)
+        self.mode = mode
+        self._scratch_root: Optional[Path] = None
+        if mode == "ram":
+            base = ram_dir or RAM_DIR_DEFAULT
+            if not (os.path.isdir(base) and os.access(base, os.W_OK)):
+                print(f"[workspace] {base} を使えないため {tempfile.gettempdir()} を使います", file=sys.stderr, flush=True)
+                base = None
+            self._scratch_root = Path(tempfile.mkdtemp(prefix="grader-", dir=base))
+            shared = self._scratch_root / SHARED_DIR
+        else:
+            shared = self.out_dir / SHARED_DIR
+        self.fixtures = SharedFixtures(fixtures_dir, shared, fixtures)
+
+    def scratch(self, name: str) -> Path:
+        root = self._scratch_root if self._scratch_root is not None else self.out_dir
+        work = root / name
+        # 作業ディレクトリは root の直下だけ（"../x" や絶対パスの名前で out の外に書かない）
+        if not safe_work_name(name) or work.resolve().parent != root.resolve():
+            raise ValueError(f"作業ディレクトリ名として使えません: {name!r}")
+        work.mkdir(parents=True, exist_ok=True)
+        return work
+
+    def out_path(self, work: Path) -> Path:
+        return self.out_dir / work.name
+
+    def link_fixtures(self, work: Path) -> dict:
+        return self.fixtures.link_into(work)
+
+    def check_fixtures(self, work: Path | None = None, lease: dict | None = None) -> List[str]:
+        return self.fixtures.verify(work, lease)
+
+    def finish(self, work: Path) -> Path:
+        """
+        ram モード：残す成果物を <out>/<name> にコピーして作業場所を消す。
+        今回 pytest を実行した（またはキャッシュから戻した）ときは、今回出なかった古い成果物を <out> 側から消す。
+        disk モード：fixtures のリンクだけ外す（成果物ではないので）。
+        """
+        dest = self.out_path(work)
+        if self._scratch_root is None:
+            for name in self.fixtures.names:
+                (work / name).unlink(missing_ok=True)
+            return dest
+        if not work.exists():
+            return dest
+        dest.mkdir(parents=True, exist_ok=True)
+        ran = (work / "pytest.out").exists()
+        for name in KEEP_ARTIFACTS:
+            if (work / name).exists():
+                shutil.copyfile(work / name, dest / name)
+            elif ran:
+                (dest / name).unlink(missing_ok=True)
+        for pattern in KEEP_GLOBS:
+            if ran:
+                for old in dest.glob(pattern):
+                    old.unlink()
+            for p in work.glob(pattern):
+                shutil.copyfile(p, dest / p.name)
+        shutil.rmtree(work, ignore_errors=True)
+        return dest
+
+    def close(self) -> None:
+        if self._scratch_root is not None:
+            shutil.rmtree(self._scratch_root, ignore_errors=True)
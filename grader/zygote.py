@@ -0,0 +1,231 @@
+"""
+pytest / pandas / matplotlib を import 済みで待機する常駐プロセス（zygote）と、そのクライアント。
+
+受講生ごとに `python -m pytest` を起動すると、インタプリタ起動・プラグイン探索・
+pandas / matplotlib（フォントキャッシュ含む）の import が毎回かかる。
+zygote はそれらを1度だけ読み込み、提出ごとに fork した子プロセスで pytest.main() を実行する。
+子プロセスは cwd / 環境変数 / sys.path / 出力先を個別に持ち、タイムアウトでプロセスグループごと kill する。
+
+プロトコル（1行1JSON）:
+  要求  {"id": n, "cwd": str, "args": [...], "env": {...}, "timeout": sec, "log": path,
+         "limits": {...} | null, "cgroup": path | null}
+  応答  {"id": n, "returncode": int, "timed_out": bool, "maxrss_kb": int, "cpu_sec": float}
+"""
+from __future__ import annotations
+import json
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from grader.sandbox import EVENTS_NAME, CgroupScope, ResourceLimits, termination_reason
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+# ---------------------------------------------------------------------------
+# zygote 側（python -m grader.zygote）
+# ---------------------------------------------------------------------------
+
+def _preload() -> None:
+    """子プロセスで毎回かかる import を前倒しで済ませる。"""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    import pytest  # noqa: F401
+    import _pytest.junitxml  # noqa: F401
+    # プラグイン（pytest_timeout 等）は先に import するとアサーション書き換えの警告が出るので pytest に任せる
+    import pandas  # noqa: F401
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    try:
+        import japanize_matplotlib  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _child(req: dict) -> None:
+    """fork 後の子プロセス。戻らない。"""
+    rc = 70
+    try:
+        os.setsid()  # タイムアウト時にプロセスグループごと kill できるように
+        if req.get("cgroup"):
+            with open(os.path.join(req["cgroup"], "cgroup.procs"), "w") as f:
+                f.write(str(os.getpid()))
+        limits = ResourceLimits.from_dict(req.get("limits"))
+        if limits is not None:
+            limits.apply()
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        log_fd = os.open(req["log"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+        os.chdir(req["cwd"])
+        os.environ.clear()
+        os.environ.update(req["env"])
+        sys.path.insert(0, req["cwd"])  # = PYTHONPATH=work_dir
+        import pytest
+        rc = int(pytest.main(list(req["args"])))
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(rc)
+
+
+def serve() -> None:
+    _preload()
+    out = sys.stdout.buffer
+    stdin_fd = sys.stdin.fileno()
+    sel = selectors.DefaultSelector()
+    sel.register(stdin_fd, selectors.EVENT_READ)
+    buf = b""
+    eof = False
+    running: dict = {}  # pid -> {"id", "deadline", "timed_out"}
+
+    def reply(msg: dict) -> None:
+        out.write((json.dumps(msg) + "\n").encode())
+        out.flush()
+
+    while not (eof and not running):
+        if not eof and sel.select(timeout=0.02):
+            chunk = os.read(stdin_fd, 65536)
+            if not chunk:
+                eof = True
+                for pid in running:  # クライアントが居なくなったら後始末
+                    _killpg(pid)
+            buf += chunk
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                pid = os.fork()
+                if pid == 0:
+                    _child(req)
+                running[pid] = {"id": req["id"], "deadline": time.monotonic() + float(req["timeout"]),
+                                "timed_out": False}
+        elif eof:
+            time.sleep(0.02)
+
+        # 終了した子を回収
+        while running:
+            try:
+                pid, status, ru = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            st = running.pop(pid, None)
+            if st is None:
+                continue
+            _killpg(pid)  # 提出コードが起動して残ったプロセスも片付ける
+            rc = os.waitstatus_to_exitcode(status)
+            reply({"id": st["id"], "returncode": rc, "timed_out": st["timed_out"],
+                   "maxrss_kb": int(ru.ru_maxrss), "cpu_sec": round(ru.ru_utime + ru.ru_stime, 3)})
+
+        # タイムアウトした子を kill
+        now = time.monotonic()
+        for pid, st in running.items():
+            if not st["timed_out"] and now > st["deadline"]:
+                st["timed_out"] = True
+                _killpg(pid)
+
+
+def _killpg(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# クライアント側（採点プロセス）
+# ---------------------------------------------------------------------------
+
+class ZygoteRunner:
+    """
+    zygote を1つ起動し、複数スレッドからの run() を多重化する。
+    run() の戻り値は pytest の終了コード。タイムアウト時は subprocess.TimeoutExpired。
+    """
+
+    def __init__(self):
+        env = os.environ.copy()
+        env.setdefault("MPLBACKEND", "Agg")
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH", "")]))
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "grader.zygote"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=str(REPO_ROOT), env=env,
+        )
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._pending: dict = {}
+        self._reader = threading.Thread(target=self._read_loop, name="zygote-reader", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self) -> None:
+        for line in self.proc.stdout:
+            msg = json.loads(line)
+            with self._lock:
+                slot = self._pending.pop(msg["id"], None)
+            if slot is not None:
+                slot["reply"] = msg
+                slot["event"].set()
+        # zygote が落ちた：待っている全員を起こす
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for slot in pending.values():
+            slot["event"].set()
+
+    def run(self, work_dir: Path, args: list, env: dict, timeout_sec: float, log_path: Path,
+            stats: dict | None = None, limits: ResourceLimits | None = None) -> int:
+        slot = {"event": threading.Event(), "reply": None}
+        cgroup = CgroupScope(limits.cgroup_root if limits else None, limits)
+        try:
+            with self._lock:
+                self._next_id += 1
+                rid = self._next_id
+                self._pending[rid] = slot
+                req = {"id": rid, "cwd": str(Path(work_dir).resolve()), "args": list(args), "env": dict(env),
+                       "timeout": timeout_sec, "log": str(Path(log_path).resolve()),
+                       "limits": limits.to_dict() if limits else None,
+                       "cgroup": str(cgroup.path) if cgroup.enabled else None}
+                self.proc.stdin.write((json.dumps(req) + "\n").encode())
+                self.proc.stdin.flush()
+            slot["event"].wait()
+            cg = cgroup.stats()
+        finally:
+            cgroup.kill()
+            cgroup.remove()
+        reply = slot["reply"]
+        if reply is None:
+            raise RuntimeError("zygote プロセスが終了しました")
+        if stats is not None:
+            stats.update({"peak_rss_kb": reply["maxrss_kb"], "cpu_sec": reply["cpu_sec"]})
+            stats.update({k: v for k, v in cg.items() if k != "oom_kill"})
+            stats["termination"] = termination_reason(reply["returncode"], reply["timed_out"],
+                                                      Path(work_dir) / EVENTS_NAME, cg.get("oom_kill", 0), limits)
+        if reply["timed_out"]:
+            raise subprocess.TimeoutExpired(["pytest", *args], timeout_sec)
+        return reply["returncode"]
+
+    def close(self) -> None:
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,22 +1,251 @@
 import argparse
 import os
-from grader.grade import grade_all
+import sys
+from grader.engine import default_jobs
+from grader.sandbox import ResourceLimits
+from grader.shard import parse_shard
+from grader.assignments import load_assignments, select
 
-if __name__ == "__main__":
-    ap = argparse.ArgumentParser()
+
+def merge_main(argv: list) -> None:
+    """python run.py merge <shard の出力ディレクトリ>... --out .out [--push-to-sheets]"""
+    ap = argparse.ArgumentParser(prog="run.py merge",
+                                 description="--shard で分けて採点した出力をまとめ、Sheets へ1回だけ書き込む")
+    ap.add_argument("shard_dirs", nargs="+", help="各シャードの --out（shard.json があるディレクトリ）")
+    ap.add_argument("--out", default=".out", help="まとめた結果の出力先")
+    ap.add_argument("--push-to-sheets", action="store_true", help="Google Sheetsに書き込む（student_id で upsert）")
+    ap.add_argument("--run-tag", help="指定すると student_id + run_tag をキーに upsert（回ごとに別行で残す）")
+    ap.add_argument("--cache-dir", default=".grader-cache", help="所要時間の履歴（durations.json）の保存先")
+    ap.add_argument("--no-similarity", action="store_true", help="類似提出の検出（similarity.csv）を行わない")
+    ap.add_argument("--similarity-threshold", type=float, default=0.8,
+                    help="類似とみなす推定 Jaccard 類似度（既定: 0.8）")
+    ap.add_argument("--assignments-file", help="課題の登録（既定: リポジトリ直下の assignments.json があれば）")
+    ap.add_argument("--no-analytics", action="store_true", help="コホートの集計（analytics.csv / .json）を作らない")
+    ap.add_argument("--analytics-tab", default=os.environ.get("ANALYTICS_TAB"),
+                    help="集計を書き込む Sheets のタブ（--push-to-sheets のとき。環境変数 ANALYTICS_TAB でも可）")
+    ap.add_argument("--archive", action="store_true",
+                    help="受講生ごとの成果物を <out>/artifacts.grarc にまとめる（個別のディレクトリは残さない）")
+    args = ap.parse_args(argv)
+    try:
+        registry = load_assignments(args.assignments_file)
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+    from grader.grade import merge_shards
+    merge_shards(args.shard_dirs, args.out, push_to_sheets=args.push_to_sheets, run_tag=args.run_tag,
+                 similarity=not args.no_similarity, similarity_threshold=args.similarity_threshold,
+                 cache_dir=args.cache_dir, registry=registry, analytics=not args.no_analytics,
+                 analytics_tab=args.analytics_tab, archive=args.archive)
+
+
+def artifacts_main(argv: list) -> None:
+    """python run.py artifacts {list,extract,cat,pack} ...（<out>/artifacts.grarc の中身を見る・取り出す）"""
+    ap = argparse.ArgumentParser(prog="run.py artifacts",
+                                 description="成果物のアーカイブ（artifacts.grarc）の一覧・取り出し")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("list", help="受講生（ディレクトリ）ごとのファイル数。PREFIX を付けるとその下のメンバ")
+    p.add_argument("archive")
+    p.add_argument("prefix", nargs="?")
+    p = sub.add_parser("extract", help="受講生（<name> か <課題名>/<name>）やメンバを取り出す")
+    p.add_argument("archive")
+    p.add_argument("names", nargs="+")
+    p.add_argument("-o", "--dest", default=".", help="取り出し先（既定: カレント。<dest>/<name>/... に書く）")
+    p = sub.add_parser("cat", help="メンバ1つの中身を標準出力へ")
+    p.add_argument("archive")
+    p.add_argument("member")
+    p = sub.add_parser("pack", help="既存の <out> の受講生ディレクトリを <out>/artifacts.grarc にまとめる")
+    p.add_argument("out_dir")
+    p.add_argument("--keep", action="store_true", help="まとめたディレクトリを消さない")
+    args = ap.parse_args(argv)
+
+    from grader.archive import Archive, ArchiveError, pack_dirs, student_dirs, summary_line
+    if args.cmd == "pack":
+        dirs = student_dirs(args.out_dir)
+        stats = pack_dirs(args.out_dir, dirs, remove=not args.keep)
+        print(f"{stats['dirs']} dirs: {summary_line(stats)}")
+        return
+    try:
+        ar = Archive(args.archive)
+    except (OSError, ArchiveError) as e:
+        ap.error(str(e))
+    with ar:
+        if args.cmd == "list":
+            if args.prefix:
+                for name in ar.find(args.prefix):
+                    print(f"{ar.info(name)['size']:>10}  {name}")
+            else:
+                for d, count in sorted(ar.directories().items()):
+                    print(f"{count:>5}  {d}")
+                print(summary_line(ar.stats()))
+        elif args.cmd == "extract":
+            missing = [n for n in args.names if not ar.find(n)]
+            if missing:
+                ap.error(f"アーカイブにありません: {', '.join(missing)}")
+            for n in args.names:
+                for path in ar.extract(ar.find(n), args.dest):
+                    print(path)
+        else:
+            try:
+                sys.stdout.buffer.write(ar.read(args.member))
+            except KeyError:
+                ap.error(f"アーカイブにありません: {args.member}")
+
+
+def _add_grading_args(ap: argparse.ArgumentParser) -> None:
+    """run.py（一括採点）と run.py serve で共通の引数：ロスター・出力・並列数・キャッシュ・pytest の実行と制限・課題。"""
     ap.add_argument("--gists", help="gists.txt（file）。省略時は --sheet-id を使用")
     ap.add_argument("--sheet-id", help="提出URLを読む Google Sheets のID")
     ap.add_argument("--sheet-tab", help="提出URLを読むワークシート名（未指定なら1枚目）")
     ap.add_argument("--out", default=".out", help="出力先ディレクトリ")
-    ap.add_argument("--push-to-sheets", action="store_true", help="Google Sheetsに追記")
+    ap.add_argument("--push-to-sheets", action="store_true", help="Google Sheetsに書き込む（student_id で upsert）")
+    ap.add_argument("--run-tag", help="指定すると student_id + run_tag をキーに upsert（回ごとに別行で残す）")
+    ap.add_argument("--no-junit", action="store_true",
+                    help="junit.xml を出力しない（集計は events.jsonl から行う）")
+    ap.add_argument("--jobs", "-j", type=int, default=default_jobs(),
+                    help="同時に採点する人数（既定: CPU数）")
+    ap.add_argument("--fetch-jobs", type=int, default=16,
+                    help="Gist 取得の同時リクエスト数（既定: 16）")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="採点結果・Gist取得のキャッシュを使わない")
+    ap.add_argument("--cache-dir", default=".grader-cache", help="キャッシュの保存先")
+    ap.add_argument("--runner", choices=["subprocess", "zygote"], default="subprocess",
+                    help="pytest の起動方法（zygote: import 済み常駐プロセスから fork）")
+    ap.add_argument("--mem-limit-mb", type=int, default=2048,
+                    help="pytest プロセスの仮想メモリ上限 MB（RLIMIT_AS、0 で無制限）")
+    ap.add_argument("--cpu-limit-sec", type=int, default=100,
+                    help="pytest プロセスの CPU 時間上限 秒（RLIMIT_CPU、0 で無制限）")
+    ap.add_argument("--nproc-limit", type=int, default=0,
+                    help="プロセス数上限（RLIMIT_NPROC、ユーザー単位。0 で無制限）")
+    ap.add_argument("--cgroup", default=os.environ.get("GRADER_CGROUP"),
+                    help="書き込み可能な cgroup v2 ディレクトリ。指定すると提出ごとに子 cgroup で制限・計測")
+    ap.add_argument("--workspace", choices=["disk", "ram"], default="disk",
+                    help="作業場所（ram: /dev/shm で実行し、残す成果物だけ --out にコピー）")
+    ap.add_argument("--no-precheck", action="store_true",
+                    help="静的チェックを行わず、構文エラーの提出なども pytest で採点する")
+    ap.add_argument("--no-tiers", action="store_true",
+                    help="テストの段・前提（grader/tiers.py）を使わず、前提が通らなくても全テストを実行する")
+    ap.add_argument("--assignment", action="append", metavar="NAME",
+                    help="採点する課題（複数指定可。既定・all: 登録済みの全課題）")
+    ap.add_argument("--assignments-file", help="課題の登録（既定: リポジトリ直下の assignments.json があれば）")
+
+
+def _grading_options(ap: argparse.ArgumentParser, args: argparse.Namespace) -> dict:
+    """_add_grading_args の引数 → grade_all / GradeService に共通で渡すキーワード引数。"""
+    try:
+        assignments = select(args.assignment, load_assignments(args.assignments_file))
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+    return {
+        "jobs": args.jobs,
+        "fetch_jobs": args.fetch_jobs,
+        "use_cache": not args.no_cache,
+        "cache_dir": args.cache_dir,
+        "runner": args.runner,
+        "run_tag": args.run_tag,
+        "push_to_sheets": args.push_to_sheets,
+        "junit": not args.no_junit,
+        "limits": ResourceLimits(mem_mb=args.mem_limit_mb or None, cpu_sec=args.cpu_limit_sec or None,
+                                 nproc=args.nproc_limit or None, cgroup_root=args.cgroup),
+        "workspace": args.workspace,
+        "precheck": not args.no_precheck,
+        "tiers": not args.no_tiers,
+        "assignments": assignments,
+    }
+
+
+def serve_main(argv: list) -> None:
+    """python run.py serve --gists gists.txt --interval 60 [--port 8765] [--push-to-sheets]"""
+    from grader.serve import GradeService
+    ap = argparse.ArgumentParser(prog="run.py serve",
+                                 description="常駐して、新しい提出・変わった提出だけを採点する（GET /status で状態）。"
+                                             "--gists / --sheet-id が無ければロスターを読まず POST /submit だけ受け付ける")
+    _add_grading_args(ap)
+    ap.add_argument("--interval", type=float, default=60, help="ロスターを読み直す間隔 秒（既定: 60）")
+    ap.add_argument("--recheck-sec", type=float, default=0,
+                    help="この秒数ごとに URL の変わっていない人も低い優先度で確認する（Gist の更新を拾う。0 で無効）")
+    ap.add_argument("--host", default="127.0.0.1", help="HTTP の待ち受けアドレス（既定: 127.0.0.1）")
+    ap.add_argument("--port", type=int, default=8765, help="HTTP の待ち受けポート（既定: 8765、-1 で HTTP なし）")
+    ap.add_argument("--push-interval", type=float, default=10, help="Sheets へまとめて書き込む間隔 秒（既定: 10）")
+    args = ap.parse_args(argv)
+    options = _grading_options(ap, args)
+
+    from grader.sources import iter_sheet_roster, load_from_file
+    if args.sheet_id:
+        load_roster = lambda: iter_sheet_roster(args.sheet_id, args.sheet_tab,
+                                                cache_dir=None if args.no_cache else args.cache_dir)
+    elif args.gists:
+        load_roster = lambda: load_from_file(args.gists)
+    else:
+        load_roster = None
+    if load_roster is None and args.port < 0:
+        ap.error("--gists / --sheet-id か HTTP（--port）のどちらかが必要です")
+
+    GradeService(
+        args.out, load_roster, interval=args.interval, recheck=args.recheck_sec,
+        host=args.host, port=None if args.port < 0 else args.port, push_interval=args.push_interval,
+        **options,
+    ).run()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["merge"]:
+        merge_main(sys.argv[2:])
+        sys.exit(0)
+    if sys.argv[1:2] == ["serve"]:
+        serve_main(sys.argv[2:])
+        sys.exit(0)
+    if sys.argv[1:2] == ["artifacts"]:
+        artifacts_main(sys.argv[2:])
+        sys.exit(0)
+
+    ap = argparse.ArgumentParser()
+    _add_grading_args(ap)
+    ap.add_argument("--incremental", action="store_true",
+                    help="提出とテスト一式が前回（<out>/ledger.sqlite）と同じ人は採点せず台帳の結果を使う")
+    ap.add_argument("--no-graphql", action="store_true",
+                    help="GraphQL での一括解決を使わず、Gist ごとに REST API を呼ぶ")
+    ap.add_argument("--graphql-batch", type=int, default=50,
+                    help="GraphQL 1リクエストで解決する Gist 数（既定: 50）")
+    ap.add_argument("--no-similarity", action="store_true",
+                    help="類似提出の検出（similarity.csv）を行わない")
+    ap.add_argument("--similarity-threshold", type=float, default=0.8,
+                    help="類似とみなす推定 Jaccard 類似度（既定: 0.8）")
+    ap.add_argument("--no-dedup", action="store_true",
+                    help="バイト単位で同一の提出も1人ずつ採点する")
+    ap.add_argument("--shard", type=parse_shard, metavar="i/N",
+                    help="ロスターを N 分割した i 番目（1始まり）だけを採点する。まとめは run.py merge")
+    ap.add_argument("--no-analytics", action="store_true", help="コホートの集計（analytics.csv / .json）を作らない")
+    ap.add_argument("--analytics-tab", default=os.environ.get("ANALYTICS_TAB"),
+                    help="集計を書き込む Sheets のタブ（--push-to-sheets のとき。環境変数 ANALYTICS_TAB でも可）")
+    ap.add_argument("--archive", action="store_true",
+                    help="受講生ごとの成果物を <out>/artifacts.grarc にまとめる（個別のディレクトリは残さない）")
+    ap.add_argument("--no-schedule", action="store_true",
+                    help="前回の所要時間で順番を決めず、ロスターの順に採点する")
+    ap.add_argument("--reduced-timeout-sec", type=float, default=30,
+                    help="前回タイムアウトした人の1回目のタイムアウト 秒（切れたら最後に本来のタイムアウトでやり直す。"
+                         "0 で短縮しない）")
     args = ap.parse_args()
+    options = _grading_options(ap, args)
 
     os.makedirs(args.out, exist_ok=True)
 
+    # 採点の本体（と依存）は引数を解釈してから読む（--help・引数エラーを速く返す）
+    from grader.grade import grade_all
     grade_all(
         list_path=args.gists,
         out_dir=args.out,
-        push_to_sheets=args.push_to_sheets,
         sheet_id=args.sheet_id,
         sheet_tab=args.sheet_tab,
+        incremental=args.incremental,
+        graphql=not args.no_graphql,
+        graphql_batch=args.graphql_batch,
+        similarity=not args.no_similarity,
+        similarity_threshold=args.similarity_threshold,
+        dedup=not args.no_dedup,
+        shard=args.shard,
+        analytics=not args.no_analytics,
+        analytics_tab=args.analytics_tab,
+        archive=args.archive,
+        schedule=not args.no_schedule,
+        reduced_timeout_sec=args.reduced_timeout_sec or None,
+        **options,
     )